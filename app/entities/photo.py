@@ -67,3 +67,13 @@ class Photo(APIModel):
                 },
             ]
         }
+
+
+class BulkCreatePhotoResult(APIModel):
+    """The outcome for a single Photo of a bulk create.
+    Status is "created", "duplicate" or "missing_file"."""
+
+    filename: str
+    status: str
+    detail: str | None = None
+    photo: Photo | None = None
@@ -0,0 +1,571 @@
+"""The cache_backends module stores cached values for the service layer, either in the
+worker's own memory, in shared memory every worker on the host maps, or in Redis.
+
+Values are bytes kept for a TTL and tagged, so every value tagged with a resource can
+be dropped when it's written. Each backend also keeps a generation, bumped by every
+invalidation, so a value read before an invalidation is never stored after it.
+
+With the shared memory and Redis backends every worker reads the same entries, so an
+invalidation is seen by all of them as soon as it returns. If Redis can't be reached
+the invalidation is lost, and other workers may serve the entries until they expire,
+so staleness is bounded by the TTL in every case.
+
+The shared memory and Redis backends wait on other workers' locks, compaction and
+the network, so they're blocking, and async callers must call them off the event
+loop.
+"""
+
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, Iterator, cast
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Where a cache keeps its values"""
+
+    name: str
+    # If calls may wait on IO or other processes, so must be made off the event loop
+    blocking: bool = True
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        """Get a value, None if it isn't cached or has expired"""
+
+    @abstractmethod
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        ttl_seconds: float,
+        tags: Iterable[str],
+        generation: int,
+    ) -> bool:
+        """Store a value, unless the generation has moved on since it was read
+
+        Args:
+            key (str): Key of the value
+            value (bytes): The value
+            ttl_seconds (float): How long to keep the value for
+            tags (Iterable[str]): Tags the value can be invalidated by
+            generation (int): The generation before the value was read
+
+        Returns:
+            bool: True if the value was stored
+        """
+
+    @abstractmethod
+    def invalidate(self, tags: Iterable[str]) -> int:
+        """Drop every value tagged with any of the tags and bump the generation
+
+        Args:
+            tags (Iterable[str]): Tags of the resources that were written
+
+        Returns:
+            int: How many values were dropped
+        """
+
+    @abstractmethod
+    def generation(self) -> int:
+        """Get the current generation"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every value and bump the generation"""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Get the backend's usage and counters"""
+
+
+class InProcessBackend(CacheBackend):
+    """Values in this worker's memory, bounded by their size.
+    The least recently used values are dropped once max_bytes is reached."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.invalidations = 0
+        self._generation = 0
+        self._size = 0
+        self._entries: OrderedDict[
+            str, tuple[float, bytes, frozenset[str]]
+        ] = OrderedDict()
+        self._keys_by_tag: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        ttl_seconds: float,
+        tags: Iterable[str],
+        generation: int,
+    ) -> bool:
+        if len(value) > self.max_bytes:
+            return False
+
+        with self._lock:
+            if generation != self._generation:
+                return False
+
+            if key in self._entries:
+                self._remove(key)
+
+            tags = frozenset(tags)
+            self._entries[key] = (time.time() + ttl_seconds, value, tags)
+            self._size += len(value)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+            return True
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            self._generation += 1
+
+            stale: set[str] = set()
+            for tag in tags:
+                stale.update(self._keys_by_tag.get(tag, ()))
+
+            for key in stale:
+                self._remove(key)
+
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def generation(self) -> int:
+        return self._generation
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._size = 0
+
+    def _remove(self, key: str) -> None:
+        _, value, tags = self._entries.pop(key)
+        self._size -= len(value)
+
+        for tag in tags:
+            keys = self._keys_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tag[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class SharedMemoryBackend(CacheBackend):
+    """Values in a memory mapped file shared by every worker on the host.
+
+    The file holds a header, then the values one after another, then an index of
+    the values as JSON. Writers append the value and a new index under an exclusive
+    lock, then point the header at them. Once the file is full the live values are
+    compacted to the start, dropping the ones closest to expiring until the rest
+    fit. Readers only parse the index again when the header says it has changed.
+
+    The file is created by the first worker, and its size is fixed from then on.
+    A file left behind by a previous run is reused, as its values expire anyway.
+    """
+
+    name = "shared-memory"
+
+    MAGIC = b"RSPCACH1"
+    # magic, version, generation, index offset, index length, end of the values
+    HEADER = struct.Struct("<8sQQQQQ")
+    # Roughly what an entry adds to the index, besides it's key and tags
+    INDEX_ENTRY_BYTES = 64
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.evictions = 0
+        self.invalidations = 0
+        self._index: dict[str, list] = {}
+        self._index_version = -1
+        # flock only excludes other processes, threads share this worker's lock
+        self._lock = threading.Lock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # Workers that already mapped the file keep it's size, even if they
+            # were started with a different max_bytes
+            if os.pread(self._fd, len(self.MAGIC), 0) != self.MAGIC:
+                os.ftruncate(self._fd, self.HEADER.size + max_bytes)
+                self._mmap = mmap.mmap(self._fd, 0)
+                self._reset(0)
+            else:
+                self._mmap = mmap.mmap(self._fd, 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self.max_bytes = len(self._mmap) - self.HEADER.size
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _header(self) -> tuple:
+        return self.HEADER.unpack_from(self._mmap, 0)
+
+    def _entry_bytes(self, key: str, tags: Iterable[str]) -> int:
+        return len(key) + sum(len(tag) + 3 for tag in tags) + self.INDEX_ENTRY_BYTES
+
+    def _reset(self, generation: int) -> None:
+        """Empty the file"""
+
+        self._commit({}, self.HEADER.size, generation, self._header()[1])
+
+    def _load_index(self) -> None:
+        """Parse the index again if another worker has changed it"""
+
+        _, version, _, offset, length, _ = self._header()
+        if version == self._index_version:
+            return
+
+        try:
+            self._index = json.loads(self._mmap[offset : offset + length])
+        except ValueError:
+            # A worker died while writing. The values are only a cache, so they're
+            # dropped, and the next write starts a new index.
+            logger.warning("Shared response cache %s was corrupt", self.path)
+            self._index = {}
+
+        self._index_version = version
+
+    def _begin_write(self) -> tuple[int, int, int]:
+        """Mark the index as being written, so if this worker dies before committing
+        the other workers drop the values instead of reading moved ones.
+        Returns the version, generation and end of the values."""
+
+        _, version, generation, _, _, end = self._header()
+        self.HEADER.pack_into(
+            self._mmap, 0, self.MAGIC, version + 1, generation, end, 0, end
+        )
+        return version + 1, generation, end
+
+    def _commit(self, index: dict, end: int, generation: int, version: int) -> None:
+        """Write the index after the values, and point the header at it"""
+
+        encoded = json.dumps(index, separators=(",", ":")).encode()
+        if end + len(encoded) > len(self._mmap):
+            index, end = self._compact(index, 0)
+            encoded = json.dumps(index, separators=(",", ":")).encode()
+
+        self._mmap[end : end + len(encoded)] = encoded
+        self.HEADER.pack_into(
+            self._mmap, 0, self.MAGIC, version + 1, generation, end, len(encoded), end
+        )
+        self._index = index
+        self._index_version = version + 1
+
+    def _compact(self, index: dict, reserve: int) -> tuple[dict, int]:
+        """Move the live values to the start of the file, dropping the ones closest
+        to expiring until the rest and their index leave reserve bytes free.
+        Returns the new index and the end of the values."""
+
+        now = time.time()
+        live = sorted(
+            (item for item in index.items() if item[1][2] > now),
+            key=lambda item: item[1][2],
+            reverse=True,
+        )
+
+        budget = self.max_bytes - reserve
+        kept, used = [], 0
+        for key, (offset, length, expires_at, tags) in live:
+            cost = length + self._entry_bytes(key, tags)
+            if used + cost > budget:
+                self.evictions += 1
+                continue
+            value = self._mmap[offset : offset + length]
+            kept.append((key, value, expires_at, tags))
+            used += cost
+
+        compacted, end = {}, self.HEADER.size
+        for key, value, expires_at, tags in kept:
+            self._mmap[end : end + len(value)] = value
+            compacted[key] = [end, len(value), expires_at, tags]
+            end += len(value)
+
+        return compacted, end
+
+    def get(self, key: str) -> bytes | None:
+        with self._locked(exclusive=False):
+            self._load_index()
+            entry = self._index.get(key)
+
+            if entry is None or entry[2] <= time.time():
+                return None
+
+            return self._mmap[entry[0] : entry[0] + entry[1]]
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        ttl_seconds: float,
+        tags: Iterable[str],
+        generation: int,
+    ) -> bool:
+        tags = sorted(tags)
+        if len(value) + self._entry_bytes(key, tags) > self.max_bytes // 2:
+            return False
+
+        with self._locked(exclusive=True):
+            self._load_index()
+            if generation != self._header()[2]:
+                return False
+
+            index = dict(self._index)
+            index.pop(key, None)
+            index_length = self._header()[4]
+
+            version, generation, end = self._begin_write()
+            needed = len(value) + self._entry_bytes(key, tags)
+            if end + needed + index_length > len(self._mmap):
+                index, end = self._compact(index, needed)
+
+            self._mmap[end : end + len(value)] = value
+            index[key] = [end, len(value), time.time() + ttl_seconds, tags]
+            self._commit(index, end + len(value), generation, version)
+            return True
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        tags = set(tags)
+
+        with self._locked(exclusive=True):
+            self._load_index()
+            index = {
+                key: entry
+                for key, entry in self._index.items()
+                if tags.isdisjoint(entry[3])
+            }
+
+            dropped = len(self._index) - len(index)
+
+            version, generation, end = self._begin_write()
+            self._commit(index, end, generation + 1, version)
+
+            self.invalidations += dropped
+            return dropped
+
+    def generation(self) -> int:
+        with self._locked(exclusive=False):
+            return self._header()[2]
+
+    def clear(self) -> None:
+        with self._locked(exclusive=True):
+            self._reset(self._header()[2] + 1)
+
+    def stats(self) -> dict:
+        with self._locked(exclusive=False):
+            self._load_index()
+            return {
+                "backend": self.name,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._index),
+                "bytes": sum(entry[1] for entry in self._index.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+class RedisBackend(CacheBackend):
+    """Values in Redis, shared by every worker of every host.
+
+    Each value is a key that expires with it, and each tag is a set of the keys
+    tagged with it. Values are stored in a transaction watching the generation
+    key, so one read before an invalidation is never stored after it. Redis' own
+    maxmemory policy bounds the memory used. Errors are logged and treated as a
+    miss, so the app keeps serving from the database while Redis is down.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str, timeout_seconds: float):
+        self.prefix = prefix
+        self.errors = 0
+        self.invalidations = 0
+        # Redis.from_url is annotated as returning None, so the pool is built here
+        self._client = redis.Redis(
+            connection_pool=redis.ConnectionPool.from_url(
+                url,
+                socket_timeout=timeout_seconds,
+                socket_connect_timeout=timeout_seconds,
+            )
+        )
+        self._generation_key = f"{prefix}generation"
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}entry:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def _error(self, action: str, error: redis.RedisError) -> None:
+        self.errors += 1
+        logger.warning("Redis response cache failed to %s: %s", action, error)
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            # redis-py annotates replies for both it's sync and async clients
+            return cast(bytes | None, self._client.get(self._entry_key(key)))
+        except redis.RedisError as error:
+            self._error("get", error)
+            return None
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        ttl_seconds: float,
+        tags: Iterable[str],
+        generation: int,
+    ) -> bool:
+        ttl_ms = max(int(ttl_seconds * 1000), 1)
+
+        try:
+            with self._client.pipeline() as pipeline:
+                pipeline.watch(self._generation_key)
+                stored = cast(bytes | None, pipeline.get(self._generation_key))
+                if int(stored or 0) != generation:
+                    return False
+
+                pipeline.multi()
+                pipeline.set(self._entry_key(key), value, px=ttl_ms)
+                # Every value has the same TTL, so a tag outlives the values in it
+                for tag in tags:
+                    pipeline.sadd(self._tag_key(tag), key)
+                    pipeline.pexpire(self._tag_key(tag), ttl_ms)
+                pipeline.execute()
+                return True
+        except redis.WatchError:
+            return False
+        except redis.RedisError as error:
+            self._error("set", error)
+            return False
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        tag_keys = [self._tag_key(tag) for tag in tags]
+
+        try:
+            # Bump the generation first, so values being read now aren't stored
+            self._client.incr(self._generation_key)
+            if not tag_keys:
+                return 0
+
+            keys = cast(set[bytes], self._client.sunion(tag_keys))
+            self._client.delete(
+                *(self._entry_key(key.decode()) for key in keys), *tag_keys
+            )
+        except redis.RedisError as error:
+            self._error("invalidate", error)
+            return 0
+
+        self.invalidations += len(keys)
+        return len(keys)
+
+    def generation(self) -> int:
+        try:
+            return int(cast(bytes | None, self._client.get(self._generation_key)) or 0)
+        except redis.RedisError as error:
+            self._error("get the generation", error)
+            # Never matches, so nothing is stored while Redis is unreachable
+            return -1
+
+    def clear(self) -> None:
+        try:
+            self._client.incr(self._generation_key)
+            keys = list(self._client.scan_iter(f"{self.prefix}entry:*"))
+            keys += self._client.scan_iter(f"{self.prefix}tag:*")
+            if keys:
+                self._client.delete(*keys)
+        except redis.RedisError as error:
+            self._error("clear", error)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+def create_backend(
+    name: str,
+    max_bytes: int,
+    shared_path: str,
+    redis_url: str,
+    redis_prefix: str,
+    redis_timeout_seconds: float,
+) -> CacheBackend:
+    """Create a cache backend by name
+
+    Args:
+        name (str): "memory", "shared-memory" or "redis"
+        max_bytes (int): Memory budget of the memory and shared memory backends
+        shared_path (str): File the shared memory backend maps
+        redis_url (str): Server the Redis backend connects to
+        redis_prefix (str): Prefix of every key the Redis backend stores
+        redis_timeout_seconds (float): How long to wait for Redis before a miss
+
+    Returns:
+        CacheBackend: The backend
+    """
+
+    if name == InProcessBackend.name:
+        return InProcessBackend(max_bytes)
+    if name == SharedMemoryBackend.name:
+        return SharedMemoryBackend(shared_path, max_bytes)
+    if name == RedisBackend.name:
+        return RedisBackend(redis_url, redis_prefix, redis_timeout_seconds)
+
+    raise ValueError(f"Unknown cache backend {name!r}")
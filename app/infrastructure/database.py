@@ -0,0 +1,398 @@
+"""The database module keeps a registry of the app's logical databases. Each database's
+engines and session factories are created on first use, not at import, and share the
+pool configuration from db_pool."""
+
+import os
+import threading
+from typing import AsyncIterator, Callable, Iterator
+
+from dotenv import load_dotenv
+from fastapi import Request
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.infrastructure.db_pool import get_pool_options
+from app.infrastructure.replicas import (
+    REPLICA_RETRY_SECONDS,
+    ReplicaSet,
+    reads_own_writes,
+)
+
+# The logical databases of the app, each is a schema on the same server
+DATABASES = ("main", "wedding")
+
+# The asyncio driver used in place of each database's default driver
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+Base = declarative_base()
+
+
+def get_async_connection_string(connection_string: str) -> str:
+    """Swap the driver of a connection string for its database's asyncio driver"""
+
+    scheme, separator, rest = connection_string.partition("://")
+    backend = scheme.split("+")[0]
+    return f"{ASYNC_DRIVERS.get(backend, scheme)}{separator}{rest}"
+
+
+def get_connection_string(database: str, is_async: bool = False) -> str:
+    """Get the connection string of a database from the environment.
+    The async connection string defaults to the sync one with the asyncio driver
+    swapped in, ASYNC_DB_CONNECTION_STRING overrides it.
+
+    Args:
+        database (str): Name of the database
+        is_async (bool): True for the connection string of the async engine
+
+    Returns:
+        str: The connection string
+    """
+
+    # Scripts may create an engine before anything else has loaded the .env file
+    load_dotenv()
+    connection_string = os.environ.get("DB_CONNECTION_STRING", "")
+
+    if is_async:
+        connection_string = os.environ.get(
+            "ASYNC_DB_CONNECTION_STRING"
+        ) or get_async_connection_string(connection_string)
+
+    return f"{connection_string}/{database}"
+
+
+def get_replica_connection_strings(database: str) -> list[str]:
+    """Get the async connection strings of a database's read replicas.
+    They are read from <DATABASE>_DB_REPLICA_CONNECTION_STRINGS, then
+    DB_REPLICA_CONNECTION_STRINGS, as comma separated server connection strings
+    like DB_CONNECTION_STRING. None means every read goes to the primary.
+
+    Args:
+        database (str): Name of the database
+
+    Returns:
+        list[str]: The connection string of each replica
+    """
+
+    load_dotenv()
+    replicas = os.environ.get(
+        f"{database.upper()}_DB_REPLICA_CONNECTION_STRINGS",
+        os.environ.get("DB_REPLICA_CONNECTION_STRINGS", ""),
+    )
+
+    return [
+        f"{get_async_connection_string(replica.strip())}/{database}"
+        for replica in replicas.split(",")
+        if replica.strip()
+    ]
+
+
+def make_sessionmaker(engine: Engine | AsyncEngine) -> sessionmaker:
+    """Make the session factory of an engine, of AsyncSessions for an AsyncEngine"""
+
+    if not isinstance(engine, AsyncEngine):
+        return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # Objects stay loaded after a commit, as reloading them would need IO outside
+    # of an await once the session has handed them to the route
+    return sessionmaker(
+        autoflush=False, expire_on_commit=False, bind=engine, class_=AsyncSession
+    )
+
+
+class ReplicaSession(AsyncSession):
+    """An AsyncSession for reads that picks it's replica the first time it needs a
+    connection, so a request that never queries, like a cache hit, never checks one
+    out. A replica that can't be reached is marked unhealthy and the next one is
+    tried, falling back to the primary the session was created with."""
+
+    def __init__(self, replica_set: ReplicaSet, **kwargs):
+        super().__init__(**kwargs)
+        self.replica_set = replica_set
+        self._replica_chosen = False
+
+    async def choose_replica(self) -> None:
+        """Bind the session to the next healthy replica, once"""
+
+        if self._replica_chosen:
+            return
+        self._replica_chosen = True
+        primary = self.bind
+
+        for index in self.replica_set.healthy():
+            self.bind = self.replica_set.sessionmakers[index].kw["bind"]
+            self.sync_session.bind = self.bind.sync_engine
+            try:
+                await super().connection()
+                return
+            except (DBAPIError, OSError):
+                await super().close()
+                self.replica_set.mark_unhealthy(index)
+
+        self.bind = primary
+        self.sync_session.bind = primary.sync_engine
+
+    async def connection(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().connection(*args, **kwargs)
+
+    async def execute(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().execute(*args, **kwargs)
+
+    async def scalar(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().scalar(*args, **kwargs)
+
+    async def scalars(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().scalars(*args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().get(*args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().stream(*args, **kwargs)
+
+    async def stream_scalars(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().stream_scalars(*args, **kwargs)
+
+    async def refresh(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().refresh(*args, **kwargs)
+
+    async def run_sync(self, *args, **kwargs):
+        await self.choose_replica()
+        return await super().run_sync(*args, **kwargs)
+
+
+class DatabaseRegistry:
+    """Creates the engine and session factory of a database the first time it is
+    asked for, then hands out the same ones for the life of the process."""
+
+    def __init__(self):
+        self._sessionmakers: dict[tuple[str, bool], sessionmaker] = {}
+        self._replica_sets: dict[str, ReplicaSet] = {}
+        self._dependencies: dict[tuple[str, bool | str], Callable] = {}
+        self._lock = threading.Lock()
+
+    def get_sessionmaker(self, database: str, is_async: bool = False) -> sessionmaker:
+        """Get the session factory of a database, creating its engine on first use
+
+        Args:
+            database (str): Name of the database
+            is_async (bool): True for the AsyncSession factory
+
+        Returns:
+            sessionmaker: The session factory
+        """
+
+        key = (database, is_async)
+        factory = self._sessionmakers.get(key)
+        if factory is not None:
+            return factory
+
+        with self._lock:
+            if key not in self._sessionmakers:
+                url = get_connection_string(database, is_async)
+                options = get_pool_options(database, is_async)
+                engine = (
+                    create_async_engine(url, **options)
+                    if is_async
+                    else create_engine(url, **options)
+                )
+                self._sessionmakers[key] = make_sessionmaker(engine)
+            return self._sessionmakers[key]
+
+    def get_replica_set(self, database: str) -> ReplicaSet:
+        """Get the read replicas of a database, creating their engines on first use
+
+        Args:
+            database (str): Name of the database
+
+        Returns:
+            ReplicaSet: The replicas, empty if the database has none
+        """
+
+        replica_set = self._replica_sets.get(database)
+        if replica_set is not None:
+            return replica_set
+
+        with self._lock:
+            if database not in self._replica_sets:
+                self._replica_sets[database] = ReplicaSet(
+                    [
+                        make_sessionmaker(
+                            create_async_engine(
+                                url,
+                                **get_pool_options(
+                                    database, True, f"{database}_replica{index}_async"
+                                ),
+                            )
+                        )
+                        for index, url in enumerate(
+                            get_replica_connection_strings(database)
+                        )
+                    ],
+                    REPLICA_RETRY_SECONDS,
+                )
+            return self._replica_sets[database]
+
+    def open_read_session(
+        self, database: str, prefer_primary: bool = False
+    ) -> AsyncSession:
+        """Open an AsyncSession for reads on the next healthy replica of a database.
+        The replica is chosen when the session first needs a connection, see
+        ReplicaSession. Falls back to the primary when there are no healthy
+        replicas.
+
+        Args:
+            database (str): Name of the database
+            prefer_primary (bool): True to read from the primary regardless
+
+        Returns:
+            AsyncSession: The session, to be closed by the caller
+        """
+
+        primary = self.get_sessionmaker(database, True)
+        replica_set = self.get_replica_set(database)
+
+        if prefer_primary or not replica_set.sessionmakers:
+            return primary()
+
+        return ReplicaSession(replica_set, **primary.kw)
+
+    def get_engine(self, database: str) -> Engine:
+        """Get the engine of a database, creating it on first use"""
+
+        return self.get_sessionmaker(database).kw["bind"]
+
+    def get_async_engine(self, database: str) -> AsyncEngine:
+        """Get the async engine of a database, creating it on first use"""
+
+        return self.get_sessionmaker(database, True).kw["bind"]
+
+    def bind(
+        self,
+        database: str,
+        engine: Engine | None = None,
+        async_engine: AsyncEngine | None = None,
+    ) -> None:
+        """Use the given engines for a database instead of creating them, for
+        scripts and benchmarks that run against their own database
+
+        Args:
+            database (str): Name of the database
+            engine (Engine | None): Engine to use for sync sessions
+            async_engine (AsyncEngine | None): Engine to use for async sessions
+        """
+
+        with self._lock:
+            if engine is not None:
+                self._sessionmakers[(database, False)] = make_sessionmaker(engine)
+            if async_engine is not None:
+                self._sessionmakers[(database, True)] = make_sessionmaker(async_engine)
+
+    def dependency(self, database: str) -> Callable[[], Iterator[Session]]:
+        """Get the request dependency that yields a session of a database.
+        The same function is returned every time, so every dependency of a request
+        that asks for it shares one session.
+
+        Args:
+            database (str): Name of the database
+
+        Returns:
+            Callable[[], Iterator[Session]]: The dependency
+        """
+
+        key = (database, False)
+
+        if key not in self._dependencies:
+
+            def get_db() -> Iterator[Session]:
+                db = self.get_sessionmaker(database)()
+                try:
+                    yield db
+                finally:
+                    db.close()
+
+            self._dependencies[key] = get_db
+
+        return self._dependencies[key]
+
+    def async_dependency(
+        self, database: str
+    ) -> Callable[[], AsyncIterator[AsyncSession]]:
+        """Get the request dependency that yields an AsyncSession of a database.
+        The same function is returned every time, so every dependency of a request
+        that asks for it shares one session.
+
+        Args:
+            database (str): Name of the database
+
+        Returns:
+            Callable[[], AsyncIterator[AsyncSession]]: The dependency
+        """
+
+        key = (database, True)
+
+        if key not in self._dependencies:
+
+            async def get_async_db() -> AsyncIterator[AsyncSession]:
+                async with self.get_sessionmaker(database, True)() as db:
+                    yield db
+
+            self._dependencies[key] = get_async_db
+
+        return self._dependencies[key]
+
+    def async_read_dependency(
+        self, database: str
+    ) -> Callable[[Request], AsyncIterator[AsyncSession]]:
+        """Get the request dependency that yields an AsyncSession of a database for
+        read only routes. It reads from a replica, unless the client wrote within
+        the read-your-writes window or no replica is healthy.
+
+        Args:
+            database (str): Name of the database
+
+        Returns:
+            Callable[[Request], AsyncIterator[AsyncSession]]: The dependency
+        """
+
+        key = (database, "read")
+
+        if key not in self._dependencies:
+
+            async def get_async_read_db(
+                request: Request,
+            ) -> AsyncIterator[AsyncSession]:
+                db = self.open_read_session(database, reads_own_writes(request))
+                try:
+                    yield db
+                finally:
+                    await db.close()
+
+            self._dependencies[key] = get_async_read_db
+
+        return self._dependencies[key]
+
+
+databases = DatabaseRegistry()
+
+get_main_db = databases.dependency("main")
+get_async_main_db = databases.async_dependency("main")
+get_async_main_read_db = databases.async_read_dependency("main")
+get_wedding_db = databases.dependency("wedding")
+get_async_wedding_db = databases.async_dependency("wedding")
+get_async_wedding_read_db = databases.async_read_dependency("wedding")
@@ -0,0 +1,164 @@
+"""The db_pool module configures the connection pools of the database engines from the
+environment, and records how long requests wait to check a connection out."""
+
+import os
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Each setting is read from <DATABASE>_DB_<NAME>, then DB_<NAME>, then these defaults.
+# Connections are recycled and pinged before use, as MySQL drops idle connections.
+POOL_DEFAULTS = {
+    "POOL_SIZE": "5",
+    "MAX_OVERFLOW": "10",
+    "POOL_TIMEOUT": "30",
+    "POOL_RECYCLE": "1800",
+    "POOL_PRE_PING": "true",
+}
+
+# Upper bounds, in seconds, of the checkout latency histogram buckets
+CHECKOUT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+
+class PoolMetrics:
+    """Checkout counters and a checkout latency histogram for one connection pool"""
+
+    def __init__(self):
+        self.pool: QueuePool | None = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.bucket_counts = [0] * (len(CHECKOUT_LATENCY_BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    def record_checkout(self, seconds: float) -> None:
+        """Record a checkout that took seconds, including any wait for a connection"""
+
+        index = next(
+            (
+                index
+                for index, bound in enumerate(CHECKOUT_LATENCY_BUCKETS)
+                if seconds <= bound
+            ),
+            len(CHECKOUT_LATENCY_BUCKETS),
+        )
+
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.bucket_counts[index] += 1
+
+    def record_timeout(self, seconds: float) -> None:
+        """Record a checkout that gave up waiting for a connection after seconds"""
+
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds += seconds
+
+    def stats(self) -> dict:
+        """Get the live pool usage and the checkout counters
+
+        Returns:
+            dict: Pool usage, checkout counts, total wait and the cumulative
+                latency histogram keyed by each bucket's upper bound
+        """
+
+        with self._lock:
+            histogram = {}
+            total = 0
+            for bound, count in zip(
+                (*map(str, CHECKOUT_LATENCY_BUCKETS), "+Inf"), self.bucket_counts
+            ):
+                total += count
+                histogram[bound] = total
+
+            return {
+                "size": self.pool.size() if self.pool else 0,
+                "checked_in": self.pool.checkedin() if self.pool else 0,
+                "checked_out": self.pool.checkedout() if self.pool else 0,
+                "overflow": max(self.pool.overflow(), 0) if self.pool else 0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds": self.wait_seconds,
+                "checkout_latency": histogram,
+            }
+
+
+class TimedPoolMixin:
+    """Times every checkout from the pool into the class's PoolMetrics"""
+
+    metrics: PoolMetrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The pool is rebuilt with the same class when the engine is disposed
+        self.metrics.pool = self
+
+    def connect(self):
+        start = time.perf_counter()
+
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - start)
+            raise
+
+        self.metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+pool_metrics: dict[str, PoolMetrics] = {}
+
+
+def get_pool_setting(database: str, name: str) -> str:
+    """Get a pool setting of a database from the environment"""
+
+    return os.environ.get(
+        f"{database.upper()}_DB_{name}",
+        os.environ.get(f"DB_{name}", POOL_DEFAULTS[name]),
+    )
+
+
+def get_pool_options(
+    database: str, is_async: bool = False, name: str | None = None
+) -> dict:
+    """Get the create_engine keyword arguments that configure a database's pool.
+    The pool records its checkouts in pool_metrics under name, which defaults to
+    the database's name suffixed with "_async" for the async engine.
+
+    Args:
+        database (str): Name of the database
+        is_async (bool): True for the options of the async engine
+        name (str | None): Name to record the pool's metrics under
+
+    Returns:
+        dict: Keyword arguments for create_engine or create_async_engine
+    """
+
+    name = name or (f"{database}_async" if is_async else database)
+    metrics = pool_metrics.setdefault(name, PoolMetrics())
+    base = AsyncAdaptedQueuePool if is_async else QueuePool
+    poolclass = type(
+        f"Timed{base.__name__}", (TimedPoolMixin, base), {"metrics": metrics}
+    )
+
+    return {
+        "poolclass": poolclass,
+        "pool_size": int(get_pool_setting(database, "POOL_SIZE")),
+        "max_overflow": int(get_pool_setting(database, "MAX_OVERFLOW")),
+        "pool_timeout": float(get_pool_setting(database, "POOL_TIMEOUT")),
+        "pool_recycle": int(get_pool_setting(database, "POOL_RECYCLE")),
+        "pool_pre_ping": get_pool_setting(database, "POOL_PRE_PING").lower() == "true",
+    }
+
+
+def get_pool_stats() -> dict[str, dict]:
+    """Get the stats of every pool, keyed by name
+
+    Returns:
+        dict[str, dict]: The stats of each pool
+    """
+
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
@@ -0,0 +1,109 @@
+"""The image_index module keeps an in-memory index of the files in the images directory,
+so checking that a Photo's file exists doesn't need a stat on every request."""
+
+import os
+import threading
+
+PHOTO_DIRECTORY = os.environ.get("PHOTO_DIRECTORY", "app/static/images")
+REFRESH_SECONDS = float(os.environ.get("IMAGE_INDEX_REFRESH_SECONDS", "60"))
+
+
+class ImageIndex:
+    """An index of the filenames in a directory.
+
+    The index is built with os.scandir the first time it is used and rebuilt by a
+    background thread every refresh_seconds once started. A filename missing from
+    the index is checked on disk before being reported as missing, so files copied
+    in since the last scan are found straight away. Deleted files are dropped at
+    the next scan.
+    """
+
+    def __init__(self, directory: str, refresh_seconds: float):
+        self.directory = directory
+        self.refresh_seconds = refresh_seconds
+        self._filenames: set[str] | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self) -> None:
+        """Rebuild the index from a scan of the directory"""
+
+        filenames = set()
+
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as entries:
+                filenames = {entry.name for entry in entries if entry.is_file()}
+
+        with self._lock:
+            self._filenames = filenames
+
+    def contains(self, filename: str) -> bool:
+        """Check if a file exists in the directory
+
+        Args:
+            filename (str): Filename to check
+
+        Returns:
+            bool: True if the file exists, False if it does not
+        """
+
+        if self._filenames is not None and filename in self._filenames:
+            return True
+
+        return filename in self.contains_all({filename})
+
+    def contains_all(self, filenames: set[str]) -> set[str]:
+        """Find which of the given files exist in the directory
+
+        Args:
+            filenames (set[str]): Filenames to check
+
+        Returns:
+            set[str]: The filenames that exist
+        """
+
+        if self._filenames is None:
+            self.refresh()
+
+        with self._lock:
+            found = filenames & (self._filenames or set())
+
+        for filename in filenames - found:
+            if os.path.isfile(os.path.join(self.directory, filename)):
+                found.add(filename)
+                with self._lock:
+                    if self._filenames is not None:
+                        self._filenames.add(filename)
+
+        return found
+
+    def start(self) -> None:
+        """Start rescanning the directory in a background thread"""
+
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="image-index", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background rescan"""
+
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        self.refresh()
+        while not self._stop.wait(self.refresh_seconds):
+            self.refresh()
+
+
+image_index = ImageIndex(PHOTO_DIRECTORY, REFRESH_SECONDS)
@@ -0,0 +1,225 @@
+"""The metrics module serves the app's telemetry in the Prometheus text format.
+Requests are counted and timed per route, method and status, and the in-flight
+requests, threadpool and database pools are sampled every few seconds.
+
+When PROMETHEUS_MULTIPROC_DIR is set, each uvicorn worker writes its metrics to files
+in that directory and /metrics adds them up across every worker. The directory must
+exist and be emptied before the workers start."""
+
+import asyncio
+import os
+import time
+
+from anyio import to_thread
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.infrastructure.db_pool import get_pool_stats
+
+IS_MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+# How often the gauges of each worker are sampled
+METRICS_REFRESH_SECONDS = float(os.environ.get("METRICS_REFRESH_SECONDS", "5"))
+# Upper bounds, in seconds, of the request latency histogram buckets
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# The histogram's _count is the number of requests served
+request_latency = Histogram(
+    "http_request_duration_seconds",
+    "Time taken to serve a request, including streaming its body",
+    ["method", "route", "status"],
+    buckets=REQUEST_LATENCY_BUCKETS,
+)
+# Gauges of the live workers are added up across workers
+requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests being served", multiprocess_mode="livesum"
+)
+threadpool_threads = Gauge(
+    "threadpool_threads", "Threads the threadpool may run", multiprocess_mode="livesum"
+)
+threadpool_threads_busy = Gauge(
+    "threadpool_threads_busy",
+    "Threads running a call in the threadpool",
+    multiprocess_mode="livesum",
+)
+threadpool_queue_depth = Gauge(
+    "threadpool_queue_depth",
+    "Calls waiting for a threadpool thread",
+    multiprocess_mode="livesum",
+)
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Connections of a database pool, by checked_in, checked_out and overflow",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+db_pool_checkouts = Counter(
+    "db_pool_checkouts", "Connections checked out of a database pool", ["pool"]
+)
+db_pool_timeouts = Counter(
+    "db_pool_timeouts",
+    "Checkouts that gave up waiting for a database connection",
+    ["pool"],
+)
+db_pool_wait_seconds = Counter(
+    "db_pool_checkout_wait_seconds",
+    "Time spent checking connections out of a database pool",
+    ["pool"],
+)
+
+
+# Methods recorded by name, any other method shares the "other" label
+HTTP_METHODS = frozenset(
+    {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "CONNECT", "TRACE"}
+)
+
+
+def get_method_label(scope: Scope) -> str:
+    """Get the method of a request. Clients can send any method, so methods that
+    aren't standard share one label, and can't grow the number of series."""
+
+    method = scope["method"]
+    return method if method in HTTP_METHODS else "other"
+
+
+def get_route_label(scope: Scope) -> str:
+    """Get the path template of the route that served a request.
+    Unmatched paths share one label, so they can't grow the number of series."""
+
+    route = scope.get("route")
+    root_path = scope.get("root_path", "")
+
+    if route is not None:
+        return root_path + route.path
+
+    return f"{root_path}/*" if root_path else "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """Counts and times every request by route, method and status"""
+
+    # Requests being served by this worker, sampled into requests_in_flight
+    in_flight = 0
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # The labelled histogram of each (method, route, status), as looking it
+        # up costs more than recording the request
+        self._histograms: dict[tuple[str, str, int], Histogram] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        RequestMetricsMiddleware.in_flight += 1
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            seconds = time.perf_counter() - start
+            RequestMetricsMiddleware.in_flight -= 1
+
+            # The router sets the route on the scope while handling the request
+            key = (get_method_label(scope), get_route_label(scope), status)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = request_latency.labels(key[0], key[1], str(status))
+                self._histograms[key] = histogram
+
+            histogram.observe(seconds)
+
+
+class MetricsRefresher:
+    """Samples the in-flight requests, threadpool and database pools into their
+    metrics every refresh_seconds once started. Must run on the event loop."""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._reported: dict[str, dict] = {}
+        self._task: asyncio.Task | None = None
+
+    def refresh(self) -> None:
+        """Sample the in-flight requests, threadpool and database pools now"""
+
+        requests_in_flight.set(RequestMetricsMiddleware.in_flight)
+
+        limiter = to_thread.current_default_thread_limiter().statistics()
+        threadpool_threads.set(limiter.total_tokens)
+        threadpool_threads_busy.set(limiter.borrowed_tokens)
+        threadpool_queue_depth.set(limiter.tasks_waiting)
+
+        for pool, stats in get_pool_stats().items():
+            for state in ("checked_in", "checked_out", "overflow"):
+                db_pool_connections.labels(pool, state).set(stats[state])
+
+            # The pools keep running totals, so only what's new since the last
+            # sample is added to the counters
+            reported = self._reported.get(pool, {})
+            for counter, name in (
+                (db_pool_checkouts, "checkouts"),
+                (db_pool_timeouts, "timeouts"),
+                (db_pool_wait_seconds, "wait_seconds"),
+            ):
+                counter.labels(pool).inc(stats[name] - reported.get(name, 0))
+            self._reported[pool] = stats
+
+    async def _run(self) -> None:
+        while True:
+            self.refresh()
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self) -> None:
+        """Start sampling in a background task"""
+
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        """Stop sampling, and drop this worker's gauges from the other workers'"""
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        if IS_MULTIPROCESS:
+            multiprocess.mark_process_dead(os.getpid())
+
+
+metrics_refresher = MetricsRefresher(METRICS_REFRESH_SECONDS)
+
+
+def render_metrics() -> bytes:
+    """Get every metric in the Prometheus text format, added up across workers
+    when running with PROMETHEUS_MULTIPROC_DIR. Must run on the event loop.
+
+    Returns:
+        bytes: The metrics
+    """
+
+    # The worker answering the scrape reports its current gauges, the others
+    # report their last sample
+    metrics_refresher.refresh()
+
+    if not IS_MULTIPROCESS:
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
@@ -0,0 +1,249 @@
+"""Versioned schema migrations for the main and wedding databases.
+
+Each migration is a module in this package named mNNNN_description.py, with a
+DATABASE name ("main" or "wedding") and an upgrade(connection) function.
+The versions applied to a database are recorded in it's schema_migrations table.
+
+Apply every pending migration with:
+
+    python -m app.infrastructure.migrations
+
+A database created from the models with create_all already has every migration's
+changes, record them as applied instead with:
+
+    python -m app.infrastructure.migrations stamp
+
+and check whether any are pending, exiting with 1 if so, with:
+
+    python -m app.infrastructure.migrations check
+"""
+
+import importlib
+import pkgutil
+from types import ModuleType
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, select
+from sqlalchemy.engine import Connection, Engine
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+)
+
+
+def get_migrations(database: str) -> list[tuple[int, ModuleType]]:
+    """Get the migrations of a database, ordered by version
+
+    Args:
+        database (str): Name of the database
+
+    Returns:
+        list[tuple[int, ModuleType]]: The version and module of each migration
+    """
+
+    migrations = []
+
+    for module_info in pkgutil.iter_modules(__path__):
+        if not module_info.name.startswith("m"):
+            continue
+
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        if module.DATABASE == database:
+            migrations.append((int(module_info.name[1:5]), module))
+
+    return sorted(migrations, key=lambda migration: migration[0])
+
+
+def get_migration_name(module: ModuleType) -> str:
+    """Get the name a migration is recorded under, the name of it's module"""
+
+    return module.__name__.rsplit(".", 1)[1]
+
+
+def get_pending_migrations(
+    engine: Engine, database: str
+) -> list[tuple[int, ModuleType]]:
+    """Get the migrations of a database that aren't recorded as applied
+
+    Args:
+        engine (Engine): Engine connected to the database
+        database (str): Name of the database
+
+    Returns:
+        list[tuple[int, ModuleType]]: The version and module of each migration
+    """
+
+    schema_migrations.create(engine, checkfirst=True)
+
+    with engine.connect() as connection:
+        applied = set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+    return [
+        (version, module)
+        for version, module in get_migrations(database)
+        if version not in applied
+    ]
+
+
+def migrate(engine: Engine, database: str) -> list[str]:
+    """Apply the pending migrations of a database, each in it's own transaction
+
+    Args:
+        engine (Engine): Engine connected to the database
+        database (str): Name of the database
+
+    Returns:
+        list[str]: Names of the migrations applied
+    """
+
+    names = []
+
+    for version, module in get_pending_migrations(engine, database):
+        name = get_migration_name(module)
+        with engine.begin() as connection:
+            module.upgrade(connection)
+            connection.execute(
+                schema_migrations.insert().values(version=version, name=name)
+            )
+        names.append(name)
+
+    return names
+
+
+def stamp(engine: Engine, database: str) -> list[str]:
+    """Record the pending migrations of a database as applied without running them,
+    for a database created from the models that already has their changes
+
+    Args:
+        engine (Engine): Engine connected to the database
+        database (str): Name of the database
+
+    Returns:
+        list[str]: Names of the migrations recorded
+    """
+
+    pending = get_pending_migrations(engine, database)
+
+    with engine.begin() as connection:
+        for version, module in pending:
+            connection.execute(
+                schema_migrations.insert().values(
+                    version=version, name=get_migration_name(module)
+                )
+            )
+
+    return [get_migration_name(module) for _, module in pending]
+
+
+def add_column(connection: Connection, table_name: str, column: Column) -> None:
+    """Add a column to an existing table
+
+    Args:
+        connection (Connection): Connection to the database
+        table_name (str): Name of the table
+        column (Column): The column to add, with it's type, nullability and default
+    """
+
+    preparer = connection.dialect.identifier_preparer
+    definition = (
+        f"{preparer.quote(column.name)} {column.type.compile(connection.dialect)}"
+    )
+
+    if column.server_default is not None:
+        definition += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        definition += " NOT NULL"
+
+    connection.exec_driver_sql(
+        f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {definition}"
+    )
+
+
+def alter_column_type(connection: Connection, table_name: str, column: Column) -> None:
+    """Change the type of an existing column, converting it's values like the
+    database casts them. SQLite columns accept values of any type, so only the
+    values need converting there, which is left to the migration.
+
+    Args:
+        connection (Connection): Connection to the database
+        table_name (str): Name of the table
+        column (Column): The column with it's new type and nullability
+    """
+
+    dialect = connection.dialect
+    if dialect.name == "sqlite":
+        return
+
+    preparer = dialect.identifier_preparer
+    name = preparer.quote(column.name)
+    column_type = column.type.compile(dialect)
+
+    if dialect.name == "mysql":
+        definition = f"MODIFY COLUMN {name} {column_type}"
+        definition += " NULL" if column.nullable else " NOT NULL"
+    else:
+        definition = f"ALTER COLUMN {name} TYPE {column_type}"
+
+    connection.exec_driver_sql(f"ALTER TABLE {preparer.quote(table_name)} {definition}")
+
+
+def create_index(
+    connection: Connection,
+    table_name: str,
+    index_name: str,
+    column_names: list[str],
+    unique: bool = False,
+) -> None:
+    """Create an index on an existing table. A unique index fails to create while
+    the table holds duplicate values, those must be resolved by hand first.
+
+    Args:
+        connection (Connection): Connection to the database
+        table_name (str): Name of the table
+        index_name (str): Name of the index
+        column_names (list[str]): Names of the indexed columns, in order
+        unique (bool): True to reject duplicate values
+    """
+
+    preparer = connection.dialect.identifier_preparer
+    columns = ", ".join(preparer.quote(name) for name in column_names)
+
+    connection.exec_driver_sql(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX {preparer.quote(index_name)} "
+        f"ON {preparer.quote(table_name)} ({columns})"
+    )
+
+
+def rebuild_table(connection: Connection, table: Table) -> None:
+    """Replace an existing table with a new definition of it, for changes ALTER TABLE
+    can't make on every database, like adding a primary key. The distinct rows are
+    copied across, rows with a NULL in a primary key column are dropped. Indexes
+    are not copied, create them afterwards.
+
+    Args:
+        connection (Connection): Connection to the database
+        table (Table): The new definition, with the name of the existing table
+    """
+
+    preparer = connection.dialect.identifier_preparer
+    staging = table.to_metadata(table.metadata, name=f"{table.name}_rebuild")
+    staging.create(connection)
+
+    columns = ", ".join(preparer.quote(column.name) for column in table.columns)
+    not_null = " AND ".join(
+        f"{preparer.quote(column.name)} IS NOT NULL"
+        for column in table.primary_key.columns
+    )
+
+    connection.exec_driver_sql(
+        f"INSERT INTO {preparer.quote(staging.name)} ({columns}) "
+        f"SELECT DISTINCT {columns} FROM {preparer.quote(table.name)}"
+        + (f" WHERE {not_null}" if not_null else "")
+    )
+    connection.exec_driver_sql(f"DROP TABLE {preparer.quote(table.name)}")
+    connection.exec_driver_sql(
+        f"ALTER TABLE {preparer.quote(staging.name)} "
+        f"RENAME TO {preparer.quote(table.name)}"
+    )
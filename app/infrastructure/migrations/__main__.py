@@ -0,0 +1,41 @@
+"""Apply, stamp or check the migrations of the main and wedding databases."""
+
+import argparse
+import sys
+
+from app.infrastructure.database import DATABASES, databases
+from app.infrastructure.migrations import (
+    get_migration_name,
+    get_pending_migrations,
+    migrate,
+    stamp,
+)
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument(
+    "command",
+    nargs="?",
+    default="upgrade",
+    choices=["upgrade", "stamp", "check"],
+    help="apply the pending migrations (the default), record them as applied "
+    "without running them, or exit with 1 if any are pending",
+)
+args = parser.parse_args()
+
+pending = False
+
+for database in DATABASES:
+    engine = databases.get_engine(database)
+
+    if args.command == "upgrade":
+        for name in migrate(engine, database):
+            print(f"{database}: applied {name}")
+    elif args.command == "stamp":
+        for name in stamp(engine, database):
+            print(f"{database}: stamped {name}")
+    else:
+        for _, module in get_pending_migrations(engine, database):
+            print(f"{database}: pending {get_migration_name(module)}")
+            pending = True
+
+sys.exit(1 if pending else 0)
@@ -0,0 +1,18 @@
+"""Add Users.tokenVersion, bumped to revoke access tokens carrying role claims."""
+
+from sqlalchemy import Column, Integer
+from sqlalchemy.engine import Connection
+
+from app.infrastructure.migrations import add_column
+
+DATABASE = "main"
+
+
+def upgrade(connection: Connection) -> None:
+    """Add the tokenVersion column"""
+
+    add_column(
+        connection,
+        "Users",
+        Column("tokenVersion", Integer, nullable=False, server_default="0"),
+    )
@@ -0,0 +1,57 @@
+"""Add unique indexes to the columns Users, Roles, Projects, Photos and Albums are
+looked up by, and primary keys and reverse lookup indexes to the join tables."""
+
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, Table
+from sqlalchemy.engine import Connection
+
+from app.infrastructure.migrations import create_index, rebuild_table
+
+DATABASE = "main"
+
+# (table, column) of every column that's unique and looked up by value
+UNIQUE_COLUMNS = [
+    ("Users", "username"),
+    ("Users", "email"),
+    ("Roles", "roleKey"),
+    ("Projects", "ProjectKey"),
+    ("Photo", "filename"),
+    ("Album", "title"),
+]
+
+
+def upgrade(connection: Connection) -> None:
+    """Create the indexes and rebuild the join tables with their primary keys"""
+
+    for table_name, column_name in UNIQUE_COLUMNS:
+        create_index(
+            connection,
+            table_name,
+            f"ix_{table_name}_{column_name}",
+            [column_name],
+            unique=True,
+        )
+
+    metadata = MetaData()
+    metadata.reflect(connection, only=["Users", "Roles", "Photo", "Album"])
+
+    rebuild_table(
+        connection,
+        Table(
+            "UserRole",
+            metadata,
+            Column("userId", Integer, ForeignKey("Users.id"), primary_key=True),
+            Column("roleId", Integer, ForeignKey("Roles.id"), primary_key=True),
+        ),
+    )
+    create_index(connection, "UserRole", "ix_UserRole_roleId", ["roleId"])
+
+    rebuild_table(
+        connection,
+        Table(
+            "AlbumPhoto",
+            metadata,
+            Column("photo_id", Integer, ForeignKey("Photo.id"), primary_key=True),
+            Column("album_id", Integer, ForeignKey("Album.id"), primary_key=True),
+        ),
+    )
+    create_index(connection, "AlbumPhoto", "ix_AlbumPhoto_album_id", ["album_id"])
@@ -0,0 +1,13 @@
+"""Add a unique index to faq.question, which FAQs are checked for duplicates by."""
+
+from sqlalchemy.engine import Connection
+
+from app.infrastructure.migrations import create_index
+
+DATABASE = "wedding"
+
+
+def upgrade(connection: Connection) -> None:
+    """Create the faq.question index"""
+
+    create_index(connection, "faq", "ix_faq_question", ["question"], unique=True)
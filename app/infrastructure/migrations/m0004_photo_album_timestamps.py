@@ -0,0 +1,38 @@
+"""Store the created_at and updated_at of Photos and Albums as DATETIME rather than
+DATE, they version the Photos and Albums for conditional GETs so need more than a
+day's resolution. Existing dates become midnight of that day."""
+
+from sqlalchemy import Column, DateTime
+from sqlalchemy.dialects import mysql
+from sqlalchemy.engine import Connection
+
+from app.infrastructure.migrations import alter_column_type
+
+DATABASE = "main"
+
+TABLES = ["Photo", "Album"]
+COLUMNS = ["created_at", "updated_at"]
+
+# MySQL's DATETIME drops the fraction of a second unless it's precision is given
+TIMESTAMP = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
+
+def upgrade(connection: Connection) -> None:
+    """Change the columns' type, and on SQLite append a time to the stored dates"""
+
+    preparer = connection.dialect.identifier_preparer
+
+    for table_name in TABLES:
+        for column_name in COLUMNS:
+            alter_column_type(
+                connection, table_name, Column(column_name, TIMESTAMP, nullable=True)
+            )
+
+            if connection.dialect.name == "sqlite":
+                # SQLite keeps dates as text, which DateTime can't read without a time
+                column = preparer.quote(column_name)
+                connection.exec_driver_sql(
+                    f"UPDATE {preparer.quote(table_name)} "
+                    f"SET {column} = {column} || ' 00:00:00.000000' "
+                    f"WHERE length({column}) = 10"
+                )
@@ -1,17 +1,31 @@
 """_summary_: The ProjectModel is used to represent a Project in the database.
 """
 from venv import create
-from sqlalchemy import Boolean, Column, Date, ForeignKey, Integer, String, Table
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    Table,
+)
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 
-from app.infrastructure.main_database import Base
+from app.infrastructure.database import Base
+
+# Versions Photos and Albums for conditional GETs, so it keeps the fraction of a
+# second MySQL's DATETIME would otherwise drop
+TIMESTAMP = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
 
 
 user_role = Table(
     "UserRole",
     Base.metadata,
-    Column("userId", Integer, ForeignKey("Users.id")),
-    Column("roleId", Integer, ForeignKey("Roles.id")),
+    Column("userId", Integer, ForeignKey("Users.id"), primary_key=True),
+    Column("roleId", Integer, ForeignKey("Roles.id"), primary_key=True, index=True),
 )
 
 
@@ -21,13 +35,16 @@ class UserModel(Base):
     __tablename__ = "Users"
 
     user_id = Column("id", Integer, primary_key=True, index=True)
-    username = Column("username", String(255), nullable=False)
-    email = Column("email", String(255), nullable=False)
+    username = Column("username", String(255), nullable=False, unique=True, index=True)
+    email = Column("email", String(255), nullable=False, unique=True, index=True)
     first_name = Column("firstname", String(255), nullable=False)
     last_name = Column("lastname", String(255), nullable=False)
     preferred_name = Column("preferredname", String(255), nullable=True)
     password_hash = Column("passwordhash", String(255), nullable=False)
     is_admin = Column("isAdmin", Boolean, nullable=False)
+    token_version = Column(
+        "tokenVersion", Integer, nullable=False, default=0, server_default="0"
+    )
     created_at = Column("created_at", Date, nullable=True)
     updated_at = Column("updated_at", Date, nullable=True)
 
@@ -40,7 +57,7 @@ class RoleModel(Base):
     __tablename__ = "Roles"
 
     role_id = Column("id", Integer, primary_key=True, index=True)
-    role_key = Column("roleKey", String(255), nullable=False)
+    role_key = Column("roleKey", String(255), nullable=False, unique=True, index=True)
     role_name = Column("roleName", String(255), nullable=False)
     created_at = Column("created_at", Date, nullable=True)
 
@@ -51,7 +68,9 @@ class ProjectModel(Base):
     __tablename__ = "Projects"
 
     project_id = Column("ProjectID", Integer, primary_key=True, index=True)
-    project_key = Column("ProjectKey", String(255), nullable=False)
+    project_key = Column(
+        "ProjectKey", String(255), nullable=False, unique=True, index=True
+    )
     title = Column("Title", String(255), nullable=False)
     image_src = Column("ImageSrc", String(1023), nullable=False)
     source_uri = Column("SourceUri", String(1023), nullable=False)
@@ -63,8 +82,8 @@ class ProjectModel(Base):
 album_photo = Table(
     "AlbumPhoto",
     Base.metadata,
-    Column("photo_id", Integer, ForeignKey("Photo.id")),
-    Column("album_id", Integer, ForeignKey("Album.id")),
+    Column("photo_id", Integer, ForeignKey("Photo.id"), primary_key=True),
+    Column("album_id", Integer, ForeignKey("Album.id"), primary_key=True, index=True),
 )
 
 
@@ -74,7 +93,7 @@ class PhotoModel(Base):
     __tablename__ = "Photo"
 
     id = Column("id", Integer, primary_key=True, index=True)
-    filename = Column("filename", String(255), nullable=False)
+    filename = Column("filename", String(255), nullable=False, unique=True, index=True)
     title = Column("title", String(255), nullable=True)
     description = Column("description", String, nullable=True)
     url = Column("url", String(255), nullable=True)
@@ -82,8 +101,8 @@ class PhotoModel(Base):
     height = Column("height", Integer, nullable=True)
     upload_date = Column("upload_date", Date, nullable=True)
     format = Column("format", String(10), nullable=True)
-    created_at = Column("created_at", Date, nullable=True)
-    updated_at = Column("updated_at", Date, nullable=True)
+    created_at = Column("created_at", TIMESTAMP, nullable=True)
+    updated_at = Column("updated_at", TIMESTAMP, nullable=True)
 
 
 class AlbumModel(Base):
@@ -92,11 +111,11 @@ class AlbumModel(Base):
     __tablename__ = "Album"
 
     id = Column("id", Integer, primary_key=True, index=True)
-    title = Column("title", String(255), nullable=False)
+    title = Column("title", String(255), nullable=False, unique=True, index=True)
     description = Column("description", String, nullable=True)
     cover_photo_id = Column(Integer, ForeignKey("Photo.id"), nullable=True)
-    created_at = Column("created_at", Date, nullable=True)
-    updated_at = Column("updated_at", Date, nullable=True)
+    created_at = Column("created_at", TIMESTAMP, nullable=True)
+    updated_at = Column("updated_at", TIMESTAMP, nullable=True)
 
     cover_photo = relationship("PhotoModel")
     photos = relationship("PhotoModel", secondary=album_photo)
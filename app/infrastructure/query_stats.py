@@ -0,0 +1,158 @@
+"""The query_stats module counts and times the SQL statements each request issues,
+and flags requests that repeat one statement often enough to look like an N+1 query.
+Statements are recorded from engine events, into the stats of the request running
+them, so every engine is covered and nothing is recorded outside a request."""
+
+from collections import Counter
+from contextvars import ContextVar
+import logging
+import os
+import random
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Fraction of requests whose statements are recorded
+QUERY_STATS_SAMPLE_RATE = float(os.environ.get("DB_QUERY_STATS_SAMPLE_RATE", "1"))
+# Times one statement can run in a request before it's flagged as an N+1 query
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("DB_N_PLUS_ONE_THRESHOLD", "10"))
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """The statements run while serving one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # Statements are parameterised, so the SQL text fingerprints a query
+        self.statements: Counter[str] = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        """Record a statement that took seconds to run"""
+
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def most_repeated(self) -> tuple[str, int]:
+        """Get the statement run the most times and how many times it ran"""
+
+        return self.statements.most_common(1)[0] if self.statements else ("", 0)
+
+
+current_query_stats: ContextVar[QueryStats | None] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(connection, cursor, statement, parameters, context, many):
+    """Note when a statement of a sampled request starts"""
+
+    if current_query_stats.get() is not None:
+        connection.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_query(connection, cursor, statement, parameters, context, many):
+    """Record a statement of a sampled request in its stats"""
+
+    stats = current_query_stats.get()
+    start = connection.info.pop("query_start", None)
+    if stats is not None and start is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+
+class QueryTotals:
+    """Running totals over every sampled request"""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.seconds = 0.0
+        self.n_plus_one_requests = 0
+        self._lock = threading.Lock()
+
+    def add(self, stats: QueryStats, is_n_plus_one: bool) -> None:
+        """Add the statements of a finished request to the totals"""
+
+        with self._lock:
+            self.requests += 1
+            self.queries += stats.count
+            self.seconds += stats.seconds
+            self.n_plus_one_requests += is_n_plus_one
+
+    def stats(self) -> dict:
+        """Get the totals
+
+        Returns:
+            dict: Sampled requests, their statements, total statement time and
+                how many were flagged as N+1 queries
+        """
+
+        with self._lock:
+            return {
+                "sample_rate": QUERY_STATS_SAMPLE_RATE,
+                "requests": self.requests,
+                "queries": self.queries,
+                "seconds": self.seconds,
+                "n_plus_one_requests": self.n_plus_one_requests,
+            }
+
+
+query_totals = QueryTotals()
+
+
+class QueryStatsMiddleware:
+    """Records the statements of a sample of requests. Their count and time are
+    added to the response headers, and requests that look like N+1 queries are
+    logged with the repeated statement."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or random.random() >= QUERY_STATS_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+
+        async def send_with_stats(message: Message) -> None:
+            # Statements run while the body streams are logged, but are too late
+            # for the headers
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-db-query-count", str(stats.count).encode()),
+                    (b"x-db-query-time-ms", f"{stats.seconds * 1e3:.2f}".encode()),
+                ]
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            current_query_stats.reset(token)
+
+            statement, repeats = stats.most_repeated()
+            is_n_plus_one = repeats >= N_PLUS_ONE_THRESHOLD
+            query_totals.add(stats, is_n_plus_one)
+
+            if is_n_plus_one:
+                logger.warning(
+                    "Possible N+1 query: %s %s ran %d statements in %.1f ms, "
+                    "this one %d times: %s",
+                    scope["method"],
+                    scope["path"],
+                    stats.count,
+                    stats.seconds * 1e3,
+                    repeats,
+                    statement,
+                )
@@ -0,0 +1,192 @@
+"""The replicas module spreads reads across a database's read replicas, and keeps a
+client reading from the primary for a short window after it writes, so it always
+sees its own changes.
+
+Browsers carry the window in a cookie. Clients sending a Bearer token, which often
+don't keep cookies, have the window kept by the worker that served the write,
+keyed by their token. A read reaching another worker may still use a replica."""
+
+from collections import OrderedDict
+from http.cookies import SimpleCookie
+import itertools
+import math
+import os
+import threading
+import time
+
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# How long a replica that failed to connect is skipped for
+REPLICA_RETRY_SECONDS = float(os.environ.get("DB_REPLICA_RETRY_SECONDS", "30"))
+# How long a client reads from the primary after a write, should cover replica lag
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_COOKIE = "read_primary_until"
+READ_YOUR_WRITES_MAX_TOKENS = int(
+    os.environ.get("DB_READ_YOUR_WRITES_MAX_TOKENS", "10000")
+)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class ReplicaSet:
+    """The session factories of a database's replicas, handed out round-robin.
+    A replica that fails to connect is skipped for retry_seconds."""
+
+    def __init__(self, sessionmakers: list[sessionmaker], retry_seconds: float):
+        self.sessionmakers = sessionmakers
+        self.retry_seconds = retry_seconds
+        self._unhealthy_until = [0.0] * len(sessionmakers)
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def healthy(self) -> list[int]:
+        """Get the indexes of the healthy replicas, starting from the next in turn
+
+        Returns:
+            list[int]: Indexes into sessionmakers, in the order to try them
+        """
+
+        if not self.sessionmakers:
+            return []
+
+        now = time.monotonic()
+        with self._lock:
+            start = next(self._counter) % len(self.sessionmakers)
+
+        return [
+            index % len(self.sessionmakers)
+            for index in range(start, start + len(self.sessionmakers))
+            if self._unhealthy_until[index % len(self.sessionmakers)] <= now
+        ]
+
+    def mark_unhealthy(self, index: int) -> None:
+        """Skip a replica until retry_seconds from now
+
+        Args:
+            index (int): Index of the replica in sessionmakers
+        """
+
+        self._unhealthy_until[index] = time.monotonic() + self.retry_seconds
+
+
+class WriteWindows:
+    """When each Bearer token's read-your-writes window ends, in this worker.
+    The token whose window ends first is dropped once max_entries is reached."""
+
+    def __init__(self, seconds: float, max_entries: int):
+        self.seconds = seconds
+        self.max_entries = max_entries
+        self._until: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def open(self, token: str) -> None:
+        """Start a token's window, after it's client wrote
+
+        Args:
+            token (str): The Bearer token
+        """
+
+        with self._lock:
+            self._until[token] = time.time() + self.seconds
+            self._until.move_to_end(token)
+
+            while len(self._until) > self.max_entries:
+                self._until.popitem(last=False)
+
+    def is_open(self, token: str) -> bool:
+        """Check if a token's window is open
+
+        Args:
+            token (str): The Bearer token
+
+        Returns:
+            bool: True if the token's client wrote within the window
+        """
+
+        with self._lock:
+            until = self._until.get(token)
+            if until is None:
+                return False
+            if until <= time.time():
+                del self._until[token]
+                return False
+            return True
+
+    def clear(self) -> None:
+        """Close every window"""
+
+        with self._lock:
+            self._until.clear()
+
+
+write_windows = WriteWindows(READ_YOUR_WRITES_SECONDS, READ_YOUR_WRITES_MAX_TOKENS)
+
+
+def get_bearer_token(connection: HTTPConnection) -> str | None:
+    """Get the Bearer token a request was sent with, None if there isn't one"""
+
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+
+    return token
+
+
+def reads_own_writes(connection: HTTPConnection) -> bool:
+    """Check if a request comes from a client that wrote within the read-your-writes
+    window, so must read from the primary. A cookie ending the window further out
+    than a write could have set it is ignored, so a client can't pin itself to the
+    primary."""
+
+    token = get_bearer_token(connection)
+    if token is not None and write_windows.is_open(token):
+        return True
+
+    try:
+        until = float(connection.cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+    except ValueError:
+        return False
+
+    now = time.time()
+    return now < until <= now + READ_YOUR_WRITES_SECONDS
+
+
+class ReadYourWritesMiddleware:
+    """Sets the read-your-writes cookie on the response to every successful write,
+    and opens the window of the Bearer token it was sent with"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                token = get_bearer_token(HTTPConnection(scope))
+                if token is not None:
+                    write_windows.open(token)
+
+                cookie: SimpleCookie = SimpleCookie()
+                cookie[READ_YOUR_WRITES_COOKIE] = str(
+                    time.time() + READ_YOUR_WRITES_SECONDS
+                )
+                cookie[READ_YOUR_WRITES_COOKIE]["max-age"] = math.ceil(
+                    READ_YOUR_WRITES_SECONDS
+                )
+                cookie[READ_YOUR_WRITES_COOKIE]["path"] = "/"
+                cookie[READ_YOUR_WRITES_COOKIE]["samesite"] = "Lax"
+
+                header = cookie.output(header="").strip().encode("latin-1")
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"set-cookie", header),
+                ]
+
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
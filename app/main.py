@@ -2,23 +2,52 @@
 """
 
 from datetime import timedelta
-from typing import Annotated, Dict, List
+from typing import Annotated, AsyncIterator, Dict, List
+from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
-from fastapi import Depends
-from fastapi.responses import RedirectResponse
+from fastapi import Depends, Query, Request, Response
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from app.entities.photo import CreatePhoto, Photo, UpdatePhoto
-from app.entities.album import Album, CreateAlbum
+from prometheus_client import CONTENT_TYPE_LATEST
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Load env variables before any module reads its settings from them
+load_dotenv()
+
+from app.entities.photo import (
+    BulkCreatePhotoResult,
+    CreatePhoto,
+    Photo,
+    UpdatePhoto,
+)
+from app.entities.album import Album, CreateAlbum, UpdateAlbum
 from app.entities.project import Project, ProjectCreate, ProjectUpdate
 from app.entities.role import CreateRole, Role
 from app.entities.user import CreateUser, User
 
-from app.infrastructure.main_database import SessionLocal
-from app.infrastructure.models.main_models import UserModel
+from app.infrastructure.db_pool import get_pool_stats
+from app.infrastructure.image_index import image_index
+from app.infrastructure.metrics import (
+    RequestMetricsMiddleware,
+    metrics_refresher,
+    render_metrics,
+)
+from app.infrastructure.query_stats import QueryStatsMiddleware, query_totals
+from app.infrastructure.replicas import ReadYourWritesMiddleware
+from app.infrastructure.database import get_async_main_db, get_async_main_read_db
 from app.routers.wedding import build_app as build_wedding_app
-from app.services import project_service, photo_service, user_service
+from app.services.principal_cache import Principal, principal_cache
+from app.services import (
+    derivative_service,
+    etag_service,
+    project_service,
+    photo_service,
+    response_cache,
+    single_flight,
+    user_service,
+)
 
 # Automatically create a global session to be used by all routes
 # Base.metadata.create_all(bind=engine)
@@ -28,20 +57,39 @@ app = FastAPI()
 modify_role = "GENERAL_MODIFY"
 
 
-# Dependency
-def get_main_db():
-    """Get the main database session.
+@app.on_event("startup")
+def start_image_index():
+    """Keep the index of image files current while the app is running"""
+    image_index.start()
 
-    Yields:
-        Any: The database session.
-    """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+@app.on_event("shutdown")
+def stop_image_index():
+    """Stop the image file index background rescan"""
+    image_index.stop()
+
+
+@app.on_event("shutdown")
+def stop_image_workers():
+    """Stop the image rendering process pool"""
+    derivative_service.shutdown_executor()
 
 
+@app.on_event("startup")
+async def start_metrics_refresher():
+    """Sample the in-flight requests, threadpool and database pools for /metrics"""
+    metrics_refresher.start()
+
+
+@app.on_event("shutdown")
+async def stop_metrics_refresher():
+    """Stop sampling for /metrics"""
+    metrics_refresher.stop()
+
+
+app.add_middleware(QueryStatsMiddleware)
+# Clients read from the primary for a short while after they write
+app.add_middleware(ReadYourWritesMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -49,6 +97,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 #
 # Routes
@@ -76,6 +125,24 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+async def get_metrics() -> Response:
+    """Get the request, threadpool and database pool metrics for Prometheus"""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/db-pool/stats", tags=["health"], include_in_schema=False)
+def get_db_pool_stats() -> Dict[str, Dict]:
+    """Get the usage, checkout counts and checkout latency of each database pool"""
+    return get_pool_stats()
+
+
+@app.get("/db-queries/stats", tags=["health"], include_in_schema=False)
+def get_db_query_stats() -> Dict:
+    """Get the statement counts and time of the requests sampled for query stats"""
+    return query_totals.stats()
+
+
 # Mount any sub-apps
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 app.mount("/wedding", build_wedding_app())
@@ -87,14 +154,16 @@ app.mount("/wedding", build_wedding_app())
 
 @app.post("/token", tags=["Users"])
 async def login(
-    db: Annotated[SessionLocal, Depends(get_main_db)],
+    db: Annotated[AsyncSession, Depends(get_async_main_db)],
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Dict[str, str]:
     """Login and get a token"""
-    user = user_service.authenticate_user(db, form_data.username, form_data.password)
+    user = await user_service.authenticate_user_async(
+        db, form_data.username, form_data.password
+    )
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
-    access_token = user_service.create_access_token(data={"sub": user.username})
+    access_token = user_service.create_user_access_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
@@ -107,59 +176,84 @@ async def read_users_me(
 
 
 @app.post("/users", tags=["Users"])
-def create_user(user: CreateUser, db: SessionLocal = Depends(get_main_db)) -> User:
+async def create_user(
+    user: CreateUser, db: AsyncSession = Depends(get_async_main_db)
+) -> User:
     """Create a new User"""
-    return user_service.create_user(db, user)
+    return await user_service.create_user_async(db, user)
+
 
+@app.get("/auth-cache/stats", tags=["Users"], include_in_schema=False)
+def get_auth_cache_stats() -> Dict[str, int]:
+    """Get the hit and miss counts of the principal cache"""
+    return principal_cache.stats()
 
-@app.get("/roles", tags=["Users"])
-def get_all_roles(db: SessionLocal = Depends(get_main_db)) -> List[Role]:
+
+@app.get("/roles", tags=["Users"], response_model=List[Role])
+async def get_all_roles(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> Response:
     """Get all Roles"""
-    return user_service.get_roles(db)
+    if cached := await response_cache.get_cached_response(request):
+        return cached
+    generation = await response_cache.response_cache.generation_async()
+
+    roles = await user_service.get_roles_async(db)
+    return await response_cache.cache_response(
+        request,
+        response,
+        Role,
+        roles,
+        None,
+        [response_cache.ROLES_TAG],
+        generation,
+    )
 
 
 @app.post("/roles", tags=["Users"])
-def create_role(
+async def create_role(
     role: CreateRole,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Role:
     """Create a new Role"""
 
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="You are not an admin")
 
-    return user_service.create_role(db, role)
+    return await user_service.create_role_async(db, role)
 
 
 @app.post("/users/addRole/{user_id}", tags=["Users"])
-def add_role_to_user(
+async def add_role_to_user(
     user_id: int,
     role_key: str,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> User:
     """Add a Role to a User"""
 
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="You are not an admin")
 
-    return user_service.add_user_on_role(db, user_id, role_key)
+    return await user_service.add_user_on_role_async(db, user_id, role_key)
 
 
 @app.delete("/users/removeRole/{user_id}", tags=["Users"])
-def remove_role_from_user(
+async def remove_role_from_user(
     user_id: int,
     role_key: str,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> User:
     """Remove a Role from a User"""
 
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="You are not an admin")
 
-    return user_service.remove_user_from_role(db, user_id, role_key)
+    return await user_service.remove_user_from_role_async(db, user_id, role_key)
 
 
 #
@@ -167,31 +261,59 @@ def remove_role_from_user(
 #
 
 
-@app.get("/project", tags=["Projects"])
-def get_all_projects(db: SessionLocal = Depends(get_main_db)) -> List[Project]:
+@app.get("/project", tags=["Projects"], response_model=List[Project])
+async def get_all_projects(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> Response:
     """Get all Projects"""
-    return project_service.get_projects(db)
-
-
-@app.get("/project/{project_id}", tags=["Projects"])
-def get_project_by_id(
-    project_id: int, db: SessionLocal = Depends(get_main_db)
-) -> Project:
+    if cached := await response_cache.get_cached_response(request):
+        return cached
+    generation = await response_cache.response_cache.generation_async()
+
+    projects = await project_service.get_projects_async(db)
+    validator = etag_service.projects_validator(projects)
+    if not_modified := etag_service.conditional_response(request, response, validator):
+        return not_modified
+
+    return await response_cache.cache_response(
+        request,
+        response,
+        Project,
+        projects,
+        validator,
+        [response_cache.PROJECTS_TAG],
+        generation,
+    )
+
+
+@app.get("/project/{project_id}", tags=["Projects"], response_model=Project)
+async def get_project_by_id(
+    project_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> Project | Response:
     """Get a Project by it's ID"""
-    project = project_service.get_project_by_id(db, project_id)
+    project = await project_service.get_project_by_id_async(db, project_id)
     if project is None:
         raise HTTPException(
             status_code=404, detail=f"Project not found with an ID of {project_id}"
         )
+
+    validator = etag_service.project_validator(project)
+    if not_modified := etag_service.conditional_response(request, response, validator):
+        return not_modified
     return project
 
 
 @app.put("/project/{project_id}", tags=["Projects"])
-def update_project(
+async def update_project(
     project_id: int,
     updated_project: ProjectUpdate,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Project:
     """Update a Project by it's ID.
     To set an optional value to null/None, pass "null" or "None" as the value."""
@@ -201,14 +323,14 @@ def update_project(
             status_code=403, detail="You do not have permission to modify projects"
         )
 
-    return project_service.update_project(db, project_id, updated_project)
+    return await project_service.update_project_async(db, project_id, updated_project)
 
 
 @app.delete("/project/{project_id}", tags=["Projects"])
-def remove_project_by_id(
+async def remove_project_by_id(
     project_id: int,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Project:
     """Delete a Project by it's ID"""
 
@@ -217,14 +339,14 @@ def remove_project_by_id(
             status_code=403, detail="You do not have permission to delete projects"
         )
 
-    return project_service.remove_project_by_id(db, project_id)
+    return await project_service.remove_project_by_id_async(db, project_id)
 
 
 @app.post("/project", tags=["Projects"])
-def create_project(
+async def create_project(
     project: ProjectCreate,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Project:
     """Create a new Project"""
 
@@ -233,7 +355,7 @@ def create_project(
             status_code=403, detail="You do not have permission to create projects"
         )
 
-    return project_service.create_project(db, project)
+    return await project_service.create_project_async(db, project)
 
 
 #
@@ -241,62 +363,223 @@ def create_project(
 #
 
 
-@app.get("/photo", tags=["Photos"])
-def get_all_photos(db: SessionLocal = Depends(get_main_db)) -> List[Photo]:
-    """Get all Photos"""
+@app.get("/photo", tags=["Photos"], response_model=List[Photo])
+async def get_all_photos(
+    after_id: int | None = None,
+    limit: int = Query(
+        photo_service.DEFAULT_PAGE_SIZE, ge=1, le=photo_service.MAX_PAGE_SIZE
+    ),
+    stream: bool = False,
+    *,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> Response:
+    """Get Photos ordered by ID, one page at a time.
+    Pass the ID of the last Photo received as after_id to get the next page.
+    Set stream to true to stream every Photo after after_id, ignoring limit."""
+
+    if stream:
+        return StreamingResponse(
+            stream_photos(db, after_id), media_type="application/json"
+        )
+
+    if cached := await response_cache.get_cached_response(request):
+        return cached
+    generation = await response_cache.response_cache.generation_async()
+
+    validator = await db.run_sync(etag_service.photos_page_validator, after_id, limit)
+    if not_modified := etag_service.conditional_response(request, response, validator):
+        return not_modified
+
+    photos = await photo_service.get_photos_async(db, after_id, limit)
+
+    tags = {response_cache.photo_tag(photo.id) for photo in photos}
+    if len(photos) < limit:
+        tags.add(response_cache.LAST_PHOTOS_PAGE_TAG)
+
+    return await response_cache.cache_response(
+        request, response, Photo, photos, validator, tags, generation
+    )
+
+
+async def stream_photos(db: AsyncSession, after_id: int | None) -> AsyncIterator[str]:
+    """Serialize Photos into a JSON array as they are read from the database
 
-    return photo_service.get_photos(db)
+    Args:
+        db (AsyncSession): Database
+        after_id (int | None): Only stream Photos with an ID greater than this
 
+    Yields:
+        str: Chunks of the JSON array
+    """
 
-@app.get("/album", tags=["Photos"])
-def get_all_albums(db: SessionLocal = Depends(get_main_db)) -> List[Album]:
+    yield "["
+    first = True
+    async for photo in photo_service.iter_photos_async(db, after_id):
+        if not first:
+            yield ","
+        first = False
+        yield Photo.from_orm(photo).json(by_alias=True)
+    yield "]"
+
+
+@app.get("/album", tags=["Photos"], response_model=List[Album])
+async def get_all_albums(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> Response:
     """Get all Photos"""
 
-    return photo_service.get_albums(db)
+    if cached := await response_cache.get_cached_response(request):
+        return cached
+    generation = await response_cache.response_cache.generation_async()
+
+    validator = await db.run_sync(etag_service.albums_validator)
+    if not_modified := etag_service.conditional_response(request, response, validator):
+        return not_modified
+
+    async def load_albums() -> bytes:
+        albums = await photo_service.get_albums_async(db)
+
+        tags = {response_cache.ALBUMS_TAG}
+        for album in albums:
+            if album.cover_photo_id is not None:
+                tags.add(response_cache.photo_tag(album.cover_photo_id))
+            tags.update(response_cache.photo_tag(photo.id) for photo in album.photos)
+
+        return await response_cache.store_response(
+            request, Album, albums, validator, tags, generation
+        )
+
+    # Identical requests arriving while the Albums load share them
+    body = await single_flight.coalesce(request, validator, load_albums)
+    return response_cache.json_response(response, body)
 
 
-@app.get("/photo/{photo_id}", tags=["Photos"])
-def get_photo_by_id(photo_id: int, db: SessionLocal = Depends(get_main_db)) -> Photo:
+@app.get("/photo/{photo_id}", tags=["Photos"], response_model=Photo)
+async def get_photo_by_id(
+    photo_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> Photo | Response:
     """Get a Photo by it's ID"""
-    return photo_service.get_photo_by_id(db, photo_id)
+    validator = await db.run_sync(etag_service.photo_validator, photo_id)
+    if not_modified := etag_service.conditional_response(request, response, validator):
+        return not_modified
+
+    return await photo_service.get_photo_by_id_async(db, photo_id)
+
+
+@app.get("/photo/{photo_id}/thumbnail", tags=["Photos"])
+async def get_photo_thumbnail(
+    photo_id: int,
+    size: derivative_service.DerivativeSize = "thumbnail",
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> FileResponse:
+    """Get a resized JPEG copy of a Photo.
+    Thumbnails fit within 256px and previews within 1024px."""
+
+    path = await derivative_service.get_derivative(db, photo_id, size)
+    return FileResponse(path, media_type="image/jpeg")
+
+
+@app.get("/photo/{photo_id}/image", tags=["Photos"])
+async def get_photo_image(
+    photo_id: int,
+    w: int = Query(
+        ...,
+        ge=derivative_service.MIN_VARIANT_WIDTH,
+        le=derivative_service.MAX_VARIANT_WIDTH,
+    ),
+    format: derivative_service.VariantFormat = "webp",
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> FileResponse:
+    """Get a copy of a Photo resized to a width of w, in the given format.
+    Photos are never upscaled, so the result may be narrower than w."""
+
+    path = await derivative_service.get_variant(db, photo_id, w, format)
+    _, media_type = derivative_service.VARIANT_FORMATS[format]
+    return FileResponse(path, media_type=media_type)
+
+
+@app.get("/response-cache/stats", tags=["health"], include_in_schema=False)
+def get_response_cache_stats() -> Dict:
+    """Get the hit ratio, eviction and invalidation counts of the response cache"""
+    return response_cache.response_cache.stats()
+
+
+@app.get("/single-flight/stats", tags=["health"], include_in_schema=False)
+def get_single_flight_stats() -> Dict[str, int]:
+    """Get the counts of leading and coalesced requests"""
+    return single_flight.single_flight.stats()
+
+
+@app.get("/image-cache/stats", tags=["Photos"], include_in_schema=False)
+def get_image_cache_stats() -> Dict[str, int]:
+    """Get the hit, miss and eviction counts of the resized image cache"""
+    return derivative_service.variant_cache.stats()
 
 
 @app.get("/photo/filename/{photo_filename}", tags=["Photos"])
-def get_photo_by_filename(
-    photo_filename: str, db: SessionLocal = Depends(get_main_db)
+async def get_photo_by_filename(
+    photo_filename: str, db: AsyncSession = Depends(get_async_main_read_db)
 ) -> Photo:
     """Get a Photo by it's filename"""
-    return photo_service.get_photo_by_filename(db, photo_filename)
+    return await photo_service.get_photo_by_filename_async(db, photo_filename)
 
 
 @app.get("/album/title/{album_title}", tags=["Photos"])
-def get_album_by_title(
-    album_title: str, db: SessionLocal = Depends(get_main_db)
+async def get_album_by_title(
+    album_title: str, db: AsyncSession = Depends(get_async_main_read_db)
 ) -> Album:
     """Get an Album by it's title"""
-    return photo_service.get_album_by_title(db, album_title)
+    return await photo_service.get_album_by_title_async(db, album_title)
 
 
-@app.get("/album/{album_id}/photos", tags=["Photos"])
-def get_photos_by_album_id(
-    album_id: int, db: SessionLocal = Depends(get_main_db)
-) -> List[Photo]:
+@app.get("/album/{album_id}/photos", tags=["Photos"], response_model=List[Photo])
+async def get_photos_by_album_id(
+    album_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> Response:
     """Get all Photos in an Album"""
-    album = photo_service.get_album_by_id(db, album_id)
-    return album.photos
+    validator = await db.run_sync(etag_service.album_validator, album_id)
+    if not_modified := etag_service.conditional_response(request, response, validator):
+        return not_modified
+
+    async def load_photos() -> bytes:
+        album = await photo_service.get_album_by_id_async(db, album_id)
+        return response_cache.serialize(Photo, album.photos)
 
+    # Identical requests arriving while the Photos load share them
+    body = await single_flight.coalesce(request, validator, load_photos)
+    return response_cache.json_response(response, body)
 
-@app.get("/album/{album_id}", tags=["Photos"])
-def get_album_by_id(album_id: int, db: SessionLocal = Depends(get_main_db)) -> Album:
+
+@app.get("/album/{album_id}", tags=["Photos"], response_model=Album)
+async def get_album_by_id(
+    album_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_main_read_db),
+) -> Album | Response:
     """Get an Album by it's ID"""
-    return photo_service.get_album_by_id(db, album_id)
+    validator = await db.run_sync(etag_service.album_validator, album_id)
+    if not_modified := etag_service.conditional_response(request, response, validator):
+        return not_modified
+
+    return await photo_service.get_album_by_id_async(db, album_id)
 
 
 @app.post("/photo", tags=["Photos"])
-def create_photo(
+async def create_photo(
     photo: CreatePhoto,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Photo:
     """Create a new Photo"""
 
@@ -305,14 +588,35 @@ def create_photo(
             status_code=403, detail="You do not have permission to create photos"
         )
 
-    return photo_service.create_photo(db, photo)
+    return await photo_service.create_photo_async(db, photo)
+
+
+@app.post("/photo/bulk", tags=["Photos"])
+async def create_photos(
+    photos: List[CreatePhoto],
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    chunk_size: int = Query(
+        photo_service.BULK_CHUNK_SIZE, ge=1, le=photo_service.MAX_BULK_CHUNK_SIZE
+    ),
+    db: AsyncSession = Depends(get_async_main_db),
+) -> List[BulkCreatePhotoResult]:
+    """Create many Photos at once.
+    Photos that are duplicates or missing on disk are skipped and reported,
+    the rest are created. A result is returned for every Photo, in order."""
+
+    if not user_service.user_has_role(current_user, modify_role):
+        raise HTTPException(
+            status_code=403, detail="You do not have permission to create photos"
+        )
+
+    return await photo_service.create_photos_async(db, photos, chunk_size)
 
 
 @app.post("/album", tags=["Photos"])
-def create_album(
+async def create_album(
     album: CreateAlbum,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Album:
     """Create a new Album"""
 
@@ -321,15 +625,15 @@ def create_album(
             status_code=403, detail="You do not have permission to create albums"
         )
 
-    return photo_service.create_album(db, album)
+    return await photo_service.create_album_async(db, album)
 
 
 @app.post("/album/addphotos/{album_id}", tags=["Photos"])
-def add_photo_to_album(
+async def add_photo_to_album(
     album_id: int,
     photo_ids: List[int],
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Album:
     """Add a Photo to an Album"""
 
@@ -338,15 +642,15 @@ def add_photo_to_album(
             status_code=403, detail="You do not have permission to modify albums"
         )
 
-    return photo_service.add_photos_to_album(db, album_id, photo_ids)
+    return await photo_service.add_photos_to_album_async(db, album_id, photo_ids)
 
 
 @app.put("/photo/{photo_id}", tags=["Photos"])
-def update_photo(
+async def update_photo(
     photo_id: int,
     updated_photo: UpdatePhoto,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Photo:
     """Update a Photo by it's ID.
     To set an optional value to null/None, pass "null" or "None" as the value."""
@@ -356,15 +660,15 @@ def update_photo(
             status_code=403, detail="You do not have permission to modify photos"
         )
 
-    return photo_service.update_photo(db, photo_id, updated_photo)
+    return await photo_service.update_photo_async(db, photo_id, updated_photo)
 
 
 @app.put("/album/{album_id}", tags=["Photos"])
-def update_album(
+async def update_album(
     album_id: int,
-    updated_album: CreateAlbum,
-    current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-    db: SessionLocal = Depends(get_main_db),
+    updated_album: UpdateAlbum,
+    current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
 ) -> Album:
     """Update a Album by it's ID.
     To set an optional value to null/None, pass "null" or "None" as the value."""
@@ -374,4 +678,4 @@ def update_album(
             status_code=403, detail="You do not have permission to modify albums"
         )
 
-    return photo_service.update_album(db, album_id, updated_album)
+    return await photo_service.update_album_async(db, album_id, updated_album)
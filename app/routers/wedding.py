@@ -1,14 +1,14 @@
 from typing import Annotated, List
-from fastapi import Depends, FastAPI, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 from app.entities.wedding.Faq import Faq, FaqCreate, FaqUpdate
-from app.infrastructure.models.main_models import UserModel
+from app.services.principal_cache import Principal
 
 load_dotenv()
 
-from app.infrastructure.wedding_database import SessionLocal as wedding_SessionLocal
-from app.services import wedding_service, user_service
+from app.infrastructure.database import get_async_wedding_db, get_async_wedding_read_db
+from app.services import etag_service, response_cache, wedding_service, user_service
 
 modify_role = "GENERAL_MODIFY"
 
@@ -16,32 +16,58 @@ modify_role = "GENERAL_MODIFY"
 def build_app():
     app = FastAPI()
 
-    # Dependency
-    def get_wedding_db():
-        db = wedding_SessionLocal()
-        try:
-            yield db
-        finally:
-            db.close()
-
-    @app.get("/faq", tags=["Wedding"])
-    def get_all_faqs(db: Session = Depends(get_wedding_db)) -> List[Faq]:
+    @app.get("/faq", tags=["Wedding"], response_model=List[Faq])
+    async def get_all_faqs(
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_async_wedding_read_db),
+    ) -> Response:
         """Get all FAQs"""
-        return wedding_service.get_faqs(db)
-
-    @app.get("/faq/{faq_id}", tags=["Wedding"])
-    def get_faq_by_id(faq_id: int, db: Session = Depends(get_wedding_db)) -> Faq:
+        if cached := await response_cache.get_cached_response(request):
+            return cached
+        generation = await response_cache.response_cache.generation_async()
+
+        faqs = await wedding_service.get_faqs_async(db)
+        validator = etag_service.faqs_validator(faqs)
+        if not_modified := etag_service.conditional_response(
+            request, response, validator
+        ):
+            return not_modified
+
+        return await response_cache.cache_response(
+            request,
+            response,
+            Faq,
+            faqs,
+            validator,
+            [response_cache.FAQS_TAG],
+            generation,
+        )
+
+    @app.get("/faq/{faq_id}", tags=["Wedding"], response_model=Faq)
+    async def get_faq_by_id(
+        faq_id: int,
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_async_wedding_read_db),
+    ) -> Faq | Response:
         """Get a single FAQ by it's ID"""
-        faq = wedding_service.get_faq_by_id(db, faq_id)
+        faq = await wedding_service.get_faq_by_id_async(db, faq_id)
         if faq is None:
             raise HTTPException(status_code=404, detail="Item not found")
+
+        validator = etag_service.faq_validator(faq)
+        if not_modified := etag_service.conditional_response(
+            request, response, validator
+        ):
+            return not_modified
         return faq
 
     @app.post("/faq", tags=["Wedding"])
-    def create_faq(
+    async def create_faq(
         faq: FaqCreate,
-        current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-        db: Session = Depends(get_wedding_db),
+        current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+        db: AsyncSession = Depends(get_async_wedding_db),
     ) -> Faq:
         """Create a new FAQ"""
 
@@ -51,14 +77,14 @@ def build_app():
                 detail="User does not have permission to create FAQs",
             )
 
-        return wedding_service.create_faq(db, faq)
+        return await wedding_service.create_faq_async(db, faq)
 
     @app.put("/faq/{faq_id}", tags=["Wedding"])
-    def update_faq(
+    async def update_faq(
         faq_id: int,
         faq: FaqUpdate,
-        current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-        db: Session = Depends(get_wedding_db),
+        current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+        db: AsyncSession = Depends(get_async_wedding_db),
     ) -> Faq:
         """
         Update an existing FAQ by it's ID, returns the updated Faq.
@@ -71,13 +97,13 @@ def build_app():
                 detail="User does not have permission to update FAQs",
             )
 
-        return wedding_service.update_faq(db, faq_id, faq)
+        return await wedding_service.update_faq_async(db, faq_id, faq)
 
     @app.delete("/faq/{faq_id}", tags=["Wedding"])
-    def remove_faq_by_id(
+    async def remove_faq_by_id(
         faq_id: int,
-        current_user: Annotated[UserModel, Depends(user_service.get_current_user)],
-        db: Session = Depends(get_wedding_db),
+        current_user: Annotated[Principal, Depends(user_service.get_current_principal)],
+        db: AsyncSession = Depends(get_async_wedding_db),
     ) -> Faq:
         """Remove an existing FAQ by it's ID"""
 
@@ -87,6 +113,6 @@ def build_app():
                 detail="User does not have permission to remove FAQs",
             )
 
-        return wedding_service.remove_faq_by_id(db, faq_id)
+        return await wedding_service.remove_faq_by_id_async(db, faq_id)
 
     return app
@@ -0,0 +1,431 @@
+"""Derivative Service, contains logic for generating and caching resized copies of Photos.
+"""
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import os
+import shutil
+import threading
+import uuid
+from typing import Literal
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.infrastructure.image_index import PHOTO_DIRECTORY
+import app.infrastructure.models.main_models as models
+
+DerivativeSize = Literal["thumbnail", "preview"]
+VariantFormat = Literal["webp", "jpeg", "png"]
+
+DERIVATIVE_DIRECTORY = f"{PHOTO_DIRECTORY}/.derivatives"
+DERIVATIVE_SIZES: dict[DerivativeSize, int] = {"thumbnail": 256, "preview": 1024}
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", os.cpu_count() or 1))
+
+VARIANT_DIRECTORY = f"{DERIVATIVE_DIRECTORY}/variants"
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+}
+MIN_VARIANT_WIDTH = 16
+MAX_VARIANT_WIDTH = 4096
+# Each worker process keeps it's own index of the variants and budgets this much for
+# them, so together the workers may use up to the number of workers times this
+VARIANT_CACHE_MAX_BYTES = int(
+    os.environ.get("IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))
+)
+
+_executor: ProcessPoolExecutor | None = None
+_in_flight: dict[str, asyncio.Future] = {}
+
+
+class UnreadableImage(Exception):
+    """Pillow couldn't identify or decode a Photo's original file"""
+
+
+class VariantCache:
+    """Tracks the resized variants on disk and evicts the least recently used
+    ones once their total size exceeds max_bytes.
+    Existing files are picked up, oldest first, the first time the cache is used."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.deduplicated = 0
+        self._entries: OrderedDict[str, int] | None = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _get_entries(self) -> OrderedDict[str, int]:
+        """Get the entries, scanning the directory the first time. Hold the lock."""
+
+        if self._entries is None:
+            self._entries = self._scan()
+            self._size = sum(self._entries.values())
+        return self._entries
+
+    def _scan(self) -> OrderedDict[str, int]:
+        files = []
+
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+
+        return OrderedDict((path, size) for _, path, size in sorted(files))
+
+    def get(self, path: str) -> bool:
+        """Check if a variant is cached, marking it as recently used.
+        The file is checked too, as another worker may have evicted or removed it,
+        in which case it's entry is dropped.
+
+        Args:
+            path (str): Path of the variant
+
+        Returns:
+            bool: True if the variant is cached
+        """
+
+        with self._lock:
+            entries = self._get_entries()
+
+            if path in entries:
+                if os.path.isfile(path):
+                    entries.move_to_end(path)
+                    self.hits += 1
+                    return True
+
+                self._size -= entries.pop(path)
+
+            self.misses += 1
+            return False
+
+    def put(self, path: str) -> None:
+        """Add a newly rendered variant, evicting others to stay within max_bytes
+
+        Args:
+            path (str): Path of the variant
+        """
+
+        size = os.path.getsize(path)
+        evicted = []
+
+        with self._lock:
+            entries = self._get_entries()
+
+            self._size += size - entries.pop(path, 0)
+            entries[path] = size
+
+            while self._size > self.max_bytes and len(entries) > 1:
+                oldest, oldest_size = entries.popitem(last=False)
+                self._size -= oldest_size
+                self.evictions += 1
+                evicted.append(oldest)
+
+        for oldest in evicted:
+            try:
+                os.remove(oldest)
+            except FileNotFoundError:
+                pass
+
+    def remove_prefix(self, prefix: str) -> None:
+        """Forget every variant whose path starts with prefix
+
+        Args:
+            prefix (str): Path prefix of the variants to forget
+        """
+
+        with self._lock:
+            if self._entries is None:
+                return
+
+            for path in [path for path in self._entries if path.startswith(prefix)]:
+                self._size -= self._entries.pop(path)
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache counters
+
+        Returns:
+            dict[str, int]: Hits, misses, evictions and current usage
+        """
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "deduplicated": self.deduplicated,
+                "entries": len(self._entries or ()),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+variant_cache = VariantCache(VARIANT_DIRECTORY, VARIANT_CACHE_MAX_BYTES)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the process pool used to render images, creating it on first use
+
+    Returns:
+        ProcessPoolExecutor: The image rendering process pool
+    """
+
+    global _executor
+
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """Shut down the image rendering process pool, if it was started"""
+
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+def get_derivative_path(photo_id: int, size: DerivativeSize) -> str:
+    """Get the path a derivative of a Photo is cached at
+
+    Args:
+        photo_id (int): ID of the Photo
+        size (DerivativeSize): Name of the derivative size
+
+    Returns:
+        str: Path of the cached derivative
+    """
+
+    return f"{DERIVATIVE_DIRECTORY}/{size}/{photo_id}.jpg"
+
+
+def get_variant_path(photo_id: int, width: int, image_format: VariantFormat) -> str:
+    """Get the path a resized variant of a Photo is cached at
+
+    Args:
+        photo_id (int): ID of the Photo
+        width (int): Width of the variant
+        image_format (VariantFormat): Format of the variant
+
+    Returns:
+        str: Path of the cached variant
+    """
+
+    return f"{VARIANT_DIRECTORY}/{photo_id}/{width}.{image_format}"
+
+
+def render_derivative(
+    source: str, destination: str, box: tuple[int, int | None], image_format: str
+) -> None:
+    """Render a copy of an image that fits within box, never upscaling.
+    Runs inside the process pool, the file is written atomically.
+
+    Args:
+        source (str): Path of the original image
+        destination (str): Path to write the derivative to
+        box (tuple[int, int | None]): Maximum width and height of the derivative,
+            a height of None only limits the width
+        image_format (str): Pillow format name to save as
+    """
+
+    width, height = box
+
+    try:
+        with Image.open(source) as original:
+            # Let the JPEG decoder downscale while decoding, far cheaper than a full
+            # decode. The draft keeps both sides at least this big, whichever way the
+            # EXIF rotates it.
+            original.draft("RGB", (width, height or width))
+            image = ImageOps.exif_transpose(original)
+            image.thumbnail((width, height or image.height))
+    except (OSError, Image.DecompressionBombError) as error:
+        # An unsupported, truncated or corrupt file. Pillow's errors are re-raised as
+        # one type that survives the trip back from the pool
+        raise UnreadableImage(str(error)) from error
+
+    if image_format == "JPEG":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporary = f"{destination}.{uuid.uuid4().hex}.tmp"
+    image.save(temporary, image_format, quality=85, optimize=True)
+    os.replace(temporary, destination)
+
+
+async def render_once(
+    source: str, destination: str, box: tuple[int, int | None], image_format: str
+) -> None:
+    """Render a derivative in the process pool. Concurrent calls for the same
+    destination share a single render and all see its result or error.
+    An original Pillow can't read raises a 415 rather than a server error.
+
+    Args:
+        source (str): Path of the original image
+        destination (str): Path to write the derivative to
+        box (tuple[int, int | None]): Maximum width and height of the derivative
+        image_format (str): Pillow format name to save as
+    """
+
+    future = _in_flight.get(destination)
+
+    if future is None:
+        future = asyncio.wrap_future(
+            get_executor().submit(
+                render_derivative, source, destination, box, image_format
+            )
+        )
+        _in_flight[destination] = future
+        future.add_done_callback(lambda _: _in_flight.pop(destination, None))
+    else:
+        variant_cache.deduplicated += 1
+
+    try:
+        # A waiter giving up must not cancel the render for the others
+        await asyncio.shield(future)
+    except UnreadableImage as error:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Photo with filename {os.path.basename(source)} isn't an image "
+            "that can be resized",
+        ) from error
+
+
+def get_photo_filename(db: Session, photo_id: int) -> str:
+    """Get the filename of a Photo by it's ID
+
+    Args:
+        db (Session): Database
+        photo_id (int): ID of the Photo
+
+    Returns:
+        str: Filename of the Photo
+    """
+
+    filename = (
+        db.query(models.PhotoModel.filename)
+        .filter(models.PhotoModel.id == photo_id)
+        .scalar()
+    )
+
+    if not filename:
+        raise HTTPException(
+            status_code=404, detail=f"Photo with ID {photo_id} does not exist"
+        )
+
+    return filename
+
+
+async def get_derivative(db: AsyncSession, photo_id: int, size: DerivativeSize) -> str:
+    """Get the path of a derivative of a Photo, rendering it if it isn't cached.
+    A cached derivative is found without querying the database.
+
+    Args:
+        db (AsyncSession): Database
+        photo_id (int): ID of the Photo
+        size (DerivativeSize): Name of the derivative size
+
+    Returns:
+        str: Path of the derivative
+    """
+
+    path = get_derivative_path(photo_id, size)
+
+    if await run_in_threadpool(os.path.isfile, path):
+        return path
+
+    source = await get_source_path(db, photo_id)
+    max_dimension = DERIVATIVE_SIZES[size]
+    await render_once(source, path, (max_dimension, max_dimension), "JPEG")
+
+    return path
+
+
+async def get_variant(
+    db: AsyncSession, photo_id: int, width: int, image_format: VariantFormat
+) -> str:
+    """Get the path of a resized variant of a Photo, rendering it if it isn't cached.
+    A cached variant is found without querying the database.
+
+    Args:
+        db (AsyncSession): Database
+        photo_id (int): ID of the Photo
+        width (int): Maximum width of the variant
+        image_format (VariantFormat): Format of the variant
+
+    Returns:
+        str: Path of the variant
+    """
+
+    path = get_variant_path(photo_id, width, image_format)
+
+    if await run_in_threadpool(variant_cache.get, path):
+        return path
+
+    source = await get_source_path(db, photo_id)
+    pillow_format, _ = VARIANT_FORMATS[image_format]
+    await render_once(source, path, (width, None), pillow_format)
+    await run_in_threadpool(variant_cache.put, path)
+
+    return path
+
+
+async def get_source_path(db: AsyncSession, photo_id: int) -> str:
+    """Get the path of a Photo's original file, checking it exists on disk
+
+    Args:
+        db (AsyncSession): Database
+        photo_id (int): ID of the Photo
+
+    Returns:
+        str: Path of the original file
+    """
+
+    filename = await db.run_sync(get_photo_filename, photo_id)
+    source = f"{PHOTO_DIRECTORY}/{filename}"
+
+    if not await run_in_threadpool(os.path.isfile, source):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Photo with filename {filename} doesn't exist on disk",
+        )
+
+    return source
+
+
+def remove_derivatives(photo_id: int) -> None:
+    """Delete every cached derivative of a Photo
+
+    Args:
+        photo_id (int): ID of the Photo
+    """
+
+    for size in DERIVATIVE_SIZES:
+        try:
+            os.remove(get_derivative_path(photo_id, size))
+        except FileNotFoundError:
+            pass
+
+    variant_directory = f"{VARIANT_DIRECTORY}/{photo_id}"
+    variant_cache.remove_prefix(f"{variant_directory}/")
+    shutil.rmtree(variant_directory, ignore_errors=True)
@@ -0,0 +1,213 @@
+"""ETag Service, contains logic for computing validators so unchanged resources can be
+answered with a 304 Not Modified without loading or serializing them.
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+
+from fastapi import Request, Response
+from sqlalchemy import func, inspect
+from sqlalchemy.orm import Session
+
+import app.infrastructure.models.main_models as models
+import app.infrastructure.models.wedding_models as wedding_models
+
+Validator = tuple[str, datetime | None]
+
+
+def make_etag(*parts) -> str:
+    """Make a strong ETag from the given values
+
+    Returns:
+        str: The quoted ETag
+    """
+
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '"'
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    validator: Validator | None,
+) -> Response | None:
+    """Answer a conditional GET from a validator.
+    Sets the ETag and Last-Modified headers on the response and returns a 304
+    Not Modified response if the client's copy is current, or None otherwise.
+
+    Args:
+        request (Request): The incoming request
+        response (Response): The response the route's headers are set on
+        validator (Validator | None): The ETag and last modified time, None to skip
+
+    Returns:
+        Response | None: A 304 response if the client's copy is current
+    """
+
+    if validator is None:
+        return None
+
+    etag, last_modified = validator
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = format_http_date(last_modified)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        current = if_none_match.strip() == "*" or etag in (
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        )
+    else:
+        current = is_unmodified_since(
+            request.headers.get("if-modified-since"), last_modified
+        )
+
+    if not current:
+        return None
+
+    return Response(status_code=304, headers=dict(response.headers))
+
+
+def format_http_date(value: datetime) -> str:
+    """Format a naive local or aware datetime as an HTTP date"""
+
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_unmodified_since(header: str | None, last_modified: datetime | None) -> bool:
+    """Check an If-Modified-Since header against a last modified time"""
+
+    if header is None or last_modified is None:
+        return False
+
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+
+    # HTTP dates only have second precision
+    modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+    return modified <= since
+
+
+def photo_validator(db: Session, photo_id: int) -> Validator | None:
+    """Get the validator of a Photo, None if it does not exist"""
+
+    row = (
+        db.query(models.PhotoModel.updated_at)
+        .filter(models.PhotoModel.id == photo_id)
+        .first()
+    )
+
+    if row is None:
+        return None
+
+    return make_etag("photo", photo_id, row[0]), row[0]
+
+
+def photos_page_validator(db: Session, after_id: int | None, limit: int) -> Validator:
+    """Get the validator of a page of Photos with a single aggregate query"""
+
+    photos = db.query(models.PhotoModel.id, models.PhotoModel.updated_at)
+    if after_id is not None:
+        photos = photos.filter(models.PhotoModel.id > after_id)
+    page = photos.order_by(models.PhotoModel.id).limit(limit).subquery()
+
+    count, last_id, updated_at = db.query(
+        func.count(), func.max(page.c.id), func.max(page.c.updated_at)
+    ).one()
+
+    etag = make_etag("photos", after_id, limit, count, last_id, updated_at)
+    return etag, updated_at
+
+
+def album_validator(db: Session, album_id: int) -> Validator | None:
+    """Get the validator of an Album, including it's cover and Photos, with a single
+    aggregate query. None if the Album does not exist"""
+
+    cover = models.PhotoModel.__table__.alias("cover")
+    photo = models.PhotoModel.__table__.alias("photo")
+
+    row = (
+        db.query(
+            models.AlbumModel.updated_at,
+            cover.c.updated_at,
+            func.count(photo.c.id),
+            func.sum(photo.c.id),
+            func.max(photo.c.updated_at),
+        )
+        .outerjoin(cover, cover.c.id == models.AlbumModel.cover_photo_id)
+        .outerjoin(
+            models.album_photo,
+            models.album_photo.c.album_id == models.AlbumModel.id,
+        )
+        .outerjoin(photo, photo.c.id == models.album_photo.c.photo_id)
+        .filter(models.AlbumModel.id == album_id)
+        .group_by(
+            models.AlbumModel.id, models.AlbumModel.updated_at, cover.c.updated_at
+        )
+        .first()
+    )
+
+    if row is None:
+        return None
+
+    updated_at = max(
+        (value for value in (row[0], row[1], row[4]) if value is not None),
+        default=None,
+    )
+    return make_etag("album", album_id, *row), updated_at
+
+
+def albums_validator(db: Session) -> Validator:
+    """Get the validator of every Album with a single aggregate query"""
+
+    row = db.query(
+        db.query(func.count(models.AlbumModel.id)).scalar_subquery(),
+        db.query(func.max(models.AlbumModel.updated_at)).scalar_subquery(),
+        db.query(func.count()).select_from(models.album_photo).scalar_subquery(),
+        db.query(func.sum(models.album_photo.c.photo_id)).scalar_subquery(),
+        db.query(func.max(models.PhotoModel.updated_at)).scalar_subquery(),
+    ).one()
+
+    updated_at = max(
+        (value for value in (row[1], row[4]) if value is not None), default=None
+    )
+    return make_etag("albums", *row), updated_at
+
+
+def get_column_values(instance) -> tuple:
+    """Get the value of every column of a loaded ORM object"""
+
+    return tuple(
+        getattr(instance, attribute.key)
+        for attribute in inspect(instance).mapper.column_attrs
+    )
+
+
+def projects_validator(projects: list[models.ProjectModel]) -> Validator:
+    """Get the validator of every Project from a hash of the loaded Projects.
+    Projects have no modified time, so the route loads them once and hashes the
+    same rows it serializes."""
+
+    return make_etag("projects", *map(get_column_values, projects)), None
+
+
+def project_validator(project: models.ProjectModel) -> Validator:
+    """Get the validator of a loaded Project from a hash of it's content"""
+
+    return make_etag("project", get_column_values(project)), None
+
+
+def faqs_validator(faqs: list[wedding_models.FaqModel]) -> Validator:
+    """Get the validator of every FAQ from a hash of the loaded FAQs.
+    FAQs have no modified time, so the route loads them once and hashes the same
+    rows it serializes."""
+
+    return make_etag("faqs", *map(get_column_values, faqs)), None
+
+
+def faq_validator(faq: wedding_models.FaqModel) -> Validator:
+    """Get the validator of a loaded FAQ from a hash of it's content"""
+
+    return make_etag("faq", get_column_values(faq)), None
@@ -0,0 +1,167 @@
+"""Image Metadata, reads the dimensions and format of an image from its header bytes
+without decoding the image.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import struct
+from typing import BinaryIO, Iterable, NamedTuple
+
+HEADER_READ_WORKERS = 8
+
+# Start Of Frame markers carry the dimensions, the others in C0-CF are not frames
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Markers without a length field
+JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xDA)) | {0x01}
+JPEG_APP1_MARKER = 0xE1
+EXIF_ORIENTATION_TAG = 0x0112
+# EXIF orientations 5 to 8 rotate the image by 90 degrees, swapping it's sides
+EXIF_SWAPPED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class ImageHeader(NamedTuple):
+    """The dimensions and format of an image"""
+
+    width: int
+    height: int
+    format: str
+
+
+def read_image_header(path: str) -> ImageHeader | None:
+    """Read the dimensions and format of a JPEG, PNG, WebP or GIF image.
+    Only the header is read, for a JPEG the reader seeks past every segment
+    before the frame header so only a few KB are read whatever the file size.
+    A JPEG's dimensions are as displayed, swapped when it's EXIF orientation
+    rotates it by 90 degrees, like the derivatives. Other formats' EXIF is ignored.
+
+    Args:
+        path (str): Path of the image
+
+    Returns:
+        ImageHeader | None: The image header, None if the file isn't a supported image
+    """
+
+    try:
+        with open(path, "rb") as file:
+            signature = file.read(12)
+
+            if signature[:2] == b"\xff\xd8":
+                file.seek(2)
+                return _read_jpeg_header(file)
+            if signature[:8] == b"\x89PNG\r\n\x1a\n":
+                return _read_png_header(signature + file.read(12))
+            if signature[:4] == b"RIFF" and signature[8:12] == b"WEBP":
+                return _read_webp_header(file.read(30))
+            if signature[:6] in (b"GIF87a", b"GIF89a"):
+                width, height = struct.unpack("<HH", signature[6:10])
+                return ImageHeader(width, height, "gif")
+    except (OSError, IndexError, struct.error):
+        return None
+
+    return None
+
+
+def read_image_headers(paths: Iterable[str]) -> list[ImageHeader | None]:
+    """Read the headers of many images, overlapping the reads on a thread pool
+
+    Args:
+        paths (Iterable[str]): Paths of the images
+
+    Returns:
+        list[ImageHeader | None]: The header of each image, in order
+    """
+
+    with ThreadPoolExecutor(max_workers=HEADER_READ_WORKERS) as executor:
+        return list(executor.map(read_image_header, paths))
+
+
+def _read_jpeg_header(file: BinaryIO) -> ImageHeader | None:
+    orientation = 1
+
+    while True:
+        byte = file.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+
+        marker = file.read(1)
+        # Any number of 0xFF fill bytes may come before a marker
+        while marker == b"\xff":
+            marker = file.read(1)
+        if not marker:
+            return None
+
+        code = marker[0]
+        if code in JPEG_STANDALONE_MARKERS or code == 0x00:
+            continue
+        if code == 0xDA:
+            # Start of scan without a frame header, the image is broken
+            return None
+
+        (length,) = struct.unpack(">H", file.read(2))
+
+        if code in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", file.read(5))
+            if orientation in EXIF_SWAPPED_ORIENTATIONS:
+                width, height = height, width
+            return ImageHeader(width, height, "jpeg")
+
+        if code == JPEG_APP1_MARKER:
+            orientation = _read_exif_orientation(file.read(length - 2))
+        else:
+            file.seek(length - 2, 1)
+
+
+def _read_exif_orientation(segment: bytes) -> int:
+    # A broken EXIF segment doesn't make the image unreadable, it's just upright
+    try:
+        if segment[:6] != b"Exif\x00\x00":
+            return 1
+
+        tiff = segment[6:]
+        byte_order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+        if byte_order is None:
+            return 1
+
+        (offset,) = struct.unpack(f"{byte_order}I", tiff[4:8])
+        (entries,) = struct.unpack(f"{byte_order}H", tiff[offset : offset + 2])
+
+        for index in range(entries):
+            entry = offset + 2 + index * 12
+            tag, _, _, value = struct.unpack(
+                f"{byte_order}HHIH", tiff[entry : entry + 10]
+            )
+            if tag == EXIF_ORIENTATION_TAG:
+                return value
+    except struct.error:
+        pass
+
+    return 1
+
+
+def _read_png_header(header: bytes) -> ImageHeader | None:
+    # The IHDR chunk must come first, straight after the signature and chunk length
+    if header[12:16] != b"IHDR":
+        return None
+
+    width, height = struct.unpack(">II", header[16:24])
+    return ImageHeader(width, height, "png")
+
+
+def _read_webp_header(chunk: bytes) -> ImageHeader | None:
+    chunk_type, data = chunk[:4], chunk[8:]
+
+    if chunk_type == b"VP8 " and data[3:6] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", data[6:10])
+        return ImageHeader(width & 0x3FFF, height & 0x3FFF, "webp")
+
+    if chunk_type == b"VP8L" and data[0] == 0x2F:
+        (bits,) = struct.unpack("<I", data[1:5])
+        return ImageHeader((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, "webp")
+
+    if chunk_type == b"VP8X":
+        width = int.from_bytes(data[4:7], "little") + 1
+        height = int.from_bytes(data[7:10], "little") + 1
+        return ImageHeader(width, height, "webp")
+
+    return None
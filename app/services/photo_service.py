@@ -1,27 +1,130 @@
 """Photo Service, contains logic for interacting with Photos in the database.
 """
 
+from collections import Counter
 from datetime import datetime
-from pathlib import Path
+import os
+from typing import AsyncIterator, Iterator
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from app.entities.album import CreateAlbum, UpdateAlbum
-from app.entities.photo import CreatePhoto, UpdatePhoto
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from starlette.concurrency import run_in_threadpool
+from app.entities.album import Album, CreateAlbum, UpdateAlbum
+from app.entities.photo import (
+    BulkCreatePhotoResult,
+    CreatePhoto,
+    Photo,
+    UpdatePhoto,
+)
+from app.infrastructure.image_index import PHOTO_DIRECTORY, image_index
 import app.infrastructure.models.main_models as models
+from app.services.derivative_service import remove_derivatives
+from app.services.image_metadata import (
+    ImageHeader,
+    read_image_header,
+    read_image_headers,
+)
+from app.services.response_cache import (
+    ALBUMS_TAG,
+    LAST_PHOTOS_PAGE_TAG,
+    photo_tag,
+    response_cache,
+)
 from app.services.utils import get_updated_value
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
 
-def get_photos(db: Session) -> list[models.PhotoModel]:
-    """Get all Photos, return a list of Photos
+BULK_CHUNK_SIZE = int(os.environ.get("PHOTO_BULK_CHUNK_SIZE", "500"))
+MAX_BULK_CHUNK_SIZE = 5000
+
+
+def get_photos(
+    db: Session, after_id: int | None = None, limit: int = DEFAULT_PAGE_SIZE
+) -> list[models.PhotoModel]:
+    """Get a page of Photos ordered by ID, return a list of Photos.
+    Pages are keyset based, pass the ID of the last Photo of the previous page
+    as after_id to get the next page.
 
     Args:
         db (Session): Database
+        after_id (int | None): Only return Photos with an ID greater than this
+        limit (int): Maximum number of Photos to return
 
     Returns:
-        List[PhotoModel]: List of all Photos in Database
+        List[PhotoModel]: A page of Photos in Database
+    """
+
+    query = db.query(models.PhotoModel)
+
+    if after_id is not None:
+        query = query.filter(models.PhotoModel.id > after_id)
+
+    return query.order_by(models.PhotoModel.id).limit(limit).all()
+
+
+async def get_photos_async(
+    db: AsyncSession, after_id: int | None = None, limit: int = DEFAULT_PAGE_SIZE
+) -> list[models.PhotoModel]:
+    """Get a page of Photos ordered by ID with an AsyncSession, see get_photos"""
+
+    return await db.run_sync(get_photos, after_id, limit)
+
+
+def iter_photos(
+    db: Session, after_id: int | None = None, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[models.PhotoModel]:
+    """Iterate over all Photos ordered by ID without loading the whole table.
+    Rows are read from a server-side cursor in chunks of chunk_size.
+
+    Args:
+        db (Session): Database
+        after_id (int | None): Only yield Photos with an ID greater than this
+        chunk_size (int): Number of rows fetched from the cursor at a time
+
+    Yields:
+        PhotoModel: Each Photo in Database
+    """
+
+    query = db.query(models.PhotoModel)
+
+    if after_id is not None:
+        query = query.filter(models.PhotoModel.id > after_id)
+
+    yield from (
+        query.order_by(models.PhotoModel.id)
+        .execution_options(stream_results=True)
+        .yield_per(chunk_size)
+    )
+
+
+async def iter_photos_async(
+    db: AsyncSession, after_id: int | None = None, chunk_size: int = STREAM_CHUNK_SIZE
+) -> AsyncIterator[models.PhotoModel]:
+    """Iterate over all Photos ordered by ID with an AsyncSession, see iter_photos
+
+    Args:
+        db (AsyncSession): Database
+        after_id (int | None): Only yield Photos with an ID greater than this
+        chunk_size (int): Number of rows fetched from the cursor at a time
+
+    Yields:
+        PhotoModel: Each Photo in Database
     """
 
-    return db.query(models.PhotoModel).all()
+    query = select(models.PhotoModel)
+
+    if after_id is not None:
+        query = query.where(models.PhotoModel.id > after_id)
+
+    result = await db.stream(
+        query.order_by(models.PhotoModel.id).execution_options(yield_per=chunk_size)
+    )
+
+    async for photo in result.scalars():
+        yield photo
 
 
 def get_photo_by_id(db: Session, photo_id: int) -> models.PhotoModel:
@@ -45,6 +148,12 @@ def get_photo_by_id(db: Session, photo_id: int) -> models.PhotoModel:
     return photo
 
 
+async def get_photo_by_id_async(db: AsyncSession, photo_id: int) -> models.PhotoModel:
+    """Get a Photo by it's ID with an AsyncSession, see get_photo_by_id"""
+
+    return await db.run_sync(get_photo_by_id, photo_id)
+
+
 def get_photo_by_filename(db: Session, photo_filename: str) -> models.PhotoModel:
     """Get a Photo by it's filename, return the Photo
 
@@ -71,12 +180,30 @@ def get_photo_by_filename(db: Session, photo_filename: str) -> models.PhotoModel
     return photo
 
 
-def create_photo(db: Session, photo: CreatePhoto) -> models.PhotoModel:
+async def get_photo_by_filename_async(
+    db: AsyncSession, photo_filename: str
+) -> models.PhotoModel:
+    """Get a Photo by it's filename with an AsyncSession, see get_photo_by_filename"""
+
+    return await db.run_sync(get_photo_by_filename, photo_filename)
+
+
+def create_photo(
+    db: Session,
+    photo: CreatePhoto,
+    file_exists: bool | None = None,
+    invalidate_cache: bool = True,
+) -> models.PhotoModel:
     """Create a new Photo, return the Photo
 
     Args:
         db (Session): Database
         photo (CreatePhoto): Photo to create
+        file_exists (bool | None): If the Photo's file exists, when the caller
+            already checked it and read it's header with prepare_photo_file.
+            None to do both here
+        invalidate_cache (bool): False if the caller invalidates the response cache
+            itself
 
     Returns:
         PhotoModel: The Photo created in the database
@@ -94,7 +221,10 @@ def create_photo(db: Session, photo: CreatePhoto) -> models.PhotoModel:
             detail=f"Photo with filename {photo.filename} already exists",
         )
 
-    if not verify_photo_file_exists(photo.filename):
+    if file_exists is None:
+        file_exists = prepare_photo_file(photo)
+
+    if not file_exists:
         raise HTTPException(
             status_code=409,
             detail=f"Photo with filename {photo.filename} doesn't exist on disk",
@@ -116,17 +246,287 @@ def create_photo(db: Session, photo: CreatePhoto) -> models.PhotoModel:
     db.add(new_photo)
     db.commit()
     db.refresh(new_photo)
+    if invalidate_cache:
+        response_cache.invalidate(LAST_PHOTOS_PAGE_TAG)
 
     return new_photo
 
 
-def update_photo(db: Session, photo_id: int, photo: UpdatePhoto) -> models.PhotoModel:
+async def create_photo_async(db: AsyncSession, photo: CreatePhoto) -> models.PhotoModel:
+    """Create a new Photo with an AsyncSession, see create_photo.
+    The file is checked and it's header read in the threadpool first, and the
+    response cache invalidated after, so neither the disk nor the cache is touched
+    on the event loop."""
+
+    file_exists = await run_in_threadpool(prepare_photo_file, photo)
+    new_photo = await db.run_sync(create_photo, photo, file_exists, False)
+    await response_cache.invalidate_async(LAST_PHOTOS_PAGE_TAG)
+    return new_photo
+
+
+def prepare_photo_file(photo: CreatePhoto) -> bool:
+    """Check a Photo to create's file exists, and fill in the width, height and format
+    the caller left out from it's header
+
+    Args:
+        photo (CreatePhoto): Photo to create
+
+    Returns:
+        bool: True if the Photo's file exists
+    """
+
+    if not verify_photo_file_exists(photo.filename):
+        return False
+
+    if is_missing_image_header(photo):
+        fill_image_header(
+            photo, read_image_header(f"{PHOTO_DIRECTORY}/{photo.filename}")
+        )
+
+    return True
+
+
+def create_photos(
+    db: Session, photos: list[CreatePhoto], chunk_size: int = BULK_CHUNK_SIZE
+) -> list[BulkCreatePhotoResult]:
+    """Create many Photos at once, return a result for each requested Photo.
+
+    Each Photo is validated on its own. Photos whose filename already exists in
+    the database, or earlier in the same request, are skipped as "duplicate" and
+    Photos whose file is not on disk are skipped as "missing_file". All other
+    Photos are inserted in chunks of chunk_size rows within a single transaction,
+    so a database error rolls back the whole request.
+
+    Args:
+        db (Session): Database
+        photos (list[CreatePhoto]): Photos to create
+        chunk_size (int): Number of rows inserted per executemany call
+
+    Returns:
+        list[BulkCreatePhotoResult]: The result for each Photo, in request order
+    """
+
+    filenames = {photo.filename for photo in photos}
+    existing_filenames = get_existing_filenames(db, filenames)
+    files_on_disk = image_index.contains_all(filenames - existing_filenames)
+
+    results, pending = sort_bulk_photos(photos, existing_filenames, files_on_disk)
+    fill_image_headers(pending)
+
+    return insert_photos(db, results, pending, chunk_size)
+
+
+async def create_photos_async(
+    db: AsyncSession, photos: list[CreatePhoto], chunk_size: int = BULK_CHUNK_SIZE
+) -> list[BulkCreatePhotoResult]:
+    """Create many Photos at once with an AsyncSession, see create_photos.
+    The files are checked and the headers of the Photos to insert are read in the
+    threadpool, between the duplicate lookup and the inserts, and the response
+    cache invalidated after, so neither the disk nor the cache is touched on the
+    event loop."""
+
+    filenames = {photo.filename for photo in photos}
+    existing_filenames = await db.run_sync(get_existing_filenames, filenames)
+    files_on_disk = await run_in_threadpool(
+        image_index.contains_all, filenames - existing_filenames
+    )
+
+    results, pending = sort_bulk_photos(photos, existing_filenames, files_on_disk)
+    await run_in_threadpool(fill_image_headers, pending)
+
+    results = await db.run_sync(insert_photos, results, pending, chunk_size, False)
+    await response_cache.invalidate_async(LAST_PHOTOS_PAGE_TAG)
+    return results
+
+
+def get_existing_filenames(db: Session, filenames: set[str]) -> set[str]:
+    """Find which of the given filenames already belong to a Photo
+
+    Args:
+        db (Session): Database
+        filenames (set[str]): Filenames to look up
+
+    Returns:
+        set[str]: The filenames in the database
+    """
+
+    return {
+        filename
+        for (filename,) in db.query(models.PhotoModel.filename).filter(
+            models.PhotoModel.filename.in_(filenames)
+        )
+    }
+
+
+def sort_bulk_photos(
+    photos: list[CreatePhoto], existing_filenames: set[str], files_on_disk: set[str]
+) -> tuple[list[BulkCreatePhotoResult], list[CreatePhoto]]:
+    """Sort the Photos of a bulk create into duplicates, missing files and the Photos
+    to insert
+
+    Args:
+        photos (list[CreatePhoto]): Photos to create
+        existing_filenames (set[str]): Filenames already in the database
+        files_on_disk (set[str]): Filenames whose file exists
+
+    Returns:
+        tuple[list[BulkCreatePhotoResult], list[CreatePhoto]]: The result for each
+            Photo in request order, and the Photos to insert
+    """
+
+    results = []
+    accepted = {}
+
+    for photo in photos:
+        result = BulkCreatePhotoResult(filename=photo.filename, status="created")
+
+        if photo.filename in existing_filenames or photo.filename in accepted:
+            result.status = "duplicate"
+            result.detail = f"Photo with filename {photo.filename} already exists"
+        elif photo.filename not in files_on_disk:
+            result.status = "missing_file"
+            result.detail = (
+                f"Photo with filename {photo.filename} doesn't exist on disk"
+            )
+        else:
+            accepted[photo.filename] = photo
+
+        results.append(result)
+
+    return results, list(accepted.values())
+
+
+def fill_image_headers(photos: list[CreatePhoto]) -> None:
+    """Fill in the width, height and format the caller left out of each Photo from
+    it's file's header
+
+    Args:
+        photos (list[CreatePhoto]): Photos to create, whose files exist
+    """
+
+    missing_header = [photo for photo in photos if is_missing_image_header(photo)]
+    headers = read_image_headers(
+        f"{PHOTO_DIRECTORY}/{photo.filename}" for photo in missing_header
+    )
+    for photo, header in zip(missing_header, headers):
+        fill_image_header(photo, header)
+
+
+def insert_photos(
+    db: Session,
+    results: list[BulkCreatePhotoResult],
+    pending: list[CreatePhoto],
+    chunk_size: int,
+    invalidate_cache: bool = True,
+) -> list[BulkCreatePhotoResult]:
+    """Insert the Photos of a bulk create, and fill in the results of the Photos
+    created
+
+    Args:
+        db (Session): Database
+        results (list[BulkCreatePhotoResult]): The result for each Photo
+        pending (list[CreatePhoto]): Photos to insert
+        chunk_size (int): Number of rows inserted per executemany call
+        invalidate_cache (bool): False if the caller invalidates the response cache
+            itself
+
+    Returns:
+        list[BulkCreatePhotoResult]: The result for each Photo, in request order
+    """
+
+    created: dict[str, Photo] = {}
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start : start + chunk_size]
+        now = datetime.now()
+
+        db.execute(
+            models.PhotoModel.__table__.insert(),
+            [
+                {
+                    "filename": photo.filename,
+                    "title": photo.title,
+                    "description": photo.description,
+                    "url": photo.url,
+                    "width": photo.width,
+                    "height": photo.height,
+                    "upload_date": photo.upload_date,
+                    "format": photo.format,
+                    "updated_at": now,
+                    "created_at": now,
+                }
+                for photo in chunk
+            ],
+        )
+
+        # Build the results now, as committing expires every loaded Photo
+        created.update(
+            (db_photo.filename, Photo.from_orm(db_photo))
+            for db_photo in db.query(models.PhotoModel).filter(
+                models.PhotoModel.filename.in_([photo.filename for photo in chunk])
+            )
+        )
+
+    db.commit()
+    if invalidate_cache:
+        response_cache.invalidate(LAST_PHOTOS_PAGE_TAG)
+
+    for result in results:
+        if result.status == "created":
+            result.photo = created[result.filename]
+
+    return results
+
+
+def is_missing_image_header(photo: CreatePhoto) -> bool:
+    """Check if a Photo to create is missing any of it's width, height or format
+
+    Args:
+        photo (CreatePhoto): Photo to create
+
+    Returns:
+        bool: True if the width, height or format is missing
+    """
+
+    return photo.width is None or photo.height is None or photo.format is None
+
+
+def fill_image_header(photo: CreatePhoto, header: ImageHeader | None) -> None:
+    """Fill in the width, height and format the caller left out from the image header
+
+    Args:
+        photo (CreatePhoto): Photo to create
+        header (ImageHeader | None): Header read from the Photo's file
+    """
+
+    if header is None:
+        return
+
+    photo.width = photo.width if photo.width is not None else header.width
+    photo.height = photo.height if photo.height is not None else header.height
+    photo.format = photo.format if photo.format is not None else header.format
+
+
+def update_photo(
+    db: Session,
+    photo_id: int,
+    photo: UpdatePhoto,
+    file_exists: bool | None = None,
+    remove_stale_derivatives: bool = True,
+    invalidate_cache: bool = True,
+) -> models.PhotoModel:
     """Update a Photo by it's ID, return the updated Photo
 
     Args:
         db (Session): Database
         photo_id (int): ID of the Photo to update
         photo (UpdatePhoto): Photo to update
+        file_exists (bool | None): If the new filename's file exists, when the
+            caller already checked it. None to check it here
+        remove_stale_derivatives (bool): False if the caller removes the derivatives
+            of the old file itself once the filename has changed
+        invalidate_cache (bool): False if the caller invalidates the response cache
+            itself
 
     Returns:
         PhotoModel: The Photo updated in the database
@@ -142,7 +542,10 @@ def update_photo(db: Session, photo_id: int, photo: UpdatePhoto) -> models.Photo
         )
 
     if photo.filename:
-        if not verify_photo_file_exists(photo.filename):
+        if file_exists is None:
+            file_exists = verify_photo_file_exists(photo.filename)
+
+        if not file_exists:
             raise HTTPException(
                 status_code=409,
                 detail=f"Photo with filename {photo.filename} doesn't exist on disk",
@@ -158,6 +561,13 @@ def update_photo(db: Session, photo_id: int, photo: UpdatePhoto) -> models.Photo
                 detail=f"Photo with filename {photo.filename} already exists in the database",
             )
 
+    if (
+        remove_stale_derivatives
+        and photo.filename
+        and photo.filename != db_photo.filename
+    ):
+        remove_derivatives(db_photo.id)
+
     db_photo.filename = photo.filename or db_photo.filename
 
     db_photo.title = get_updated_value(db_photo.title, photo.title)
@@ -172,6 +582,32 @@ def update_photo(db: Session, photo_id: int, photo: UpdatePhoto) -> models.Photo
 
     db.commit()
     db.refresh(db_photo)
+    if invalidate_cache:
+        response_cache.invalidate(photo_tag(photo_id))
+
+    return db_photo
+
+
+async def update_photo_async(
+    db: AsyncSession, photo_id: int, photo: UpdatePhoto
+) -> models.PhotoModel:
+    """Update a Photo by it's ID with an AsyncSession, see update_photo.
+    The new file is checked, the old file's derivatives removed and the response
+    cache invalidated in the threadpool, so neither the disk nor the cache is
+    touched on the event loop."""
+
+    file_exists = None
+    if photo.filename:
+        file_exists = await run_in_threadpool(verify_photo_file_exists, photo.filename)
+
+    db_photo = await db.run_sync(
+        update_photo, photo_id, photo, file_exists, False, False
+    )
+    await response_cache.invalidate_async(photo_tag(photo_id))
+
+    # A filename already in the database is rejected, so a new one always differs
+    if photo.filename:
+        await run_in_threadpool(remove_derivatives, photo_id)
 
     return db_photo
 
@@ -186,7 +622,37 @@ def get_albums(db: Session) -> list[models.AlbumModel]:
         List[AlbumModel]: List of all Albums in Database
     """
 
-    return db.query(models.AlbumModel).all()
+    # Load every Album's photos with one extra IN query instead of one per Album
+    return (
+        db.query(models.AlbumModel)
+        .options(
+            joinedload(models.AlbumModel.cover_photo),
+            selectinload(models.AlbumModel.photos),
+        )
+        .all()
+    )
+
+
+async def get_albums_async(db: AsyncSession) -> list[models.AlbumModel]:
+    """Get all Albums with an AsyncSession, see get_albums"""
+
+    return await db.run_sync(get_albums)
+
+
+def album_single_load_options() -> list:
+    """Loader options used when a single Album is retrieved.
+    The cover is joined in, the photos are loaded with one extra IN query, as joining
+    a collection repeats the Album row once per photo and wraps .first() in a
+    subquery.
+
+    Returns:
+        list: SQLAlchemy loader options
+    """
+
+    return [
+        joinedload(models.AlbumModel.cover_photo),
+        selectinload(models.AlbumModel.photos),
+    ]
 
 
 def get_album_by_id(db: Session, album_id: int) -> models.AlbumModel:
@@ -200,7 +666,12 @@ def get_album_by_id(db: Session, album_id: int) -> models.AlbumModel:
         AlbumModel: The Album retrieved from the database
     """
 
-    album = db.query(models.AlbumModel).filter(models.AlbumModel.id == album_id).first()
+    album = (
+        db.query(models.AlbumModel)
+        .options(*album_single_load_options())
+        .filter(models.AlbumModel.id == album_id)
+        .first()
+    )
 
     if not album:
         raise HTTPException(
@@ -210,6 +681,12 @@ def get_album_by_id(db: Session, album_id: int) -> models.AlbumModel:
     return album
 
 
+async def get_album_by_id_async(db: AsyncSession, album_id: int) -> models.AlbumModel:
+    """Get an Album by it's ID with an AsyncSession, see get_album_by_id"""
+
+    return await db.run_sync(get_album_by_id, album_id)
+
+
 def get_album_by_title(db: Session, album_title: str) -> models.AlbumModel:
     """Get an Album by it's title, return the Album
 
@@ -223,6 +700,7 @@ def get_album_by_title(db: Session, album_title: str) -> models.AlbumModel:
 
     album = (
         db.query(models.AlbumModel)
+        .options(*album_single_load_options())
         .filter(models.AlbumModel.title == album_title)
         .first()
     )
@@ -235,12 +713,24 @@ def get_album_by_title(db: Session, album_title: str) -> models.AlbumModel:
     return album
 
 
-def create_album(db: Session, album: CreateAlbum) -> models.AlbumModel:
+async def get_album_by_title_async(
+    db: AsyncSession, album_title: str
+) -> models.AlbumModel:
+    """Get an Album by it's title with an AsyncSession, see get_album_by_title"""
+
+    return await db.run_sync(get_album_by_title, album_title)
+
+
+def create_album(
+    db: Session, album: CreateAlbum, invalidate_cache: bool = True
+) -> models.AlbumModel:
     """Create a new Album, return the Album
 
     Args:
         db (Session): Database
         album (CreateAlbum): Album to create
+        invalidate_cache (bool): False if the caller invalidates the response cache
+            itself
 
     Returns:
         AlbumModel: The Album created in the database
@@ -268,17 +758,35 @@ def create_album(db: Session, album: CreateAlbum) -> models.AlbumModel:
     db.add(new_album)
     db.commit()
     db.refresh(new_album)
+    if invalidate_cache:
+        response_cache.invalidate(ALBUMS_TAG)
+
+    return new_album
 
+
+async def create_album_async(db: AsyncSession, album: CreateAlbum) -> Album:
+    """Create a new Album with an AsyncSession, see create_album.
+    The Album is serialized before returning, as it's Photos are loaded lazily, and
+    the response cache is invalidated after, off the event loop."""
+
+    new_album = await db.run_sync(
+        lambda session: Album.from_orm(create_album(session, album, False))
+    )
+    await response_cache.invalidate_async(ALBUMS_TAG)
     return new_album
 
 
-def update_album(db: Session, album_id: int, album: UpdateAlbum) -> models.AlbumModel:
+def update_album(
+    db: Session, album_id: int, album: UpdateAlbum, invalidate_cache: bool = True
+) -> models.AlbumModel:
     """Update an Album by it's ID, return the updated Album
 
     Args:
         db (Session): Database
         album_id (int): ID of the Album to update
         album (UpdateAlbum): Album to update
+        invalidate_cache (bool): False if the caller invalidates the response cache
+            itself
 
     Returns:
         AlbumModel: The Album updated in the database
@@ -315,19 +823,40 @@ def update_album(db: Session, album_id: int, album: UpdateAlbum) -> models.Album
 
     db.commit()
     db.refresh(db_album)
+    if invalidate_cache:
+        response_cache.invalidate(ALBUMS_TAG)
 
     return db_album
 
 
+async def update_album_async(
+    db: AsyncSession, album_id: int, album: UpdateAlbum
+) -> Album:
+    """Update an Album by it's ID with an AsyncSession, see update_album.
+    The Album is serialized before returning, as it's Photos are loaded lazily, and
+    the response cache is invalidated after, off the event loop."""
+
+    db_album = await db.run_sync(
+        lambda session: Album.from_orm(update_album(session, album_id, album, False))
+    )
+    await response_cache.invalidate_async(ALBUMS_TAG)
+    return db_album
+
+
 def add_photos_to_album(
-    db: Session, album_id: int, photo_ids: [int]
+    db: Session, album_id: int, photo_ids: list[int], invalidate_cache: bool = True
 ) -> models.AlbumModel:
-    """Add a list of Photos to an Album, return the Album
+    """Add a list of Photos to an Album, return the Album.
+    Nothing is added if any Photo doesn't exist, is already in the Album or is
+    given more than once. One error lists them all, a 404 if any don't exist and a
+    409 otherwise.
 
     Args:
         db (Session): Database
         album_id (int): ID of the Album to add Photos to
-        photo_ids ([int]): List of Photo IDs to add to the Album
+        photo_ids (list[int]): List of Photo IDs to add to the Album
+        invalidate_cache (bool): False if the caller invalidates the response cache
+            itself
 
     Returns:
         AlbumModel: The Album with the Photos added
@@ -343,27 +872,63 @@ def add_photos_to_album(
             status_code=404, detail=f"Album with ID {album_id} does not exist"
         )
 
-    for photo_id in photo_ids:
-        photo = (
-            db.query(models.PhotoModel).filter(models.PhotoModel.id == photo_id).first()
+    requested_ids = set(photo_ids)
+
+    found_ids = {
+        photo_id
+        for (photo_id,) in db.query(models.PhotoModel.id).filter(
+            models.PhotoModel.id.in_(requested_ids)
+        )
+    }
+    missing_ids = sorted(requested_ids - found_ids)
+
+    existing_ids = {
+        photo_id
+        for (photo_id,) in db.query(models.album_photo.c.photo_id).filter(
+            models.album_photo.c.album_id == album_id,
+            models.album_photo.c.photo_id.in_(requested_ids),
+        )
+    }
+    repeated_ids = {
+        photo_id for photo_id, count in Counter(photo_ids).items() if count > 1
+    }
+    duplicate_ids = sorted(existing_ids | repeated_ids)
+
+    # Every problem is reported at once, so the caller can fix the list in one go
+    problems = []
+    if missing_ids:
+        problems.append(f"Photos with IDs {missing_ids} do not exist")
+    if duplicate_ids:
+        problems.append(
+            f"Photos with IDs {duplicate_ids} are already in Album with ID "
+            f"{album_id} or were given more than once"
         )
 
-        if not photo:
-            raise HTTPException(
-                status_code=404, detail=f"Photo with ID {photo_id} does not exist"
-            )
+    if problems:
+        raise HTTPException(
+            status_code=404 if missing_ids else 409, detail=". ".join(problems)
+        )
 
-        if photo.id in [photo.id for photo in album.photos]:
-            raise HTTPException(
-                status_code=409,
-                detail=f"Photo with ID {photo_id} is already in Album with ID {album_id}",
-            )
+    db.execute(
+        models.album_photo.insert().values(
+            [{"album_id": album_id, "photo_id": photo_id} for photo_id in photo_ids]
+        )
+    )
+    db.commit()
+    if invalidate_cache:
+        response_cache.invalidate(ALBUMS_TAG)
 
-        album.photos.append(photo)
+    return get_album_by_id(db, album_id)
 
-    db.commit()
-    db.refresh(album)
 
+async def add_photos_to_album_async(
+    db: AsyncSession, album_id: int, photo_ids: list[int]
+) -> models.AlbumModel:
+    """Add a list of Photos to an Album with an AsyncSession, see add_photos_to_album.
+    The response cache is invalidated after, off the event loop"""
+
+    album = await db.run_sync(add_photos_to_album, album_id, photo_ids, False)
+    await response_cache.invalidate_async(ALBUMS_TAG)
     return album
 
 
@@ -377,5 +942,4 @@ def verify_photo_file_exists(filename: str) -> bool:
         bool: True if the Photo file exists, False if it does not
     """
 
-    photo_path = f"app/static/images/{filename}"
-    return Path(photo_path).is_file()
+    return image_index.contains(filename)
@@ -0,0 +1,136 @@
+"""Principal Cache, remembers the user and roles resolved from an access token so
+authenticated requests don't decode the token and load the user's roles every time.
+"""
+
+from collections import OrderedDict
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from app.infrastructure.models.main_models import UserModel
+
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(
+    os.environ.get("PRINCIPAL_CACHE_MAX_ENTRIES", "10000")
+)
+
+
+class Principal(NamedTuple):
+    """The user an access token was issued to, with the keys of their roles.
+    user is only loaded when the Principal was resolved from the database.
+    token_version is the user's token version the roles were read at."""
+
+    user_id: int
+    username: str
+    is_admin: bool
+    role_keys: frozenset[str]
+    user: UserModel | None = None
+    token_version: int | None = None
+
+
+class PrincipalCache:
+    """A bounded cache of Principals keyed by access token.
+    Entries expire after ttl_seconds or when their token expires, whichever is first,
+    and the least recently used entry is dropped once max_entries is reached.
+    Each worker has it's own cache, so invalidate_user only drops this worker's
+    entries, callers check a hit's token_version is still current."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[str, tuple[float, Principal]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Principal | None:
+        """Get the Principal of a token, None if it isn't cached
+
+        Args:
+            token (str): The access token
+
+        Returns:
+            Principal | None: The cached Principal
+        """
+
+        with self._lock:
+            entry = self._entries.get(token)
+
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, principal: Principal, token_expires_at: float) -> None:
+        """Cache the Principal of a token
+
+        Args:
+            token (str): The access token
+            principal (Principal): The Principal resolved from the token
+            token_expires_at (float): When the token expires, as a unix timestamp
+        """
+
+        expires_at = min(time.time() + self.ttl_seconds, token_expires_at)
+
+        with self._lock:
+            self._entries[token] = (expires_at, principal)
+            self._entries.move_to_end(token)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(
+        self, user_id: int | None = None, username: str | None = None
+    ) -> None:
+        """Drop every cached Principal of a user, matched by ID or username
+
+        Args:
+            user_id (int | None): ID of the user
+            username (str | None): Username of the user
+        """
+
+        with self._lock:
+            stale = [
+                token
+                for token, (_, principal) in self._entries.items()
+                if principal.user_id == user_id or principal.username == username
+            ]
+
+            for token in stale:
+                del self._entries[token]
+
+            self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        """Drop every cached Principal"""
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Get the cache counters
+
+        Returns:
+            dict[str, int]: Hits, misses, invalidations and current size
+        """
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+principal_cache = PrincipalCache(
+    PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_CACHE_MAX_ENTRIES
+)
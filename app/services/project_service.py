@@ -1,10 +1,12 @@
 """Project Service, contains logic for interacting with Projects in the database.
 """
 from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import app.infrastructure.models.main_models as models
 from app.entities.project import ProjectCreate, ProjectUpdate
+from app.services.response_cache import PROJECTS_TAG, response_cache
 
 
 def get_projects(db: Session):
@@ -20,6 +22,12 @@ def get_projects(db: Session):
     return db.query(models.ProjectModel).all()
 
 
+async def get_projects_async(db: AsyncSession):
+    """Get all Projects with an AsyncSession, see get_projects"""
+
+    return await db.run_sync(get_projects)
+
+
 def get_project_by_id(db: Session, project_id: int):
     """Get a Project by it's ID, return the Project"""
 
@@ -30,8 +38,15 @@ def get_project_by_id(db: Session, project_id: int):
     )
 
 
-def create_project(db: Session, project: ProjectCreate):
-    """Create a Project, return the created Project"""
+async def get_project_by_id_async(db: AsyncSession, project_id: int):
+    """Get a Project by it's ID with an AsyncSession, see get_project_by_id"""
+
+    return await db.run_sync(get_project_by_id, project_id)
+
+
+def create_project(db: Session, project: ProjectCreate, invalidate_cache: bool = True):
+    """Create a Project, return the created Project.
+    The response cache is invalidated unless invalidate_cache is False"""
 
     # Validate the project_key is not empty, and is all lowercase alphanumeric characters or hyphens
     if (
@@ -69,11 +84,25 @@ def create_project(db: Session, project: ProjectCreate):
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    if invalidate_cache:
+        response_cache.invalidate(PROJECTS_TAG)
+    return db_project
+
+
+async def create_project_async(db: AsyncSession, project: ProjectCreate):
+    """Create a Project with an AsyncSession, see create_project.
+    The response cache is invalidated after, off the event loop"""
+
+    db_project = await db.run_sync(create_project, project, False)
+    await response_cache.invalidate_async(PROJECTS_TAG)
     return db_project
 
 
-def update_project(db: Session, project_id: int, project: ProjectUpdate):
-    """Update a Project by it's ID, return the updated Project"""
+def update_project(
+    db: Session, project_id: int, project: ProjectUpdate, invalidate_cache: bool = True
+):
+    """Update a Project by it's ID, return the updated Project.
+    The response cache is invalidated unless invalidate_cache is False"""
 
     # Get the project from the database
     db_project = (
@@ -102,11 +131,25 @@ def update_project(db: Session, project_id: int, project: ProjectUpdate):
 
     db.commit()
     db.refresh(db_project)
+    if invalidate_cache:
+        response_cache.invalidate(PROJECTS_TAG)
+    return db_project
+
+
+async def update_project_async(
+    db: AsyncSession, project_id: int, project: ProjectUpdate
+):
+    """Update a Project by it's ID with an AsyncSession, see update_project.
+    The response cache is invalidated after, off the event loop"""
+
+    db_project = await db.run_sync(update_project, project_id, project, False)
+    await response_cache.invalidate_async(PROJECTS_TAG)
     return db_project
 
 
-def remove_project_by_id(db: Session, project_id: int):
-    """Delete a Project by it's ID, return the deleted Project"""
+def remove_project_by_id(db: Session, project_id: int, invalidate_cache: bool = True):
+    """Delete a Project by it's ID, return the deleted Project.
+    The response cache is invalidated unless invalidate_cache is False"""
 
     db_project = (
         db.query(models.ProjectModel)
@@ -121,5 +164,16 @@ def remove_project_by_id(db: Session, project_id: int):
 
     db.delete(db_project)
     db.commit()
+    if invalidate_cache:
+        response_cache.invalidate(PROJECTS_TAG)
+
+    return db_project
+
+
+async def remove_project_by_id_async(db: AsyncSession, project_id: int):
+    """Delete a Project by it's ID with an AsyncSession, see remove_project_by_id.
+    The response cache is invalidated after, off the event loop"""
 
+    db_project = await db.run_sync(remove_project_by_id, project_id, False)
+    await response_cache.invalidate_async(PROJECTS_TAG)
     return db_project
@@ -0,0 +1,341 @@
+"""Response Cache, keeps the serialized JSON of list endpoints so repeated reads are
+answered without querying or serializing anything.
+
+Entries are keyed by path and query string, and tagged with the resources they
+contain. Service calls that write a resource invalidate the entries tagged with it.
+
+RESPONSE_CACHE_BACKEND picks where entries are kept, see cache_backends:
+"memory" gives each worker it's own cache, so writes served by another worker are
+only seen once the entry expires. "shared-memory" shares one cache between the
+workers of a host, and "redis" between every worker of every host. Async callers
+use the _async methods, which call the blocking backends in the threadpool.
+"""
+
+from datetime import datetime
+import json
+import os
+import tempfile
+import threading
+from typing import Callable, Iterable, NamedTuple, TypeVar
+
+from fastapi import Request, Response
+from fastapi_utils.api_model import APIModel
+from starlette.concurrency import run_in_threadpool
+
+from app.infrastructure.cache_backends import CacheBackend, create_backend
+from app.infrastructure.replicas import reads_own_writes
+from app.services import etag_service
+
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", "10"))
+# The memory budget of each worker's cache, or of the shared memory file
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+RESPONSE_CACHE_SHARED_PATH = os.environ.get(
+    "RESPONSE_CACHE_SHARED_PATH",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        "response-cache",
+    ),
+)
+RESPONSE_CACHE_REDIS_URL = os.environ.get(
+    "RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0"
+)
+RESPONSE_CACHE_REDIS_TIMEOUT_SECONDS = float(
+    os.environ.get("RESPONSE_CACHE_REDIS_TIMEOUT_SECONDS", "0.25")
+)
+RESPONSE_CACHE_REDIS_PREFIX = "response-cache:"
+
+PROJECTS_TAG = "projects"
+ROLES_TAG = "roles"
+FAQS_TAG = "faqs"
+ALBUMS_TAG = "albums"
+# Pages of Photos that weren't full, the only pages new Photos can be added to
+LAST_PHOTOS_PAGE_TAG = "photos:last-page"
+
+T = TypeVar("T")
+
+
+def photo_tag(photo_id: int) -> str:
+    """Get the tag of the entries containing a Photo"""
+
+    return f"photo:{photo_id}"
+
+
+class CachedResponse(NamedTuple):
+    """The serialized body of a response, with the validator it was served with"""
+
+    body: bytes
+    validator: etag_service.Validator | None
+
+    def encode(self) -> bytes:
+        """Encode as the validator's JSON, a newline, then the body"""
+
+        etag, last_modified = self.validator or (None, None)
+        header = [etag, last_modified.isoformat() if last_modified else None]
+        return json.dumps(header).encode() + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, value: bytes) -> "CachedResponse":
+        """Decode a CachedResponse encoded by encode"""
+
+        header, _, body = value.partition(b"\n")
+        etag, last_modified = json.loads(header)
+
+        if etag is None:
+            return cls(body, None)
+
+        return cls(
+            body,
+            (etag, datetime.fromisoformat(last_modified) if last_modified else None),
+        )
+
+
+class ResponseCache:
+    """A cache of serialized responses kept in a CacheBackend for ttl_seconds.
+    Hits and misses are counted per worker."""
+
+    def __init__(self, backend: CacheBackend, ttl_seconds: float):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """The backend's generation, read before a response to cache is loaded"""
+
+        return self.backend.generation()
+
+    async def _call(self, function: Callable[..., T], *args) -> T:
+        """Call a function using the backend, in the threadpool if it's blocking"""
+
+        if self.backend.blocking:
+            return await run_in_threadpool(function, *args)
+        return function(*args)
+
+    async def generation_async(self) -> int:
+        """Get the backend's generation off the event loop, see generation"""
+
+        return await self._call(self.backend.generation)
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Get a cached response, None if it isn't cached
+
+        Args:
+            key (str): The path and query string of the request
+
+        Returns:
+            CachedResponse | None: The cached response
+        """
+
+        value = self.backend.get(key)
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return CachedResponse.decode(value)
+
+    async def get_async(self, key: str) -> CachedResponse | None:
+        """Get a cached response off the event loop, see get"""
+
+        return await self._call(self.get, key)
+
+    def put(
+        self,
+        key: str,
+        body: bytes,
+        validator: etag_service.Validator | None,
+        tags: Iterable[str],
+        generation: int,
+    ) -> None:
+        """Cache a response, unless something it contains was written since it was read
+
+        Args:
+            key (str): The path and query string of the request
+            body (bytes): The serialized response
+            validator (etag_service.Validator | None): The ETag and last modified time
+            tags (Iterable[str]): Tags of the resources in the response
+            generation (int): The cache's generation before the response was read
+        """
+
+        value = CachedResponse(body, validator).encode()
+        self.backend.set(key, value, self.ttl_seconds, tags, generation)
+
+    async def put_async(
+        self,
+        key: str,
+        body: bytes,
+        validator: etag_service.Validator | None,
+        tags: Iterable[str],
+        generation: int,
+    ) -> None:
+        """Cache a response off the event loop, see put"""
+
+        await self._call(self.put, key, body, validator, tags, generation)
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every cached response tagged with any of the tags
+
+        Args:
+            tags (str): Tags of the resources that were written
+        """
+
+        self.backend.invalidate(tags)
+
+    async def invalidate_async(self, *tags: str) -> None:
+        """Drop every cached response tagged with any of the tags off the event loop,
+        see invalidate"""
+
+        await self._call(self.invalidate, *tags)
+
+    def clear(self) -> None:
+        """Drop every cached response"""
+
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        """Get the cache counters
+
+        Returns:
+            dict: This worker's hits, misses and hit ratio, with the backend's
+                evictions, invalidations and usage
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            counters = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+        return counters | self.backend.stats()
+
+
+response_cache = ResponseCache(
+    create_backend(
+        RESPONSE_CACHE_BACKEND,
+        max_bytes=RESPONSE_CACHE_MAX_BYTES,
+        shared_path=RESPONSE_CACHE_SHARED_PATH,
+        redis_url=RESPONSE_CACHE_REDIS_URL,
+        redis_prefix=RESPONSE_CACHE_REDIS_PREFIX,
+        redis_timeout_seconds=RESPONSE_CACHE_REDIS_TIMEOUT_SECONDS,
+    ),
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+
+
+def get_cache_key(request: Request) -> str:
+    """Get the cache key of a request, its path and sorted query string"""
+
+    query = "&".join(
+        f"{key}={value}" for key, value in sorted(request.query_params.multi_items())
+    )
+    return f"{request.url.path}?{query}"
+
+
+async def get_cached_response(request: Request) -> Response | None:
+    """Answer a request from the cache, None if it isn't cached.
+    Clients that wrote within the read-your-writes window always miss, as the
+    cache may hold what was read before their write reached every worker.
+
+    Args:
+        request (Request): The incoming request
+
+    Returns:
+        Response | None: The cached response, or a 304 if the client's copy is current
+    """
+
+    if reads_own_writes(request):
+        return None
+
+    cached = await response_cache.get_async(get_cache_key(request))
+    if cached is None:
+        return None
+
+    # Only the headers are set until the client's copy is known to be stale
+    response = Response()
+    del response.headers["content-length"]
+    if not_modified := etag_service.conditional_response(
+        request, response, cached.validator
+    ):
+        return not_modified
+
+    return json_response(response, cached.body)
+
+
+def serialize(model: type[APIModel], items: list) -> bytes:
+    """Serialize a list of ORM objects like a route's response model would
+
+    Args:
+        model (type[APIModel]): Entity to serialize each item as
+        items (list): ORM objects to serialize
+
+    Returns:
+        bytes: The JSON array
+    """
+
+    return (
+        "[" + ",".join(model.from_orm(item).json(by_alias=True) for item in items) + "]"
+    ).encode()
+
+
+def json_response(response: Response, body: bytes) -> Response:
+    """Make a JSON response from a serialized body, with the route's headers"""
+
+    return Response(body, media_type="application/json", headers=dict(response.headers))
+
+
+async def store_response(
+    request: Request,
+    model: type[APIModel],
+    items: list,
+    validator: etag_service.Validator | None,
+    tags: Iterable[str],
+    generation: int,
+) -> bytes:
+    """Serialize a list of items like the route's response model would, and cache it
+
+    Args:
+        request (Request): The incoming request
+        model (type[APIModel]): Entity to serialize each item as
+        items (list): ORM objects to serialize
+        validator (etag_service.Validator | None): The ETag and last modified time
+        tags (Iterable[str]): Tags of the resources in the response
+        generation (int): The cache's generation before the items were read
+
+    Returns:
+        bytes: The serialized response
+    """
+
+    body = serialize(model, items)
+    await response_cache.put_async(
+        get_cache_key(request), body, validator, tags, generation
+    )
+    return body
+
+
+async def cache_response(
+    request: Request,
+    response: Response,
+    model: type[APIModel],
+    items: list,
+    validator: etag_service.Validator | None,
+    tags: Iterable[str],
+    generation: int,
+) -> Response:
+    """Serialize a list of items like the route's response model would, and cache it.
+    See store_response
+
+    Returns:
+        Response: The serialized response, with the route's headers
+    """
+
+    body = await store_response(request, model, items, validator, tags, generation)
+    return json_response(response, body)
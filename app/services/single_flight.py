@@ -0,0 +1,166 @@
+"""Single Flight, runs identical concurrent reads once. The first request for a key
+leads and runs the query and serialization, identical requests arriving while it
+runs wait for and share it's result instead of running their own.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException, Request
+
+from app.infrastructure.replicas import reads_own_writes
+from app.services import etag_service
+from app.services.response_cache import get_cache_key
+
+# How long a request waits for the leader before giving up with a 503
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.environ.get("SINGLE_FLIGHT_WAIT_SECONDS", "30"))
+# If waiters get the leader's unexpected errors too, as a SharedError raised from
+# it, rather than running the call themselves. HTTPExceptions, like a 404, are
+# always shared.
+SINGLE_FLIGHT_SHARE_ERRORS = (
+    os.environ.get("SINGLE_FLIGHT_SHARE_ERRORS", "true").lower() == "true"
+)
+
+T = TypeVar("T")
+
+
+class LeaderCancelled(Exception):
+    """The leading request was cancelled, so waiters must run the call themselves"""
+
+
+class SharedError(Exception):
+    """The identical call a waiter was waiting for failed, it's cause is the error"""
+
+
+class SingleFlight:
+    """Coalesces concurrent calls by key. Must be used from the event loop."""
+
+    def __init__(self, wait_seconds: float, share_errors: bool):
+        self.wait_seconds = wait_seconds
+        self.share_errors = share_errors
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.shared_errors = 0
+        self.retries = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Run a call, or wait for the identical call already running
+
+        Args:
+            key (str): Identifies calls that would return the same result
+            call (Callable[[], Awaitable[T]]): Makes the call
+
+        Raises:
+            HTTPException: 503 if waiting for the leader takes over wait_seconds, or
+                a copy of the leader's HTTPException
+            SharedError: If the leader failed and errors are shared, raised from
+                the leader's error
+
+        Returns:
+            T: The result of the call
+        """
+
+        future = self._in_flight.get(key)
+        if future is None:
+            return await self._lead(key, call)
+
+        self.coalesced += 1
+        try:
+            # A waiter giving up must not cancel the result for the others
+            return await asyncio.wait_for(asyncio.shield(future), self.wait_seconds)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Timed out waiting for an identical request to finish",
+            )
+        # Each waiter raises it's own exception, as raising the leader's would add
+        # every waiter's frames to the one traceback
+        except HTTPException as error:
+            raise HTTPException(
+                status_code=error.status_code,
+                detail=error.detail,
+                headers=error.headers,
+            ) from error
+        except LeaderCancelled:
+            self.retries += 1
+            return await call()
+        except Exception as error:
+            if self.share_errors:
+                self.shared_errors += 1
+                raise SharedError(
+                    f"An identical call failed with {type(error).__name__}"
+                ) from error
+            self.retries += 1
+            return await call()
+
+    async def _lead(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        self.leaders += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelled())
+            raise
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[key]
+            # Nobody may be waiting, so mark the error as retrieved
+            if future.done() and not future.cancelled():
+                future.exception()
+
+    def stats(self) -> dict[str, int]:
+        """Get the coalescing counters
+
+        Returns:
+            dict[str, int]: Leading and coalesced requests, waiters that timed out,
+                got the leader's error or ran the call themselves, and keys in flight
+        """
+
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "shared_errors": self.shared_errors,
+            "retries": self.retries,
+            "in_flight": len(self._in_flight),
+        }
+
+
+single_flight = SingleFlight(SINGLE_FLIGHT_WAIT_SECONDS, SINGLE_FLIGHT_SHARE_ERRORS)
+
+
+async def coalesce(
+    request: Request,
+    validator: etag_service.Validator | None,
+    call: Callable[[], Awaitable[T]],
+) -> T:
+    """Run a call for a GET request once for every identical request in flight.
+    Requests are identical if they have the same path, query string and ETag, so
+    only requests for the same version of a resource share a result. Clients that
+    wrote within the read-your-writes window always run their own call.
+
+    Args:
+        request (Request): The incoming request
+        validator (etag_service.Validator | None): The resource's current validator
+        call (Callable[[], Awaitable[T]]): Loads and serializes the resource
+
+    Returns:
+        T: The result of the call
+    """
+
+    if reads_own_writes(request):
+        return await call()
+
+    etag = validator[0] if validator is not None else ""
+    return await single_flight.run(f"{get_cache_key(request)}#{etag}", call)
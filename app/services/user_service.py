@@ -1,7 +1,9 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import os
 import re
-from typing import Annotated, List
+from typing import Annotated, Any, List
 from dotenv import load_dotenv
 
 from fastapi import HTTPException, status, Depends
@@ -10,23 +12,34 @@ from pydantic import BaseModel
 from rsa import verify
 from app.entities.role import CreateRole
 from app.entities.user import CreateUser, User
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 
 from app.infrastructure.models.main_models import RoleModel, UserModel
-from app.infrastructure.main_database import SessionLocal
+from app.infrastructure.database import get_async_main_db
+from app.services.principal_cache import Principal, principal_cache
+from app.services.response_cache import ROLES_TAG, response_cache
 
 load_dotenv()
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = os.environ.get("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", "2"))
+TOKEN_ROLE_CLAIMS = os.environ.get("TOKEN_ROLE_CLAIMS", "false").lower() == "true"
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oath2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
+# bcrypt is deliberately slow, so hashing runs on a small dedicated pool. This keeps it
+# off the event loop and stops a burst of logins from taking every CPU and thread.
+password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+
 
 class Token(BaseModel):
     """The token model"""
@@ -41,24 +54,23 @@ class TokenData(BaseModel):
     username: str | None = None
 
 
-def get_main_db():
-    """Get the main database session.
-
-    Yields:
-        Any: The database session.
-    """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-async def get_current_user(
+async def get_current_principal(
     token: Annotated[str, Depends(oath2_scheme)],
-    db: SessionLocal = Depends(get_main_db),
-) -> UserModel:
-    """Get the current user from the token"""
+    db: AsyncSession = Depends(get_async_main_db),
+) -> Principal:
+    """Get the principal of the current request from the token.
+    Tokens with role claims are authorized from their claims once their token version
+    is confirmed current, other tokens are resolved from the database. Either way the
+    principal is kept in the principal cache, so repeat requests with the same token
+    skip decoding it and loading the roles. A cached principal is only used while the
+    user's token version is unchanged, as another worker may have changed the roles."""
+    principal = principal_cache.get(token)
+    if principal is not None:
+        token_version = await db.run_sync(get_token_version, principal.user_id)
+        if token_version == principal.token_version:
+            return principal
+        principal_cache.invalidate_user(user_id=principal.user_id)
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -73,20 +85,80 @@ async def get_current_user(
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username=token_data.username)
+
+    if "roles" in payload:
+        token_version = await db.run_sync(get_token_version, payload["uid"])
+        if token_version is None or token_version != payload.get("ver"):
+            raise credentials_exception
+
+        principal = Principal(
+            user_id=payload["uid"],
+            username=username,
+            is_admin=payload["is_admin"],
+            role_keys=frozenset(payload["roles"]),
+            token_version=token_version,
+        )
+    else:
+        user = await db.run_sync(get_user_with_roles, token_data.username)
+        if user is None:
+            raise credentials_exception
+
+        principal = Principal(
+            user_id=user.user_id,
+            username=user.username,
+            is_admin=user.is_admin,
+            role_keys=frozenset(role.role_key for role in user.roles),
+            user=user,
+            token_version=user.token_version,
+        )
+
+    principal_cache.put(token, principal, payload["exp"])
+    return principal
+
+
+async def get_current_user(
+    principal: Annotated[Principal, Depends(get_current_principal)],
+    db: AsyncSession = Depends(get_async_main_db),
+) -> UserModel:
+    """Get the current user from the token"""
+    if principal.user is not None:
+        return principal.user
+
+    # Principals from role claims don't carry the user, load it for the caller
+    user = await db.run_sync(get_user_with_roles, principal.username)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
 def hash_password(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
+    """Hash a password on the password executor"""
+    return password_executor.submit(pwd_context.hash, password).result()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a password on the password executor"""
+    return password_executor.submit(
+        pwd_context.verify, plain_password, hashed_password
+    ).result()
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the password executor without blocking the event loop"""
+    return await asyncio.wrap_future(
+        password_executor.submit(pwd_context.hash, password)
+    )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the password executor without blocking the event loop"""
+    return await asyncio.wrap_future(
+        password_executor.submit(pwd_context.verify, plain_password, hashed_password)
+    )
 
 
 def authenticate_user(db: Session, username: str, password: str):
@@ -103,6 +175,21 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 
+async def authenticate_user_async(db: AsyncSession, username: str, password: str):
+    """Authenticate a user without blocking the event loop,
+    returns the user, with their roles loaded, on success and None on fail"""
+
+    user = await db.run_sync(get_user_with_roles, username)
+
+    if not user:
+        return False
+
+    if not await verify_password_async(password, user.password_hash):
+        return False
+
+    return user
+
+
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=60)):
     """Create an access token"""
     to_encode = data.copy()
@@ -113,14 +200,61 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
     return encoded_jwt
 
 
+def create_user_access_token(user: UserModel) -> str:
+    """Create an access token for a user.
+    When TOKEN_ROLE_CLAIMS is on the token also carries the user's ID, admin flag,
+    role keys and token version, so requests can be authorized without the database.
+    """
+    data: dict[str, Any] = {"sub": user.username}
+
+    if TOKEN_ROLE_CLAIMS:
+        data.update(
+            uid=user.user_id,
+            is_admin=user.is_admin,
+            roles=sorted(role.role_key for role in user.roles),
+            ver=user.token_version,
+        )
+
+    return create_access_token(data=data)
+
+
+def get_token_version(db: Session, user_id: int) -> int | None:
+    """Get the current token version of a user, None if the user doesn't exist"""
+
+    row = db.query(UserModel.token_version).filter(UserModel.user_id == user_id).first()
+    return row[0] if row else None
+
+
 def get_user(db: Session, username: str) -> UserModel | None:
     """Get a user by their username"""
 
     return db.query(UserModel).filter(UserModel.username == username).first()
 
 
-def create_user(db: Session, create_user_request: CreateUser) -> UserModel:
-    """Create a user"""
+def get_user_with_roles(db: Session, username: str) -> UserModel | None:
+    """Get a user by their username with their roles loaded.
+    The user is detached from the session, so it can safely outlive the request
+    in the principal cache."""
+
+    user = (
+        db.query(UserModel)
+        .options(selectinload(UserModel.roles))
+        .filter(UserModel.username == username)
+        .first()
+    )
+
+    if user is not None:
+        for role in user.roles:
+            db.expunge(role)
+        db.expunge(user)
+
+    return user
+
+
+def create_user(
+    db: Session, create_user_request: CreateUser, password_hash: str | None = None
+) -> UserModel:
+    """Create a user, the password is hashed here unless password_hash is given"""
 
     # If the user already exists, raise an error
     if get_user(db, create_user_request.username):
@@ -149,7 +283,8 @@ def create_user(db: Session, create_user_request: CreateUser) -> UserModel:
         first_name=create_user_request.first_name,
         last_name=create_user_request.last_name,
         preferred_name=create_user_request.preferred_name,
-        password_hash=hash_password(create_user_request.password),
+        password_hash=password_hash or hash_password(create_user_request.password),
+        is_admin=False,
         created_at=datetime.now(),
         updated_at=datetime.now(),
     )
@@ -157,9 +292,23 @@ def create_user(db: Session, create_user_request: CreateUser) -> UserModel:
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate_user(username=db_user.username)
     return db_user
 
 
+async def create_user_async(db: AsyncSession, create_user_request: CreateUser) -> User:
+    """Create a user with an AsyncSession, see create_user.
+    The password is hashed on the password executor first, and the user is
+    serialized before returning as their roles are loaded lazily."""
+
+    password_hash = await hash_password_async(create_user_request.password)
+    return await db.run_sync(
+        lambda session: User.from_orm(
+            create_user(session, create_user_request, password_hash)
+        )
+    )
+
+
 def get_role(db: Session, role_key: str) -> RoleModel | None:
     """Get a role by it's role_key"""
 
@@ -172,8 +321,17 @@ def get_roles(db: Session) -> List[RoleModel]:
     return db.query(RoleModel).all()
 
 
-def create_role(db: Session, create_role_request: CreateRole) -> RoleModel:
-    """Create a role"""
+async def get_roles_async(db: AsyncSession) -> List[RoleModel]:
+    """Get all roles with an AsyncSession"""
+
+    return await db.run_sync(get_roles)
+
+
+def create_role(
+    db: Session, create_role_request: CreateRole, invalidate_cache: bool = True
+) -> RoleModel:
+    """Create a role.
+    The response cache is invalidated unless invalidate_cache is False"""
 
     # If the role already exists, raise an error
     if get_role(db, create_role_request.role_key):
@@ -195,10 +353,23 @@ def create_role(db: Session, create_role_request: CreateRole) -> RoleModel:
     db.add(db_role)
     db.commit()
     db.refresh(db_role)
+    if invalidate_cache:
+        response_cache.invalidate(ROLES_TAG)
     return db_role
 
 
-def add_user_on_role(db: Session, user_id: int, role_key: str) -> None:
+async def create_role_async(
+    db: AsyncSession, create_role_request: CreateRole
+) -> RoleModel:
+    """Create a role with an AsyncSession.
+    The response cache is invalidated after, off the event loop"""
+
+    db_role = await db.run_sync(create_role, create_role_request, False)
+    await response_cache.invalidate_async(ROLES_TAG)
+    return db_role
+
+
+def add_user_on_role(db: Session, user_id: int, role_key: str) -> UserModel:
     """Add a user to a role"""
 
     db_user = db.query(UserModel).filter(UserModel.user_id == user_id).first()
@@ -213,12 +384,22 @@ def add_user_on_role(db: Session, user_id: int, role_key: str) -> None:
         raise HTTPException(status_code=400, detail="User already has this role")
 
     db_user.roles.append(db_role)
+    db_user.token_version += 1
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate_user(user_id=user_id)
     return db_user
 
 
-def remove_user_from_role(db: Session, user_id: int, role_key: str) -> None:
+async def add_user_on_role_async(db: AsyncSession, user_id: int, role_key: str) -> User:
+    """Add a user to a role with an AsyncSession, returns the serialized user"""
+
+    return await db.run_sync(
+        lambda session: User.from_orm(add_user_on_role(session, user_id, role_key))
+    )
+
+
+def remove_user_from_role(db: Session, user_id: int, role_key: str) -> UserModel:
     """Remove a user from a role"""
 
     db_user = db.query(UserModel).filter(UserModel.user_id == user_id).first()
@@ -233,11 +414,25 @@ def remove_user_from_role(db: Session, user_id: int, role_key: str) -> None:
         raise HTTPException(status_code=400, detail="User does not have this role")
 
     db_user.roles.remove(db_role)
+    db_user.token_version += 1
     db.commit()
     db.refresh(db_user)
+    principal_cache.invalidate_user(user_id=user_id)
     return db_user
 
 
-def user_has_role(user: UserModel, role_key: str) -> bool:
+async def remove_user_from_role_async(
+    db: AsyncSession, user_id: int, role_key: str
+) -> User:
+    """Remove a user from a role with an AsyncSession, returns the serialized user"""
+
+    return await db.run_sync(
+        lambda session: User.from_orm(remove_user_from_role(session, user_id, role_key))
+    )
+
+
+def user_has_role(user: UserModel | Principal, role_key: str) -> bool:
     """Check if a user has a role"""
+    if isinstance(user, Principal):
+        return role_key in user.role_keys
     return role_key in [role.role_key for role in user.roles]
@@ -1,8 +1,10 @@
 from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import app.infrastructure.models.wedding_models as models
 from app.entities.wedding.Faq import FaqCreate, FaqUpdate
+from app.services.response_cache import FAQS_TAG, response_cache
 
 
 def get_faqs(db: Session):
@@ -11,14 +13,27 @@ def get_faqs(db: Session):
     return db.query(models.FaqModel).all()
 
 
+async def get_faqs_async(db: AsyncSession):
+    """Get all FAQs with an AsyncSession, see get_faqs"""
+
+    return await db.run_sync(get_faqs)
+
+
 def get_faq_by_id(db: Session, faq_id: int):
     """Get an FAQ by it's ID, return the FAQ"""
 
     return db.query(models.FaqModel).filter(models.FaqModel.id == faq_id).first()
 
 
-def create_faq(db: Session, faq: FaqCreate):
-    """Create an FAQ, return the created FAQ"""
+async def get_faq_by_id_async(db: AsyncSession, faq_id: int):
+    """Get an FAQ by it's ID with an AsyncSession, see get_faq_by_id"""
+
+    return await db.run_sync(get_faq_by_id, faq_id)
+
+
+def create_faq(db: Session, faq: FaqCreate, invalidate_cache: bool = True):
+    """Create an FAQ, return the created FAQ.
+    The response cache is invalidated unless invalidate_cache is False"""
 
     # Make sure there isn't already a faq with the same question
     duplicates = (
@@ -36,11 +51,23 @@ def create_faq(db: Session, faq: FaqCreate):
     db.add(db_faq)
     db.commit()
     db.refresh(db_faq)
+    if invalidate_cache:
+        response_cache.invalidate(FAQS_TAG)
+    return db_faq
+
+
+async def create_faq_async(db: AsyncSession, faq: FaqCreate):
+    """Create an FAQ with an AsyncSession, see create_faq.
+    The response cache is invalidated after, off the event loop"""
+
+    db_faq = await db.run_sync(create_faq, faq, False)
+    await response_cache.invalidate_async(FAQS_TAG)
     return db_faq
 
 
-def update_faq(db: Session, faq_id: int, faq: FaqUpdate):
-    """Update an FAQ by it's ID, return the updated FAQ"""
+def update_faq(db: Session, faq_id: int, faq: FaqUpdate, invalidate_cache: bool = True):
+    """Update an FAQ by it's ID, return the updated FAQ.
+    The response cache is invalidated unless invalidate_cache is False"""
 
     db_faq = db.query(models.FaqModel).filter(models.FaqModel.id == faq_id).first()
 
@@ -70,11 +97,23 @@ def update_faq(db: Session, faq_id: int, faq: FaqUpdate):
 
     db.commit()
     db.refresh(db_faq)
+    if invalidate_cache:
+        response_cache.invalidate(FAQS_TAG)
+    return db_faq
+
+
+async def update_faq_async(db: AsyncSession, faq_id: int, faq: FaqUpdate):
+    """Update an FAQ by it's ID with an AsyncSession, see update_faq.
+    The response cache is invalidated after, off the event loop"""
+
+    db_faq = await db.run_sync(update_faq, faq_id, faq, False)
+    await response_cache.invalidate_async(FAQS_TAG)
     return db_faq
 
 
-def remove_faq_by_id(db: Session, faq_id: int):
-    """Delete an FAQ by it's ID, return the deleted FAQ"""
+def remove_faq_by_id(db: Session, faq_id: int, invalidate_cache: bool = True):
+    """Delete an FAQ by it's ID, return the deleted FAQ.
+    The response cache is invalidated unless invalidate_cache is False"""
 
     db_faq = db.query(models.FaqModel).filter(models.FaqModel.id == faq_id).first()
 
@@ -83,5 +122,16 @@ def remove_faq_by_id(db: Session, faq_id: int):
 
     db.delete(db_faq)
     db.commit()
+    if invalidate_cache:
+        response_cache.invalidate(FAQS_TAG)
+
+    return db_faq
+
+
+async def remove_faq_by_id_async(db: AsyncSession, faq_id: int):
+    """Delete an FAQ by it's ID with an AsyncSession, see remove_faq_by_id.
+    The response cache is invalidated after, off the event loop"""
 
+    db_faq = await db.run_sync(remove_faq_by_id, faq_id, False)
+    await response_cache.invalidate_async(FAQS_TAG)
     return db_faq
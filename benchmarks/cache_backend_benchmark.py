@@ -0,0 +1,181 @@
+"""Measure the response cache backends, and how long an invalidation takes to reach
+every worker.
+
+For each backend, times hits and stores of a typical cached page. Then starts
+worker processes that each create their own backend, like uvicorn workers do,
+caches a value, invalidates it from this process and reports how long each worker
+kept serving it. Workers of the memory backend can't see another worker's
+invalidation, so they serve the value until it expires after --ttl seconds.
+
+The Redis backend runs against the fake server in tests/fake_redis.py, started in
+it's own process, unless --redis-url points at a real one. Run from the repository
+root:
+
+    python -m benchmarks.cache_backend_benchmark [--workers 4] [--ttl 2]
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import IO, cast
+
+from app.infrastructure.cache_backends import CacheBackend, create_backend
+
+BACKENDS = ["memory", "shared-memory", "redis"]
+VALUE = b"x" * 20_000
+MAX_BYTES = 64 * 1024 * 1024
+# How often workers look the value up while waiting for the invalidation
+POLL_SECONDS = 0.0005
+FAKE_REDIS = os.path.join(os.path.dirname(__file__), "..", "tests", "fake_redis.py")
+
+
+def start_fake_redis() -> tuple[subprocess.Popen, str]:
+    """Start the fake Redis server on a free port, return it's process and URL"""
+
+    process = subprocess.Popen(
+        [sys.executable, FAKE_REDIS, "0"], stdout=subprocess.PIPE, text=True
+    )
+    # The server prints "serving on <url>" once it listens, stdout is a pipe
+    url = cast(IO[str], process.stdout).readline().split()[-1]
+    return process, url
+
+
+def make_backend(name: str, shared_path: str, redis_url: str) -> CacheBackend:
+    """Create a backend like the response cache does"""
+
+    return create_backend(
+        name,
+        max_bytes=MAX_BYTES,
+        shared_path=shared_path,
+        redis_url=redis_url,
+        redis_prefix="cache-backend-benchmark:",
+        redis_timeout_seconds=1,
+    )
+
+
+def time_operations(backend: CacheBackend, operations: int) -> tuple[float, float]:
+    """Time storing and hitting one value, return the mean seconds of each"""
+
+    start = time.perf_counter()
+    for i in range(operations):
+        backend.set(f"page-{i % 100}", VALUE, 60, ["photos"], backend.generation())
+    stored = (time.perf_counter() - start) / operations
+
+    start = time.perf_counter()
+    for i in range(operations):
+        backend.get(f"page-{i % 100}")
+    hit = (time.perf_counter() - start) / operations
+
+    return stored, hit
+
+
+def worker(
+    name: str,
+    shared_path: str,
+    redis_url: str,
+    ttl: float,
+    ready: multiprocessing.Barrier,
+    invalidated: multiprocessing.Event,
+    delays: multiprocessing.Queue,
+) -> None:
+    """Cache the value in this worker's backend, then report how long after the
+    invalidation the worker kept getting it"""
+
+    backend = make_backend(name, shared_path, redis_url)
+    if backend.get("page") is None:
+        backend.set("page", VALUE, ttl, ["photos"], backend.generation())
+    ready.wait()
+
+    invalidated.wait()
+    while backend.get("page") is not None:
+        time.sleep(POLL_SECONDS)
+    delays.put(time.time())
+
+
+def measure_propagation(
+    name: str, shared_path: str, redis_url: str, workers: int, ttl: float
+) -> list[float]:
+    """Invalidate a value every worker has cached, return how many seconds each
+    worker kept serving it"""
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(workers + 1)
+    invalidated = context.Event()
+    delays = context.Queue()
+
+    backend = make_backend(name, shared_path, redis_url)
+    backend.clear()
+    backend.set("page", VALUE, ttl, ["photos"], backend.generation())
+
+    processes = [
+        context.Process(
+            target=worker,
+            args=(name, shared_path, redis_url, ttl, ready, invalidated, delays),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    ready.wait()
+    start = time.time()
+    backend.invalidate(["photos"])
+    invalidated.set()
+
+    seen = [delays.get() - start for _ in processes]
+    for process in processes:
+        process.join()
+    return seen
+
+
+def main() -> None:
+    """Run the benchmark and print the results"""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--operations", type=int, default=10_000)
+    parser.add_argument("--ttl", type=float, default=2, help="seconds values are kept")
+    parser.add_argument("--redis-url", help="defaults to a local fake server")
+    args = parser.parse_args()
+
+    server = None
+    redis_url = args.redis_url
+    if redis_url is None:
+        server, redis_url = start_fake_redis()
+    try:
+        run(args, redis_url)
+    finally:
+        if server is not None:
+            server.terminate()
+
+
+def run(args: argparse.Namespace, redis_url: str) -> None:
+    """Measure each backend and print the results"""
+
+    shared_path = os.path.join(tempfile.mkdtemp(), "response-cache")
+
+    print(f"value: {len(VALUE)} bytes, workers: {args.workers}, ttl: {args.ttl} s")
+    for name in BACKENDS:
+        backend = make_backend(name, shared_path, redis_url)
+        backend.clear()
+        stored, hit = time_operations(backend, args.operations)
+        delays = measure_propagation(
+            name, shared_path, redis_url, args.workers, args.ttl
+        )
+
+        print(f"{name}:")
+        print(f"  store:                 {stored * 1e6:9.1f} us")
+        print(f"  hit:                   {hit * 1e6:9.1f} us")
+        print(
+            f"  invalidation seen in:  {statistics.median(delays) * 1e3:9.1f} ms "
+            f"median, {max(delays) * 1e3:.1f} ms max"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Measure how long a fresh interpreter takes to import the app.
+
+Each run starts a new Python process that imports app.main and reports the import
+time, so nothing is shared between runs. Engines are created on first use, so no
+database driver or pool is set up during the import. Run from the repository root:
+
+    python -m benchmarks.cold_start_benchmark [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+IMPORT_APP = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "import app.main\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+
+def measure_import() -> float:
+    """Import the app in a new process, return the import time in seconds"""
+
+    environment = {
+        "DB_CONNECTION_STRING": "sqlite:///benchmark",
+        "SECRET_KEY": "benchmark",
+        "ALGORITHM": "HS256",
+        **os.environ,
+    }
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_APP],
+        capture_output=True,
+        check=True,
+        env=environment,
+        text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main(runs: int) -> None:
+    """Run the benchmark and print the results"""
+
+    times = [measure_import() for _ in range(runs)]
+
+    print(f"import app.main, {runs} runs")
+    print(f"  median: {statistics.median(times) * 1e3:8.1f} ms")
+    print(f"  min:    {min(times) * 1e3:8.1f} ms")
+    print(f"  max:    {max(times) * 1e3:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,109 @@
+"""Check how many concurrent requests the app serves and how many threads it uses.
+
+Runs the app in-process against a temporary SQLite database, sends a number of
+concurrent GET /photo/{id} requests and reports the throughput, latency and the
+peak number of threads. Routes on the async session answer from the event loop,
+so the thread count should stay flat however many requests are in flight.
+Run from the repository root:
+
+    python -m benchmarks.concurrency_benchmark [concurrent_requests]
+"""
+
+import asyncio
+from datetime import datetime
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+DATA_DIRECTORY = tempfile.mkdtemp()
+os.environ["DB_CONNECTION_STRING"] = f"sqlite:///{DATA_DIRECTORY}"
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx  # noqa: E402
+
+from app.infrastructure.database import Base, databases  # noqa: E402
+from app.infrastructure.db_pool import get_pool_stats  # noqa: E402
+from app.infrastructure.models import main_models as models  # noqa: E402
+from app.main import app  # noqa: E402
+
+PHOTO_COUNT = 100
+
+
+def seed() -> None:
+    """Create the schema and some Photos"""
+
+    Base.metadata.create_all(databases.get_engine("main"))
+
+    db = databases.get_sessionmaker("main")()
+    now = datetime.now()
+    db.add_all(
+        models.PhotoModel(filename=f"{i}.jpg", created_at=now, updated_at=now)
+        for i in range(PHOTO_COUNT)
+    )
+    db.commit()
+    db.close()
+
+
+async def watch_threads(stop: asyncio.Event) -> int:
+    """Sample the number of threads until stopped, return the peak"""
+
+    peak = threading.active_count()
+    while not stop.is_set():
+        peak = max(peak, threading.active_count())
+        await asyncio.sleep(0.001)
+    return peak
+
+
+async def fetch(client: httpx.AsyncClient, photo_id: int) -> float:
+    """Get a Photo, return the latency in seconds"""
+
+    start = time.perf_counter()
+    response = await client.get(f"/photo/{photo_id}")
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run(concurrent_requests: int) -> dict:
+    """Send the requests all at once and wait for every response"""
+
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=None)
+
+    async with httpx.AsyncClient(
+        app=app, base_url="http://benchmark", limits=limits
+    ) as client:
+        watcher = asyncio.create_task(watch_threads(stop))
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(
+            *(fetch(client, i % PHOTO_COUNT + 1) for i in range(concurrent_requests))
+        )
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        peak_threads = await watcher
+
+    return {"latencies": latencies, "elapsed": elapsed, "peak_threads": peak_threads}
+
+
+def main(concurrent_requests: int) -> None:
+    """Run the benchmark and print the results"""
+
+    seed()
+    results = asyncio.run(run(concurrent_requests))
+    latencies = results["latencies"]
+
+    print(f"concurrent requests: {concurrent_requests}")
+    print(f"  throughput:   {len(latencies) / results['elapsed']:8.0f} requests/s")
+    print(f"  p50 latency:  {statistics.median(latencies) * 1e3:8.2f} ms")
+    print(f"  max latency:  {max(latencies) * 1e3:8.2f} ms")
+    print(f"  peak threads: {results['peak_threads']:8}")
+    print(f"  pool:         {get_pool_stats()['main_async']}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
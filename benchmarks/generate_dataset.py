@@ -0,0 +1,388 @@
+"""Fill the databases with a synthetic dataset, to load test at production scale.
+
+Adds Photos, Albums, Users, Roles, Projects and FAQs to the databases configured by
+DB_CONNECTION_STRING, alongside any rows already there. Album sizes follow a power
+law, so a few Albums hold most of the Photos, and Users hold several Roles each.
+Every Photo gets a placeholder image file in PHOTO_DIRECTORY, hard linked to one
+file per image size, so a million Photos take almost no disk space.
+
+Rows are written with bulk inserts in batches. Every User's password is
+"password". Run from the repository root:
+
+    python -m benchmarks.generate_dataset [--photos 1000000] [--create-schema]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import io
+import os
+import random
+import shutil
+import time
+from typing import Iterable, Iterator
+
+from dotenv import load_dotenv
+
+# Load env variables before any module reads its settings from them
+load_dotenv()
+
+from PIL import Image  # noqa: E402
+from sqlalchemy import Table, func, inspect, select  # noqa: E402
+from sqlalchemy.engine import Connection  # noqa: E402
+
+from app.infrastructure import migrations  # noqa: E402
+from app.infrastructure.database import Base, databases  # noqa: E402
+from app.infrastructure.image_index import PHOTO_DIRECTORY  # noqa: E402
+from app.infrastructure.models import main_models as models  # noqa: E402
+from app.infrastructure.models import wedding_models  # noqa: E402
+from app.services import user_service  # noqa: E402
+
+PASSWORD = "password"
+BATCH_SIZE = 10_000
+
+# (width, height, weight) of the image sizes Photos are drawn from
+IMAGE_SIZES = [
+    (4032, 3024, 45),
+    (3024, 4032, 25),
+    (1920, 1080, 15),
+    (1080, 1920, 10),
+    (2048, 2048, 5),
+]
+# (format, extension, weight) of the Photos' file formats. The format is stored
+# lowercase, as the app stores the format it reads from an image's header
+IMAGE_FORMATS = [("jpeg", "jpg", 80), ("png", "png", 10), ("webp", "webp", 10)]
+
+# Album sizes are drawn from a Pareto distribution with this shape, and at least
+# ALBUM_MIN_PHOTOS. A smaller shape gives a longer tail of huge Albums.
+ALBUM_SIZE_SHAPE = 1.2
+ALBUM_MIN_PHOTOS = 3
+# (roles, weight) of how many Roles a User holds
+ROLES_PER_USER = [(1, 35), (2, 30), (3, 20), (4, 10), (5, 5)]
+ADMIN_FRACTION = 0.01
+ANSWERED_FAQ_FRACTION = 0.7
+
+
+def batched(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    """Split rows into lists of up to size rows"""
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def next_id(connection: Connection, column) -> int:
+    """Get the ID after the highest in a table, so new rows follow existing ones"""
+
+    return (connection.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def bulk_insert(connection: Connection, table: Table, rows: Iterable[dict]) -> int:
+    """Insert rows into a table in batches, return how many were inserted"""
+
+    count = 0
+    for batch in batched(rows, BATCH_SIZE):
+        connection.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+
+def write_placeholders(
+    photos: list[tuple[str, tuple[int, int], str]], directory: str
+) -> None:
+    """Write a placeholder image for every Photo. One image of each size and format
+    is written, and the Photos' files are hard links to it where possible.
+
+    Args:
+        photos (list[tuple[str, tuple[int, int], str]]): The filename, size and
+            format of each Photo
+        directory (str): Directory to write the images in
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    placeholder_directory = os.path.join(directory, ".placeholders")
+    os.makedirs(placeholder_directory, exist_ok=True)
+
+    placeholders = {}
+    for filename, size, image_format in photos:
+        key = (size, image_format)
+        if key not in placeholders:
+            buffer = io.BytesIO()
+            Image.new("RGB", size, (120, 120, 120)).save(buffer, image_format)
+            placeholders[key] = os.path.join(
+                placeholder_directory,
+                f"{size[0]}x{size[1]}.{image_format}",
+            )
+            with open(placeholders[key], "wb") as file:
+                file.write(buffer.getvalue())
+
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            continue
+        try:
+            os.link(placeholders[key], path)
+        except OSError:
+            # The placeholder has as many links as the filesystem allows, or it
+            # can't hard link at all, so copy it and link the next Photos to the copy
+            shutil.copyfile(placeholders[key], path)
+            placeholders[key] = path
+
+
+def generate_main(connection: Connection, args: argparse.Namespace) -> dict:
+    """Add the main database's rows, return how many of each were added"""
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    counts = {}
+
+    # Photos
+    first_photo = next_id(connection, models.PhotoModel.id)
+    photo_ids = range(first_photo, first_photo + args.photos)
+    sizes = rng.choices(
+        [size[:2] for size in IMAGE_SIZES],
+        [size[2] for size in IMAGE_SIZES],
+        k=args.photos,
+    )
+    formats = rng.choices(
+        [image_format[:2] for image_format in IMAGE_FORMATS],
+        [image_format[2] for image_format in IMAGE_FORMATS],
+        k=args.photos,
+    )
+    photos = [
+        (f"synthetic-{photo_id:08d}.{extension}", size, image_format)
+        for photo_id, size, (image_format, extension) in zip(photo_ids, sizes, formats)
+    ]
+
+    def photo_rows() -> Iterator[dict]:
+        for photo_id, (filename, (width, height), image_format) in zip(
+            photo_ids, photos
+        ):
+            uploaded = now - timedelta(days=rng.randrange(5 * 365))
+            yield {
+                "id": photo_id,
+                "filename": filename,
+                "title": f"Photo {photo_id}" if rng.random() < 0.6 else None,
+                "description": None,
+                "width": width,
+                "height": height,
+                "format": image_format,
+                "upload_date": uploaded.date(),
+                "created_at": uploaded,
+                "updated_at": uploaded,
+            }
+
+    counts["photos"] = bulk_insert(
+        connection, models.PhotoModel.__table__, photo_rows()
+    )
+
+    # Albums, with a power law number of Photos each
+    first_album = next_id(connection, models.AlbumModel.id)
+    album_photos = [
+        rng.sample(
+            photo_ids,
+            min(
+                args.photos,
+                int(ALBUM_MIN_PHOTOS * rng.paretovariate(ALBUM_SIZE_SHAPE)),
+            ),
+        )
+        for _ in range(args.albums)
+    ]
+    counts["albums"] = bulk_insert(
+        connection,
+        models.AlbumModel.__table__,
+        (
+            {
+                "id": album_id,
+                "title": f"Synthetic album {album_id}",
+                "description": None,
+                "cover_photo_id": members[0] if members else None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for album_id, members in enumerate(album_photos, first_album)
+        ),
+    )
+    counts["album photos"] = bulk_insert(
+        connection,
+        models.album_photo,
+        (
+            {"album_id": album_id, "photo_id": photo_id}
+            for album_id, members in enumerate(album_photos, first_album)
+            for photo_id in members
+        ),
+    )
+
+    # Roles, and Users holding several of them
+    first_role = next_id(connection, models.RoleModel.role_id)
+    role_ids = range(first_role, first_role + args.roles)
+    counts["roles"] = bulk_insert(
+        connection,
+        models.RoleModel.__table__,
+        (
+            {
+                "id": role_id,
+                "roleKey": f"SYNTHETIC_ROLE_{role_id}",
+                "roleName": f"Synthetic Role {role_id}",
+                "created_at": now.date(),
+            }
+            for role_id in role_ids
+        ),
+    )
+
+    first_user = next_id(connection, models.UserModel.user_id)
+    user_ids = range(first_user, first_user + args.users)
+    password_hash = user_service.hash_password(PASSWORD)
+    counts["users"] = bulk_insert(
+        connection,
+        models.UserModel.__table__,
+        (
+            {
+                "id": user_id,
+                "username": f"synthetic-user-{user_id}",
+                "email": f"synthetic-user-{user_id}@example.com",
+                "firstname": "Synthetic",
+                "lastname": f"User {user_id}",
+                "preferredname": None,
+                "passwordhash": password_hash,
+                "isAdmin": rng.random() < ADMIN_FRACTION,
+                "tokenVersion": 0,
+                "created_at": now.date(),
+                "updated_at": now.date(),
+            }
+            for user_id in user_ids
+        ),
+    )
+
+    role_counts = rng.choices(
+        [count for count, _ in ROLES_PER_USER],
+        [weight for _, weight in ROLES_PER_USER],
+        k=args.users,
+    )
+    counts["user roles"] = (
+        bulk_insert(
+            connection,
+            models.user_role,
+            (
+                {"userId": user_id, "roleId": role_id}
+                for user_id, role_count in zip(user_ids, role_counts)
+                for role_id in rng.sample(role_ids, min(role_count, args.roles))
+            ),
+        )
+        if args.roles
+        else 0
+    )
+
+    # Projects
+    first_project = next_id(connection, models.ProjectModel.project_id)
+    counts["projects"] = bulk_insert(
+        connection,
+        models.ProjectModel.__table__,
+        (
+            {
+                "ProjectID": project_id,
+                "ProjectKey": f"synthetic-project-{project_id}",
+                "Title": f"Synthetic Project {project_id}",
+                "ImageSrc": photos[project_id % len(photos)][0] if photos else "",
+                "SourceUri": f"https://example.com/projects/{project_id}/source",
+                "Description": f"A synthetic project, number {project_id}",
+                "Uri": f"https://example.com/projects/{project_id}",
+            }
+            for project_id in range(first_project, first_project + args.projects)
+        ),
+    )
+
+    if args.images:
+        write_placeholders(photos, PHOTO_DIRECTORY)
+
+    return counts
+
+
+def generate_wedding(connection: Connection, args: argparse.Namespace) -> dict:
+    """Add the wedding database's rows, return how many of each were added"""
+
+    rng = random.Random(args.seed)
+    first_faq = next_id(connection, wedding_models.FaqModel.id)
+
+    def faq_rows() -> Iterator[dict]:
+        for faq_id in range(first_faq, first_faq + args.faqs):
+            answered = rng.random() < ANSWERED_FAQ_FRACTION
+            yield {
+                "id": faq_id,
+                "question": f"Synthetic question {faq_id}?",
+                "asker": f"Guest {rng.randrange(1, 200)}",
+                "answer": f"Synthetic answer {faq_id}" if answered else None,
+                "answerer": "Host" if answered else None,
+            }
+
+    return {
+        "faqs": bulk_insert(connection, wedding_models.FaqModel.__table__, faq_rows())
+    }
+
+
+def main() -> None:
+    """Generate the dataset and print how many rows were added"""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=100_000)
+    parser.add_argument("--albums", type=int, help="defaults to one per 50 Photos")
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--roles", type=int, default=20)
+    parser.add_argument("--projects", type=int, default=100)
+    parser.add_argument("--faqs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-images",
+        dest="images",
+        action="store_false",
+        help="don't write placeholder image files",
+    )
+    parser.add_argument(
+        "--create-schema",
+        action="store_true",
+        help="create missing tables first, and stamp an empty database's migrations",
+    )
+    args = parser.parse_args()
+    if args.albums is None:
+        args.albums = max(args.photos // 50, 1)
+
+    faq_table = wedding_models.FaqModel.__table__
+    main_engine = databases.get_engine("main")
+    wedding_engine = databases.get_engine("wedding")
+
+    if args.create_schema:
+        for database, engine, tables in (
+            (
+                "main",
+                main_engine,
+                [
+                    table
+                    for table in Base.metadata.sorted_tables
+                    if table is not faq_table
+                ],
+            ),
+            ("wedding", wedding_engine, [faq_table]),
+        ):
+            is_empty = not inspect(engine).get_table_names()
+            Base.metadata.create_all(engine, tables=tables)
+            # Tables created from the models already have every migration's changes
+            if is_empty:
+                migrations.stamp(engine, database)
+
+    start = time.perf_counter()
+    with main_engine.begin() as connection:
+        counts = generate_main(connection, args)
+    with wedding_engine.begin() as connection:
+        counts.update(generate_wedding(connection, args))
+    elapsed = time.perf_counter() - start
+
+    for name, count in counts.items():
+        print(f"{name:>14}: {count}")
+    print(f"generated in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare reading image dimensions from the header against a full decode.
+
+Run from the repository root:
+
+    python -m benchmarks.image_header_benchmark [width] [height] [repeats]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from app.services.image_metadata import read_image_header
+
+
+def full_decode(path: str) -> tuple[int, int]:
+    """Decode the whole image, return its dimensions"""
+
+    with Image.open(path) as image:
+        image.load()
+        return image.size
+
+
+def time_calls(function, path: str, repeats: int) -> float:
+    """Time calling function on path, return the average seconds per call"""
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(path)
+    return (time.perf_counter() - start) / repeats
+
+
+def bytes_read_by_header(path: str) -> int | None:
+    """Count the bytes read_image_header reads from disk, None if the platform
+    doesn't report per-process reads"""
+
+    if not os.path.exists("/proc/self/io"):
+        return None
+
+    def read_chars() -> int:
+        with open("/proc/self/io") as io_stats:
+            return next(
+                int(line.split()[1]) for line in io_stats if line.startswith("rchar")
+            )
+
+    # Reading /proc/self/io counts towards rchar too, so measure it on its own first
+    overhead = -(read_chars() - read_chars())
+    before = read_chars()
+    read_image_header(path)
+    return read_chars() - before - overhead
+
+
+def main(width: int, height: int, repeats: int) -> None:
+    """Run the benchmark and print the results"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "large.jpg")
+        Image.effect_noise((width, height), 64).convert("RGB").save(
+            path, quality=95, exif=Image.Exif()
+        )
+        size = os.path.getsize(path)
+
+        header_seconds = time_calls(read_image_header, path, repeats)
+        decode_seconds = time_calls(full_decode, path, max(1, repeats // 100))
+        header_bytes = bytes_read_by_header(path)
+
+    print(f"image: {width}x{height} JPEG, {size / 1e6:.1f} MB")
+    print(f"header read:  {header_seconds * 1e6:12.1f} us, {header_bytes} bytes read")
+    print(f"full decode:  {decode_seconds * 1e6:12.1f} us, {size} bytes read")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 8000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 6000,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 1000,
+    )
@@ -0,0 +1,63 @@
+"""Compare the in-memory image index against a stat per lookup.
+
+Run from the repository root:
+
+    python -m benchmarks.image_index_benchmark [file_count] [lookups]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.infrastructure.image_index import ImageIndex
+
+
+def populate(directory: str, file_count: int) -> list[str]:
+    """Create empty image files in a directory, return their filenames"""
+
+    filenames = [f"img-{i:07d}.webp" for i in range(file_count)]
+    for filename in filenames:
+        open(os.path.join(directory, filename), "wb").close()
+    return filenames
+
+
+def time_lookups(check, filenames: list[str]) -> float:
+    """Time checking every filename, return the seconds taken"""
+
+    start = time.perf_counter()
+    for filename in filenames:
+        check(filename)
+    return time.perf_counter() - start
+
+
+def main(file_count: int, lookups: int) -> None:
+    """Run the benchmark and print the results"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = populate(directory, file_count)
+        step = max(1, file_count // lookups)
+        sample = filenames[::step][:lookups]
+
+        stat_seconds = time_lookups(
+            lambda filename: Path(f"{directory}/{filename}").is_file(), sample
+        )
+
+        index = ImageIndex(directory, refresh_seconds=60)
+        start = time.perf_counter()
+        index.refresh()
+        scan_seconds = time.perf_counter() - start
+        index_seconds = time_lookups(index.contains, sample)
+
+    print(f"files: {file_count}, lookups: {len(sample)}")
+    print(f"stat per lookup:  {stat_seconds / len(sample) * 1e6:10.2f} us/lookup")
+    print(f"index lookup:     {index_seconds / len(sample) * 1e6:10.2f} us/lookup")
+    print(f"index full scan:  {scan_seconds * 1e3:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+    )
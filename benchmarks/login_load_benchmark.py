@@ -0,0 +1,138 @@
+"""Check that hammering POST /token doesn't slow down other requests.
+
+Runs the app in-process against a temporary SQLite database and measures the
+latency of GET /health and GET /photo, first on their own and then while logins
+run concurrently. Run from the repository root:
+
+    python -m benchmarks.login_load_benchmark [seconds] [concurrent_logins]
+"""
+
+import asyncio
+from datetime import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DATA_DIRECTORY = tempfile.mkdtemp()
+os.environ["DB_CONNECTION_STRING"] = f"sqlite:///{DATA_DIRECTORY}"
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx  # noqa: E402
+
+from app.infrastructure.database import Base, databases  # noqa: E402
+from app.infrastructure.models import main_models as models  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import user_service  # noqa: E402
+
+USERNAME = "benchmark"
+PASSWORD = "benchmark-password"
+
+
+def seed() -> None:
+    """Create the schema, a user to log in as and some Photos"""
+
+    Base.metadata.create_all(databases.get_engine("main"))
+
+    db = databases.get_sessionmaker("main")()
+    db.add(
+        models.UserModel(
+            username=USERNAME,
+            email="benchmark@example.com",
+            first_name="Bench",
+            last_name="Mark",
+            password_hash=user_service.hash_password(PASSWORD),
+            is_admin=False,
+        )
+    )
+    now = datetime.now()
+    db.add_all(
+        models.PhotoModel(filename=f"{i}.jpg", created_at=now, updated_at=now)
+        for i in range(100)
+    )
+    db.commit()
+    db.close()
+
+
+async def probe(client: httpx.AsyncClient, url: str, stop: asyncio.Event) -> list:
+    """Request url back to back until stopped, return each latency in seconds"""
+
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latencies
+
+
+async def login(client: httpx.AsyncClient, stop: asyncio.Event) -> int:
+    """Log in back to back until stopped, return the number of logins"""
+
+    count = 0
+    while not stop.is_set():
+        response = await client.post(
+            "/token", data={"username": USERNAME, "password": PASSWORD}
+        )
+        response.raise_for_status()
+        count += 1
+    return count
+
+
+async def run(seconds: float, concurrent_logins: int) -> dict:
+    """Probe the read routes for a number of seconds, with concurrent logins"""
+
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        probes = [
+            asyncio.create_task(probe(client, url, stop))
+            for url in ("/health", "/photo")
+        ]
+        logins = [
+            asyncio.create_task(login(client, stop)) for _ in range(concurrent_logins)
+        ]
+
+        await asyncio.sleep(seconds)
+        stop.set()
+
+        latencies = await asyncio.gather(*probes)
+        login_count = sum(await asyncio.gather(*logins))
+
+    return {
+        "/health": latencies[0],
+        "/photo": latencies[1],
+        "logins": login_count,
+    }
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Get a percentile of a list of values"""
+
+    return statistics.quantiles(values, n=100)[int(fraction * 100) - 1]
+
+
+def main(seconds: float, concurrent_logins: int) -> None:
+    """Run the benchmark and print the results"""
+
+    seed()
+
+    for logins in (0, concurrent_logins):
+        results = asyncio.run(run(seconds, logins))
+        print(f"concurrent logins: {logins}, logins completed: {results['logins']}")
+        for url in ("/health", "/photo"):
+            values = results[url]
+            print(
+                f"  {url:8} requests: {len(values):6}"
+                f"  p50: {percentile(values, 0.5) * 1e3:8.2f} ms"
+                f"  p99: {percentile(values, 0.99) * 1e3:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+    )
@@ -0,0 +1,126 @@
+"""Compare lookup latency before and after the lookup index migration.
+
+Builds a temporary SQLite database with the schema as it was before
+m0002_main_lookup_indexes, fills it with Photos, Albums and Album memberships,
+then times lookups by Photo filename, by Album title and of an Album's Photos.
+The migration is applied and the same lookups are timed again. Run from the
+repository root:
+
+    python -m benchmarks.lookup_index_benchmark [rows] [lookups]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable
+
+DATA_DIRECTORY = tempfile.mkdtemp()
+os.environ["DB_CONNECTION_STRING"] = f"sqlite:///{DATA_DIRECTORY}"
+
+from sqlalchemy import Column, MetaData, Table  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.infrastructure.database import Base, databases  # noqa: E402
+from app.infrastructure.migrations import m0002_main_lookup_indexes  # noqa: E402
+from app.infrastructure.models import main_models as models  # noqa: E402
+from app.services import photo_service  # noqa: E402
+
+# Photos per Album
+ALBUM_SIZE = 10
+
+
+def create_legacy_schema() -> None:
+    """Create the main tables without the lookup indexes or join table keys"""
+
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        is_join_table = table.name in ("UserRole", "AlbumPhoto")
+        Table(
+            table.name,
+            metadata,
+            *(
+                Column(
+                    column.name,
+                    column.type,
+                    primary_key=column.primary_key and not is_join_table,
+                    nullable=column.nullable or is_join_table,
+                )
+                for column in table.columns
+            ),
+        )
+
+    metadata.create_all(databases.get_engine("main"))
+
+
+def seed(rows: int) -> None:
+    """Add rows Photos and Album memberships, and an Album per ALBUM_SIZE Photos"""
+
+    with databases.get_engine("main").begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO Photo (id, filename) VALUES (?, ?)",
+            [(i, f"photo-{i:07d}.jpg") for i in range(1, rows + 1)],
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO Album (id, title) VALUES (?, ?)",
+            [(i, f"album-{i:07d}") for i in range(1, rows // ALBUM_SIZE + 1)],
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO AlbumPhoto (photo_id, album_id) VALUES (?, ?)",
+            [(i, (i - 1) // ALBUM_SIZE + 1) for i in range(1, rows + 1)],
+        )
+
+
+def time_lookups(lookup: Callable[[Session, int], object], keys: list[int]) -> float:
+    """Time a lookup of every key in a fresh session, return seconds per lookup"""
+
+    with databases.get_sessionmaker("main")() as db:
+        start = time.perf_counter()
+        for key in keys:
+            lookup(db, key)
+            db.expunge_all()
+        return (time.perf_counter() - start) / len(keys)
+
+
+LOOKUPS = {
+    "Photo by filename": lambda db, i: photo_service.get_photo_by_filename(
+        db, f"photo-{i:07d}.jpg"
+    ),
+    "Album by title": lambda db, i: photo_service.get_album_by_title(
+        db, f"album-{i // ALBUM_SIZE + 1:07d}"
+    ),
+    "Photos of Album": lambda db, i: db.query(models.album_photo.c.photo_id)
+    .filter(models.album_photo.c.album_id == i // ALBUM_SIZE + 1)
+    .all(),
+}
+
+
+def main(rows: int, lookups: int) -> None:
+    """Run the benchmark and print the results"""
+
+    create_legacy_schema()
+    seed(rows)
+
+    keys = random.Random(0).sample(range(1, rows - ALBUM_SIZE), lookups)
+    before = {name: time_lookups(lookup, keys) for name, lookup in LOOKUPS.items()}
+
+    start = time.perf_counter()
+    with databases.get_engine("main").begin() as connection:
+        m0002_main_lookup_indexes.upgrade(connection)
+    migration_seconds = time.perf_counter() - start
+
+    after = {name: time_lookups(lookup, keys) for name, lookup in LOOKUPS.items()}
+
+    print(f"rows: {rows}, lookups: {lookups}")
+    print(f"  {'':20} {'before':>12} {'after':>12}")
+    for name in LOOKUPS:
+        print(f"  {name:20} {before[name] * 1e3:9.3f} ms {after[name] * 1e3:9.3f} ms")
+    print(f"  migration took {migration_seconds:.1f} s")
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+    )
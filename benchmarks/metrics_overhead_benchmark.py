@@ -0,0 +1,68 @@
+"""Measure how much RequestMetricsMiddleware adds to each request.
+
+Calls a minimal ASGI app directly, then wrapped in the middleware, and reports the
+difference per request. Set PROMETHEUS_MULTIPROC_DIR to an empty directory to
+measure the multiprocess mode, where every update is written to a file.
+Run from the repository root:
+
+    python -m benchmarks.metrics_overhead_benchmark [requests]
+"""
+
+import asyncio
+import sys
+import time
+
+from starlette.routing import Route
+
+from app.infrastructure.metrics import RequestMetricsMiddleware
+
+ROUTE = Route("/photo/{photo_id}", lambda request: None)
+
+
+async def minimal_app(scope, receive, send) -> None:
+    """Set the route like the router does, and send an empty response"""
+
+    scope["route"] = ROUTE
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def receive() -> dict:
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message: dict) -> None:
+    pass
+
+
+async def time_requests(app, requests: int) -> float:
+    """Send requests to an app one at a time, return the seconds per request"""
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app({"type": "http", "method": "GET", "path": "/photo/1"}, receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+async def run(requests: int) -> tuple[float, float]:
+    """Time the app bare and with the middleware, best of a few rounds each"""
+
+    instrumented = RequestMetricsMiddleware(minimal_app)
+    bare = min([await time_requests(minimal_app, requests) for _ in range(5)])
+    timed = min([await time_requests(instrumented, requests) for _ in range(5)])
+    return bare, timed
+
+
+def main(requests: int) -> None:
+    """Run the benchmark and print the results"""
+
+    bare, timed = asyncio.run(run(requests))
+
+    print(f"requests: {requests}")
+    print(f"  without middleware: {bare * 1e6:8.2f} us/request")
+    print(f"  with middleware:    {timed * 1e6:8.2f} us/request")
+    print(f"  overhead:           {(timed - bare) * 1e6:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
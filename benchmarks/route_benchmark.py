@@ -0,0 +1,639 @@
+"""Benchmark every route of the app against seeded SQLite databases.
+
+Runs the app in-process, with no MySQL and no network. For each data size a fresh
+database is seeded with that many Photos, plus Albums, Projects, FAQs and Users in
+proportion, and every route is requested one request at a time. Reports the
+throughput, p50 and p99 latency, SQL statements per request and error responses
+of each route.
+
+Results are written as JSON, pass a previous result as the baseline to compare
+against it. Run from the repository root:
+
+    python -m benchmarks.route_benchmark [--sizes 100,1000,10000] [--requests 200]
+        [--output results.json] [--baseline baseline.json]
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, NamedTuple
+
+DATA_DIRECTORY = tempfile.mkdtemp()
+PHOTO_DIRECTORY = os.path.join(DATA_DIRECTORY, "images")
+os.makedirs(PHOTO_DIRECTORY)
+os.environ["DB_CONNECTION_STRING"] = f"sqlite:///{DATA_DIRECTORY}"
+os.environ["PHOTO_DIRECTORY"] = PHOTO_DIRECTORY
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx  # noqa: E402
+from PIL import Image  # noqa: E402
+from fastapi.routing import APIRoute  # noqa: E402
+from sqlalchemy import Date, DateTime, create_engine  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+from starlette.routing import Mount  # noqa: E402
+
+from app.infrastructure.database import (  # noqa: E402
+    Base,
+    databases,
+    get_async_connection_string,
+)
+from app.infrastructure.db_pool import get_pool_options  # noqa: E402
+from app.infrastructure.image_index import image_index  # noqa: E402
+from app.infrastructure.models import main_models as models  # noqa: E402
+from app.infrastructure.models import wedding_models  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services import user_service  # noqa: E402
+from app.services.principal_cache import principal_cache  # noqa: E402
+
+USERNAME = "benchmark"
+PASSWORD = "benchmark-password"
+MODIFY_ROLE = "GENERAL_MODIFY"
+# Photos per Album, and Photos per Project, FAQ and User
+ALBUM_SIZE = 10
+# Photos created by each POST /photo/bulk
+BULK_SIZE = 10
+# Photo files on disk for the image routes, the rest only exist in the database
+IMAGE_COUNT = 10
+# A route this much slower than the baseline, and by at least REGRESSION_MIN_MS,
+# is reported as a regression
+REGRESSION_RATIO = 1.2
+REGRESSION_MIN_MS = 1.0
+
+
+class Case(NamedTuple):
+    """How to request one route. request builds the keyword arguments of the
+    i-th request, record keeps what later cases need from its response."""
+
+    method: str
+    path: str
+    request: Callable[[int, dict], dict]
+    record: Callable[[int, httpx.Response, dict], None] | None = None
+    # Routes too slow to request every time, like hashing a password
+    max_requests: int | None = None
+
+
+def record_id(key: str, field: str = "id") -> Callable:
+    """Make a record function that keeps the ID of each created row under key"""
+
+    def record(i: int, response: httpx.Response, state: dict) -> None:
+        if response.is_success:
+            state.setdefault(key, []).append(response.json()[field])
+
+    return record
+
+
+def created(key: str, i: int, state: dict, default: int = 0) -> int:
+    """Get the ID of the i-th row created by an earlier case"""
+
+    ids = state.get(key, [])
+    return ids[i % len(ids)] if ids else default
+
+
+# In the order they run, cases that change data come after the ones reading it,
+# and cases that use rows come after the cases creating them
+CASES = [
+    Case("GET", "/", lambda i, s: {"url": "/"}),
+    Case("GET", "/favicon.ico", lambda i, s: {"url": "/favicon.ico"}),
+    Case("GET", "/health", lambda i, s: {"url": "/health"}),
+    Case("GET", "/metrics", lambda i, s: {"url": "/metrics"}),
+    Case("GET", "/db-pool/stats", lambda i, s: {"url": "/db-pool/stats"}),
+    Case("GET", "/db-queries/stats", lambda i, s: {"url": "/db-queries/stats"}),
+    Case("GET", "/auth-cache/stats", lambda i, s: {"url": "/auth-cache/stats"}),
+    Case("GET", "/image-cache/stats", lambda i, s: {"url": "/image-cache/stats"}),
+    Case("GET", "/response-cache/stats", lambda i, s: {"url": "/response-cache/stats"}),
+    Case("GET", "/single-flight/stats", lambda i, s: {"url": "/single-flight/stats"}),
+    Case(
+        "POST",
+        "/token",
+        lambda i, s: {
+            "url": "/token",
+            "data": {"username": USERNAME, "password": PASSWORD},
+        },
+        max_requests=20,
+    ),
+    Case("GET", "/users/me", lambda i, s: {"url": "/users/me"}),
+    Case("GET", "/roles", lambda i, s: {"url": "/roles"}),
+    Case("GET", "/project", lambda i, s: {"url": "/project"}),
+    Case(
+        "GET",
+        "/project/{project_id}",
+        lambda i, s: {"url": f"/project/{i % s['projects'] + 1}"},
+    ),
+    Case("GET", "/photo", lambda i, s: {"url": "/photo"}),
+    Case(
+        "GET",
+        "/photo?stream=true",
+        lambda i, s: {"url": "/photo", "params": {"stream": "true"}},
+        max_requests=20,
+    ),
+    Case("GET", "/album", lambda i, s: {"url": "/album"}, max_requests=20),
+    Case(
+        "GET",
+        "/photo/{photo_id}",
+        lambda i, s: {"url": f"/photo/{i % s['photos'] + 1}"},
+    ),
+    Case(
+        "GET",
+        "/photo/{photo_id}/thumbnail",
+        lambda i, s: {"url": f"/photo/{i % IMAGE_COUNT + 1}/thumbnail"},
+    ),
+    Case(
+        "GET",
+        "/photo/{photo_id}/image",
+        lambda i, s: {
+            "url": f"/photo/{i % IMAGE_COUNT + 1}/image",
+            "params": {"w": 320},
+        },
+    ),
+    Case(
+        "GET",
+        "/photo/filename/{photo_filename}",
+        lambda i, s: {"url": f"/photo/filename/photo-{i % s['photos']:07d}.jpg"},
+    ),
+    Case(
+        "GET",
+        "/album/title/{album_title}",
+        lambda i, s: {"url": f"/album/title/album-{i % s['albums']:07d}"},
+    ),
+    Case(
+        "GET",
+        "/album/{album_id}/photos",
+        lambda i, s: {"url": f"/album/{i % s['albums'] + 1}/photos"},
+    ),
+    Case(
+        "GET",
+        "/album/{album_id}",
+        lambda i, s: {"url": f"/album/{i % s['albums'] + 1}"},
+    ),
+    Case("GET", "/wedding/faq", lambda i, s: {"url": "/wedding/faq"}),
+    Case(
+        "GET",
+        "/wedding/faq/{faq_id}",
+        lambda i, s: {"url": f"/wedding/faq/{i % s['faqs'] + 1}"},
+    ),
+    Case(
+        "POST",
+        "/users",
+        lambda i, s: {
+            "url": "/users",
+            "json": {
+                "username": f"newuser{i}",
+                "email": f"newuser{i}@example.com",
+                "first_name": "New",
+                "last_name": "User",
+                "password": PASSWORD,
+            },
+        },
+        max_requests=20,
+    ),
+    Case(
+        "POST",
+        "/roles",
+        lambda i, s: {
+            "url": "/roles",
+            "json": {"role_key": f"ROLE_{i}", "role_name": f"Role {i}"},
+        },
+    ),
+    Case(
+        "POST",
+        "/users/addRole/{user_id}",
+        lambda i, s: {
+            "url": f"/users/addRole/{i + 2}",
+            "params": {"role_key": MODIFY_ROLE},
+        },
+    ),
+    Case(
+        "DELETE",
+        "/users/removeRole/{user_id}",
+        lambda i, s: {
+            "url": f"/users/removeRole/{i + 2}",
+            "params": {"role_key": MODIFY_ROLE},
+        },
+    ),
+    Case(
+        "POST",
+        "/project",
+        lambda i, s: {
+            "url": "/project",
+            "json": {
+                "project_key": f"new-project-{i}",
+                "title": f"New Project {i}",
+                "image_src": "project.jpg",
+                "source_uri": "https://example.com/source",
+                "description": "A project created by the benchmark",
+            },
+        },
+        record=record_id("created_projects", "projectId"),
+    ),
+    Case(
+        "PUT",
+        "/project/{project_id}",
+        lambda i, s: {
+            "url": f"/project/{i % s['projects'] + 1}",
+            "json": {"description": f"Updated {i}"},
+        },
+    ),
+    Case(
+        "DELETE",
+        "/project/{project_id}",
+        lambda i, s: {"url": f"/project/{created('created_projects', i, s)}"},
+    ),
+    Case(
+        "POST",
+        "/photo",
+        lambda i, s: {"url": "/photo", "json": {"filename": f"new-{i:07d}.jpg"}},
+    ),
+    Case(
+        "POST",
+        "/photo/bulk",
+        lambda i, s: {
+            "url": "/photo/bulk",
+            "json": [{"filename": f"bulk-{i:07d}-{j}.jpg"} for j in range(BULK_SIZE)],
+        },
+    ),
+    Case(
+        "PUT",
+        "/photo/{photo_id}",
+        lambda i, s: {
+            "url": f"/photo/{i % s['photos'] + 1}",
+            "json": {"description": f"Updated {i}"},
+        },
+    ),
+    Case(
+        "POST",
+        "/album",
+        lambda i, s: {"url": "/album", "json": {"title": f"new-album-{i}"}},
+        record=record_id("created_albums"),
+    ),
+    Case(
+        "POST",
+        "/album/addphotos/{album_id}",
+        lambda i, s: {
+            "url": f"/album/addphotos/{created('created_albums', i, s)}",
+            "json": list(range(1, ALBUM_SIZE + 1)),
+        },
+    ),
+    Case(
+        "PUT",
+        "/album/{album_id}",
+        lambda i, s: {
+            "url": f"/album/{created('created_albums', i, s)}",
+            "json": {"title": f"renamed-album-{i}"},
+        },
+    ),
+    Case(
+        "POST",
+        "/wedding/faq",
+        lambda i, s: {
+            "url": "/wedding/faq",
+            "json": {"question": f"New question {i}?", "asker": "Benchmark"},
+        },
+        record=record_id("created_faqs"),
+    ),
+    Case(
+        "PUT",
+        "/wedding/faq/{faq_id}",
+        lambda i, s: {
+            "url": f"/wedding/faq/{i % s['faqs'] + 1}",
+            "json": {"answer": f"Answer {i}"},
+        },
+    ),
+    Case(
+        "DELETE",
+        "/wedding/faq/{faq_id}",
+        lambda i, s: {"url": f"/wedding/faq/{created('created_faqs', i, s)}"},
+    ),
+]
+
+
+def get_routes(routes: list, prefix: str = "") -> set[tuple[str, str]]:
+    """Get the (method, path) of every route of the app, including mounted apps"""
+
+    found = set()
+    for route in routes:
+        if isinstance(route, APIRoute):
+            found |= {(method, prefix + route.path) for method in route.methods}
+        elif isinstance(route, Mount) and hasattr(route.app, "routes"):
+            found |= get_routes(route.app.routes, prefix + route.path)
+    return found
+
+
+def check_coverage() -> None:
+    """Fail if a route of the app has no case, so new routes get benchmarked"""
+
+    covered = {(case.method, case.path.split("?")[0]) for case in CASES}
+    missing = get_routes(app.routes) - covered
+    if missing:
+        raise SystemExit(f"Routes without a benchmark case: {sorted(missing)}")
+
+
+def write_images(requests: int) -> None:
+    """Write the Photo files the image routes and the Photo creating routes need"""
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (1600, 1200), (90, 140, 200)).save(buffer, "JPEG")
+    image = buffer.getvalue()
+
+    filenames = [f"photo-{i:07d}.jpg" for i in range(IMAGE_COUNT)]
+    filenames += [f"new-{i:07d}.jpg" for i in range(requests)]
+    filenames += [
+        f"bulk-{i:07d}-{j}.jpg" for i in range(requests) for j in range(BULK_SIZE)
+    ]
+    for filename in filenames:
+        with open(os.path.join(PHOTO_DIRECTORY, filename), "wb") as file:
+            file.write(image)
+
+    image_index.refresh()
+
+
+def bind_databases(size: int) -> None:
+    """Point the app at a fresh pair of SQLite databases for a data size"""
+
+    for database in ("main", "wedding"):
+        url = f"sqlite:///{DATA_DIRECTORY}/{database}-{size}"
+        databases.bind(
+            database,
+            create_engine(url, **get_pool_options(database)),
+            create_async_engine(
+                get_async_connection_string(url),
+                **get_pool_options(database, is_async=True),
+            ),
+        )
+
+
+def use_datetime_columns() -> None:
+    """Store the Date columns as DateTime. SQLite reads a Date column back as a
+    date, which the entities' datetime fields reject, so the routes creating
+    Photos would only return errors."""
+
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, Date):
+                column.type = DateTime()
+
+
+def seed(size: int, requests: int) -> dict:
+    """Create the schema and size Photos, with Albums, Projects, FAQs and Users in
+    proportion. Return how many of each there are, for the cases to request."""
+
+    counts = {
+        "photos": size,
+        "albums": max(size // ALBUM_SIZE, 1),
+        "projects": max(size // ALBUM_SIZE, 1),
+        "faqs": max(size // ALBUM_SIZE, 1),
+        # POST /users/addRole gives each request a User of its own
+        "users": max(size // ALBUM_SIZE, requests) + 1,
+    }
+    now = datetime.now()
+
+    main_engine = databases.get_engine("main")
+    wedding_engine = databases.get_engine("wedding")
+    faq_table = wedding_models.FaqModel.__table__
+    Base.metadata.create_all(
+        main_engine,
+        tables=[
+            table for table in Base.metadata.sorted_tables if table is not faq_table
+        ],
+    )
+    Base.metadata.create_all(wedding_engine, tables=[faq_table])
+
+    with main_engine.begin() as connection:
+        connection.execute(
+            models.RoleModel.__table__.insert(),
+            [{"roleKey": MODIFY_ROLE, "roleName": "General Modify"}],
+        )
+        password_hash = user_service.hash_password(PASSWORD)
+        connection.execute(
+            models.UserModel.__table__.insert(),
+            [
+                {
+                    "username": USERNAME if i == 0 else f"user-{i:07d}",
+                    "email": f"user-{i:07d}@example.com",
+                    "firstname": "Bench",
+                    "lastname": "Mark",
+                    "passwordhash": password_hash,
+                    "isAdmin": i == 0,
+                }
+                for i in range(counts["users"])
+            ],
+        )
+        connection.execute(models.user_role.insert(), [{"userId": 1, "roleId": 1}])
+        connection.execute(
+            models.PhotoModel.__table__.insert(),
+            [
+                {
+                    "filename": f"photo-{i:07d}.jpg",
+                    "title": f"Photo {i}",
+                    "width": 1600,
+                    "height": 1200,
+                    "format": "jpeg",
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for i in range(counts["photos"])
+            ],
+        )
+        connection.execute(
+            models.AlbumModel.__table__.insert(),
+            [
+                {
+                    "title": f"album-{i:07d}",
+                    "cover_photo_id": i * ALBUM_SIZE + 1,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                for i in range(counts["albums"])
+            ],
+        )
+        connection.execute(
+            models.album_photo.insert(),
+            [
+                {"photo_id": i + 1, "album_id": i // ALBUM_SIZE + 1}
+                for i in range(min(counts["photos"], counts["albums"] * ALBUM_SIZE))
+            ],
+        )
+        connection.execute(
+            models.ProjectModel.__table__.insert(),
+            [
+                {
+                    "ProjectKey": f"project-{i:07d}",
+                    "Title": f"Project {i}",
+                    "ImageSrc": "project.jpg",
+                    "SourceUri": "https://example.com/source",
+                    "Description": "A seeded project",
+                }
+                for i in range(counts["projects"])
+            ],
+        )
+
+    with wedding_engine.begin() as connection:
+        connection.execute(
+            wedding_models.FaqModel.__table__.insert(),
+            [
+                {"question": f"Question {i}?", "asker": "Guest"}
+                for i in range(counts["faqs"])
+            ],
+        )
+
+    return counts
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Get the value at a fraction of the way through the sorted values"""
+
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run_case(
+    client: httpx.AsyncClient, case: Case, requests: int, state: dict
+) -> dict:
+    """Request a route one request at a time, return its results"""
+
+    count = min(requests, case.max_requests or requests)
+    latencies = []
+    queries = []
+    errors = 0
+
+    start = time.perf_counter()
+    for i in range(count):
+        request_start = time.perf_counter()
+        response = await client.request(case.method, **case.request(i, state))
+        latencies.append(time.perf_counter() - request_start)
+
+        # Statements run while a body streams are missing from the header
+        queries.append(int(response.headers.get("x-db-query-count", 0)))
+        if response.status_code >= 400:
+            errors += 1
+        if case.record is not None:
+            case.record(i, response, state)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": count,
+        "throughput": count / elapsed,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "queries": statistics.median(queries),
+        "errors": errors,
+    }
+
+
+async def run_size(size: int, requests: int) -> dict:
+    """Seed a database of a size and benchmark every route against it"""
+
+    bind_databases(size)
+    state = seed(size, requests)
+    principal_cache.clear()
+
+    # App errors are answered with a 500 like a server would, and counted
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as client:
+        response = await client.post(
+            "/token", data={"username": USERNAME, "password": PASSWORD}
+        )
+        response.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        results = {}
+        for case in CASES:
+            results[f"{case.method} {case.path}"] = await run_case(
+                client, case, requests, state
+            )
+            # Reads shouldn't be sent to the primary just because of a write
+            client.cookies.clear()
+
+    return results
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    """Get a line for every route whose p50 latency regressed against the baseline"""
+
+    regressions = []
+    for size, routes in results["sizes"].items():
+        for route, result in routes.items():
+            previous = baseline["sizes"].get(size, {}).get(route)
+            if previous is None:
+                continue
+            ratio = result["p50_ms"] / previous["p50_ms"]
+            is_slower = (
+                ratio > REGRESSION_RATIO
+                and result["p50_ms"] - previous["p50_ms"] >= REGRESSION_MIN_MS
+            )
+            if is_slower or result["errors"] > previous["errors"]:
+                regressions.append(
+                    f"  size {size} {route}: p50 {previous['p50_ms']:.2f} -> "
+                    f"{result['p50_ms']:.2f} ms ({ratio:.2f}x), errors "
+                    f"{previous['errors']} -> {result['errors']}"
+                )
+    return regressions
+
+
+def print_results(results: dict) -> None:
+    """Print a table of the results of each size"""
+
+    for size, routes in results["sizes"].items():
+        print(f"size {size}")
+        print(
+            f"  {'route':46} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+            f"{'queries':>8} {'errors':>7}"
+        )
+        for route, result in routes.items():
+            print(
+                f"  {route:46} {result['throughput']:9.0f} {result['p50_ms']:9.2f} "
+                f"{result['p99_ms']:9.2f} {result['queries']:8.0f} "
+                f"{result['errors']:7}"
+            )
+
+
+def main() -> None:
+    """Run the benchmark, print and save the results"""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--output", default="route_benchmark.json")
+    parser.add_argument("--baseline")
+    args = parser.parse_args()
+
+    check_coverage()
+    use_datetime_columns()
+    write_images(args.requests)
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "requests": args.requests,
+        "sizes": {},
+    }
+    for size in map(int, args.sizes.split(",")):
+        results["sizes"][str(size)] = asyncio.run(run_size(size, args.requests))
+
+    print_results(results)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file))
+        print(f"regressions against {args.baseline}: {len(regressions)}")
+        print("\n".join(regressions))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
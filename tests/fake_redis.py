@@ -0,0 +1,299 @@
+"""A minimal in-memory server speaking the Redis protocol, to test and benchmark the
+Redis cache backend without a Redis install.
+
+Supports the commands the backend uses: strings with expiry, sets, INCRBY, DEL,
+SCAN and WATCH/MULTI/EXEC transactions. Everything runs on one event loop, so
+each command is atomic like in Redis. Run from the repository root:
+
+    python tests/fake_redis.py [port]
+
+and set RESPONSE_CACHE_BACKEND=redis RESPONSE_CACHE_REDIS_URL=redis://localhost:<port>/0
+A port of 0 serves on any free port, the URL is printed once the server listens.
+"""
+
+import asyncio
+import fnmatch
+import itertools
+import queue
+import sys
+import threading
+import time
+from typing import Callable
+
+DEFAULT_PORT = 6390
+
+Reply = bytes | int | str | list | None
+
+
+class Error(Exception):
+    """An error reply"""
+
+
+class FakeRedis:
+    """The keyspace, and the commands that act on it"""
+
+    def __init__(self):
+        self.values: dict[bytes, bytes | set[bytes]] = {}
+        self.expires_at: dict[bytes, float] = {}
+        # Bumped whenever a key is written, so WATCH can tell it changed
+        self.versions: dict[bytes, int] = {}
+        self._counter = itertools.count(1)
+
+    def _live(self, key: bytes) -> bytes | set[bytes] | None:
+        expires_at = self.expires_at.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._delete(key)
+        return self.values.get(key)
+
+    def _touch(self, key: bytes) -> None:
+        self.versions[key] = next(self._counter)
+
+    def _delete(self, key: bytes) -> bool:
+        self.expires_at.pop(key, None)
+        if self.values.pop(key, None) is None:
+            return False
+        self._touch(key)
+        return True
+
+    def _set_of(self, key: bytes) -> set[bytes]:
+        value = self._live(key)
+        if value is None:
+            return set()
+        if not isinstance(value, set):
+            raise Error("WRONGTYPE Operation against a key holding the wrong kind")
+        return value
+
+    def version(self, key: bytes) -> int:
+        """Get the version of a key, expiring it first if it's due"""
+
+        self._live(key)
+        return self.versions.get(key, 0)
+
+    def execute(self, name: str, args: list[bytes]) -> Reply:
+        """Run a command, return it's reply"""
+
+        handler = getattr(self, f"command_{name}", None)
+        if handler is None:
+            raise Error(f"ERR unknown command '{name}'")
+        return handler(*args)
+
+    def command_ping(self, *args: bytes) -> Reply:
+        return args[0] if args else "PONG"
+
+    def command_client(self, *args: bytes) -> Reply:
+        return "OK"
+
+    def command_get(self, key: bytes) -> Reply:
+        value = self._live(key)
+        if isinstance(value, set):
+            raise Error("WRONGTYPE Operation against a key holding the wrong kind")
+        return value
+
+    def command_set(self, key: bytes, value: bytes, *options: bytes) -> Reply:
+        self.values[key] = value
+        self.expires_at.pop(key, None)
+
+        options = [option.lower() for option in options]
+        for unit, scale in ((b"px", 1000), (b"ex", 1)):
+            if unit in options:
+                ttl = int(options[options.index(unit) + 1])
+                self.expires_at[key] = time.time() + ttl / scale
+
+        self._touch(key)
+        return "OK"
+
+    def command_incr(self, key: bytes) -> Reply:
+        return self.command_incrby(key, b"1")
+
+    def command_incrby(self, key: bytes, increment: bytes) -> Reply:
+        value = int(self.command_get(key) or 0) + int(increment)
+        self.values[key] = str(value).encode()
+        self._touch(key)
+        return value
+
+    def command_del(self, *keys: bytes) -> Reply:
+        return sum(self._delete(key) for key in keys)
+
+    def command_pexpire(self, key: bytes, milliseconds: bytes) -> Reply:
+        if self._live(key) is None:
+            return 0
+        self.expires_at[key] = time.time() + int(milliseconds) / 1000
+        return 1
+
+    def command_sadd(self, key: bytes, *members: bytes) -> Reply:
+        value = self._set_of(key)
+        added = len(set(members) - value)
+        self.values[key] = value | set(members)
+        self._touch(key)
+        return added
+
+    def command_smembers(self, key: bytes) -> Reply:
+        return sorted(self._set_of(key))
+
+    def command_sunion(self, *keys: bytes) -> Reply:
+        return sorted(set().union(*(self._set_of(key) for key in keys)))
+
+    def command_scan(self, cursor: bytes, *options: bytes) -> Reply:
+        pattern = "*"
+        options = list(options)
+        for i, option in enumerate(options[:-1]):
+            if option.lower() == b"match":
+                pattern = options[i + 1].decode()
+
+        keys = [
+            key
+            for key in list(self.values)
+            if self._live(key) is not None
+            and fnmatch.fnmatchcase(key.decode(), pattern)
+        ]
+        return [b"0", keys]
+
+    def command_flushdb(self, *args: bytes) -> Reply:
+        for key in list(self.values):
+            self._delete(key)
+        return "OK"
+
+
+class Connection:
+    """The transaction state of one client connection"""
+
+    def __init__(self, server: FakeRedis):
+        self.server = server
+        self.watched: dict[bytes, int] = {}
+        self.queued: list[tuple[str, list[bytes]]] | None = None
+
+    def execute(self, name: str, args: list[bytes]) -> Reply:
+        """Run a command, or queue it inside MULTI"""
+
+        if name == "watch":
+            self.watched.update((key, self.server.version(key)) for key in args)
+            return "OK"
+        if name == "unwatch":
+            self.watched.clear()
+            return "OK"
+        if name == "multi":
+            self.queued = []
+            return "OK"
+        if name == "discard":
+            self.queued = None
+            self.watched.clear()
+            return "OK"
+        if name == "exec":
+            return self.exec()
+
+        if self.queued is not None:
+            self.queued.append((name, args))
+            return "QUEUED"
+
+        return self.server.execute(name, args)
+
+    def exec(self) -> Reply:
+        if self.queued is None:
+            raise Error("ERR EXEC without MULTI")
+
+        queued, self.queued = self.queued, None
+        changed = any(
+            self.server.version(key) != version for key, version in self.watched.items()
+        )
+        self.watched.clear()
+        if changed:
+            return None
+
+        replies = []
+        for name, args in queued:
+            try:
+                replies.append(self.server.execute(name, args))
+            except Error as error:
+                replies.append(error)
+        return replies
+
+
+def encode(reply: Reply | Error) -> bytes:
+    """Encode a reply in the Redis protocol"""
+
+    if isinstance(reply, Error):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, str):
+        return b"+" + reply.encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
+
+
+async def read_command(reader: asyncio.StreamReader) -> list[bytes] | None:
+    """Read a command sent as an array of bulk strings, None once the client left"""
+
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()
+
+    args = []
+    for _ in range(int(line[1:])):
+        length = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+async def serve_client(
+    server: FakeRedis, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """Answer one client's commands until it disconnects"""
+
+    connection = Connection(server)
+    try:
+        while (command := await read_command(reader)) is not None:
+            if not command:
+                continue
+            try:
+                reply = connection.execute(command[0].decode().lower(), command[1:])
+            except Error as error:
+                reply = error
+            writer.write(encode(reply))
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(port: int, started: Callable[[int], None] | None = None) -> None:
+    """Serve on localhost until cancelled, calling started with the port once
+    listening"""
+
+    server = FakeRedis()
+    listener = await asyncio.start_server(
+        lambda reader, writer: serve_client(server, reader, writer), "127.0.0.1", port
+    )
+    if started is not None:
+        started(listener.sockets[0].getsockname()[1])
+    async with listener:
+        await listener.serve_forever()
+
+
+def get_url(port: int) -> str:
+    """Get the URL of the server on a port"""
+
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def start_in_thread(port: int = 0) -> str:
+    """Serve in a daemon thread of this process, return the server's URL"""
+
+    ports: queue.Queue[int] = queue.Queue()
+    threading.Thread(
+        target=lambda: asyncio.run(serve(port, ports.put)), daemon=True
+    ).start()
+    return get_url(ports.get())
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PORT
+    asyncio.run(
+        serve(port, lambda port: print(f"serving on {get_url(port)}", flush=True))
+    )
@@ -0,0 +1,122 @@
+"""Tests of the cache backends shared by workers. The Redis backend runs against the
+fake server in fake_redis."""
+
+import time
+from typing import Callable
+import uuid
+
+import pytest
+
+from app.infrastructure.cache_backends import (
+    CacheBackend,
+    RedisBackend,
+    SharedMemoryBackend,
+)
+import fake_redis
+
+MAX_BYTES = 1024 * 1024
+
+
+@pytest.fixture(scope="session")
+def redis_url() -> str:
+    """A fake Redis server for the whole run"""
+
+    return fake_redis.start_in_thread()
+
+
+@pytest.fixture(params=["shared-memory", "redis"])
+def make_backend(request, tmp_path, redis_url: str) -> Callable[[], CacheBackend]:
+    """Create backends sharing the same entries, like two workers do"""
+
+    prefix = f"test-{uuid.uuid4().hex}:"
+
+    def make_backend() -> CacheBackend:
+        if request.param == "shared-memory":
+            return SharedMemoryBackend(str(tmp_path / "response-cache"), MAX_BYTES)
+        return RedisBackend(redis_url, prefix, timeout_seconds=1)
+
+    return make_backend
+
+
+def store(backend: CacheBackend, key: str, *tags: str, ttl: float = 60) -> bool:
+    """Store a value for key, read at the current generation"""
+
+    return backend.set(key, key.encode(), ttl, tags, backend.generation())
+
+
+def test_values_are_stored(make_backend: Callable[[], CacheBackend]):
+    backend = make_backend()
+
+    assert backend.get("photos") is None
+    assert store(backend, "photos", "photos")
+    assert backend.get("photos") == b"photos"
+
+    assert store(backend, "photos", "photos")
+    assert backend.get("photos") == b"photos"
+
+
+def test_values_expire(make_backend: Callable[[], CacheBackend]):
+    backend = make_backend()
+
+    assert store(backend, "photos", "photos", ttl=0.05)
+    time.sleep(0.1)
+
+    assert backend.get("photos") is None
+
+
+def test_invalidation_drops_the_values_tagged(make_backend: Callable[[], CacheBackend]):
+    backend = make_backend()
+    store(backend, "photo-1", "photo:1")
+    store(backend, "photo-2", "photo:2")
+    store(backend, "album-1", "albums", "photo:1")
+
+    assert backend.invalidate(["photo:1"]) == 2
+
+    assert backend.get("photo-1") is None
+    assert backend.get("album-1") is None
+    assert backend.get("photo-2") == b"photo-2"
+
+
+def test_invalidation_bumps_the_generation(make_backend: Callable[[], CacheBackend]):
+    backend = make_backend()
+    generation = backend.generation()
+
+    backend.invalidate(["photos"])
+    assert backend.generation() == generation + 1
+    backend.invalidate([])
+    assert backend.generation() == generation + 2
+
+    # A value read before the invalidation isn't stored after it
+    assert not backend.set("photos", b"stale", 60, ["photos"], generation)
+    assert backend.get("photos") is None
+
+
+def test_clear_drops_everything(make_backend: Callable[[], CacheBackend]):
+    backend = make_backend()
+    store(backend, "photos", "photos")
+    generation = backend.generation()
+
+    backend.clear()
+
+    assert backend.get("photos") is None
+    assert backend.generation() == generation + 1
+
+
+def test_invalidation_reaches_every_instance(make_backend: Callable[[], CacheBackend]):
+    writer, reader = make_backend(), make_backend()
+
+    # Each instance sees the values the other stores
+    assert store(writer, "photos", "photos")
+    assert reader.get("photos") == b"photos"
+    assert store(reader, "albums", "albums")
+    assert writer.get("albums") == b"albums"
+
+    generation = reader.generation()
+    assert writer.invalidate(["photos"]) == 1
+
+    assert reader.get("photos") is None
+    assert reader.get("albums") == b"albums"
+    assert reader.generation() == generation + 1
+    # The other instance read before the invalidation, so can't store it's value
+    assert not reader.set("photos", b"stale", 60, ["photos"], generation)
+    assert writer.get("photos") is None
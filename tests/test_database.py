@@ -0,0 +1,208 @@
+"""Tests of the request scoped database sessions"""
+
+from datetime import datetime
+import time
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import Pool
+
+from app.infrastructure.database import (
+    Base,
+    get_connection_string,
+    databases,
+    make_sessionmaker,
+)
+from app.infrastructure.db_pool import get_pool_options, pool_metrics
+from app.infrastructure.models.main_models import PhotoModel, RoleModel, UserModel
+from app.infrastructure.replicas import READ_YOUR_WRITES_COOKIE, ReplicaSet
+from app.main import app
+from app.services import user_service
+from app.services.principal_cache import Principal, principal_cache
+
+
+class CheckedOut:
+    """Follows how many connections are checked out of every pool at once"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+    def checkout(self, *args) -> None:
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+
+    def checkin(self, *args) -> None:
+        self.current -= 1
+
+
+@pytest.fixture
+def admin(db: Session) -> None:
+    """Add an admin who can modify everything"""
+
+    user = UserModel(
+        username="admin",
+        email="admin@example.com",
+        first_name="Ada",
+        last_name="Admin",
+        password_hash=user_service.hash_password("password"),
+        is_admin=True,
+    )
+    user.roles.append(RoleModel(role_key="GENERAL_MODIFY", role_name="Modify"))
+    db.add(user)
+    db.commit()
+
+
+def log_in(client: TestClient) -> str:
+    """Log the admin in, return their access token"""
+
+    response = client.post("/token", data={"username": "admin", "password": "password"})
+    client.cookies.clear()
+    # Resolve the token from the database on the next request
+    principal_cache.clear()
+    return response.json()["access_token"]
+
+
+@pytest.fixture
+def checked_out() -> Iterator[CheckedOut]:
+    """Connections checked out during the test"""
+
+    checked_out = CheckedOut()
+    event.listen(Pool, "checkout", checked_out.checkout)
+    event.listen(Pool, "checkin", checked_out.checkin)
+    yield checked_out
+    event.remove(Pool, "checkout", checked_out.checkout)
+    event.remove(Pool, "checkin", checked_out.checkin)
+
+
+def get_checkouts() -> int:
+    """Get the connections checked out from every pool so far"""
+
+    return sum(metrics.checkouts for metrics in pool_metrics.values())
+
+
+def test_authenticated_request_checks_out_one_connection(
+    client: TestClient, admin: None, monkeypatch: pytest.MonkeyPatch
+):
+    # The principal comes from the token's claims, so the route loads the user
+    monkeypatch.setattr(user_service, "TOKEN_ROLE_CLAIMS", True)
+    token = log_in(client)
+
+    checkouts = get_checkouts()
+    response = client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    # The token version check and the user lookup share the request's session
+    assert get_checkouts() - checkouts == 1
+
+
+def test_authenticated_write_holds_one_connection(
+    client: TestClient, admin: None, checked_out: CheckedOut
+):
+    token = log_in(client)
+    checked_out.peak = 0
+
+    response = client.post(
+        "/project",
+        headers={"Authorization": f"Bearer {token}"},
+        json={
+            "projectKey": "project",
+            "title": "Project",
+            "imageSrc": "project.png",
+            "sourceUri": "https://example.com/source",
+            "description": "A project",
+        },
+    )
+
+    assert response.status_code == 200
+    # The auth dependency and the route never hold a connection each
+    assert checked_out.peak == 1
+
+
+@pytest.fixture
+def replica(monkeypatch: pytest.MonkeyPatch) -> str:
+    """Read the main database through a replica, return the name of it's pool"""
+
+    name = "main_test_replica_async"
+    engine = create_async_engine(
+        get_connection_string("main", True), **get_pool_options("main", True, name)
+    )
+    monkeypatch.setitem(
+        databases._replica_sets, "main", ReplicaSet([make_sessionmaker(engine)], 30)
+    )
+    return name
+
+
+def test_cache_hit_checks_out_no_replica_connection(client: TestClient, replica: str):
+    checkouts = get_checkouts()
+    assert client.get("/project").status_code == 200
+    assert pool_metrics[replica].checkouts == 1
+    assert get_checkouts() - checkouts == 1
+
+    checkouts = get_checkouts()
+    assert client.get("/project").status_code == 200
+    assert get_checkouts() - checkouts == 0
+
+
+@pytest.fixture
+def stale_replica(tmp_path, monkeypatch: pytest.MonkeyPatch) -> Engine:
+    """Read the main database through a replica that's a separate database, so it
+    can lag behind, return an engine to seed it with"""
+
+    engine = create_engine(f"sqlite:///{tmp_path}/main")
+    Base.metadata.create_all(engine)
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/main")
+    monkeypatch.setitem(
+        databases._replica_sets, "main", ReplicaSet([make_sessionmaker(replica)], 30)
+    )
+    return engine
+
+
+@pytest.fixture
+def editor() -> Iterator[None]:
+    """Answer every request as a user who can modify everything"""
+
+    app.dependency_overrides[user_service.get_current_principal] = lambda: Principal(
+        1, "editor", False, frozenset({"GENERAL_MODIFY"})
+    )
+    yield
+    del app.dependency_overrides[user_service.get_current_principal]
+
+
+def test_writers_read_their_writes_from_the_primary(
+    db: Session, client: TestClient, stale_replica: Engine, editor: None
+):
+    now = datetime.now()
+    for session in (db, Session(stale_replica)):
+        session.add(
+            PhotoModel(
+                id=1, filename="photo.jpg", title="Old", created_at=now, updated_at=now
+            )
+        )
+        session.commit()
+    bearer = {"Authorization": "Bearer editor-token"}
+
+    def get_title(**kwargs) -> str:
+        return client.get("/photo/1", **kwargs).json()["title"]
+
+    assert get_title() == "Old"
+    assert (
+        client.put("/photo/1", json={"title": "New"}, headers=bearer).status_code == 200
+    )
+
+    # A browser sends the cookie set by the write
+    assert get_title() == "New"
+    client.cookies.clear()
+    # A Bearer client without cookies has it's window kept by the server
+    assert get_title(headers=bearer) == "New"
+    # Other clients read the replica, which hasn't caught up
+    assert get_title() == "Old"
+    assert get_title(headers={"Authorization": "Bearer other-token"}) == "Old"
+    # A cookie ending later than a write could have set it is ignored
+    client.cookies.set(READ_YOUR_WRITES_COOKIE, str(time.time() + 3600))
+    assert get_title() == "Old"
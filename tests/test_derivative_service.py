@@ -0,0 +1,113 @@
+"""Tests of the derivative service"""
+
+from datetime import datetime
+from io import BytesIO
+import os
+
+from fastapi.testclient import TestClient
+from PIL import Image
+import pytest
+from sqlalchemy.orm import Session
+
+from app.infrastructure.models.main_models import PhotoModel
+from app.services import derivative_service
+from app.services.derivative_service import VariantCache
+
+
+@pytest.fixture
+def photo_directory(tmp_path, monkeypatch: pytest.MonkeyPatch) -> str:
+    """Keep the Photos' files and their derivatives in a temporary directory"""
+
+    directory = str(tmp_path)
+    monkeypatch.setattr(derivative_service, "PHOTO_DIRECTORY", directory)
+    monkeypatch.setattr(
+        derivative_service, "DERIVATIVE_DIRECTORY", f"{directory}/.derivatives"
+    )
+    monkeypatch.setattr(
+        derivative_service, "VARIANT_DIRECTORY", f"{directory}/.derivatives/variants"
+    )
+    monkeypatch.setattr(
+        derivative_service,
+        "variant_cache",
+        VariantCache(f"{directory}/.derivatives/variants", 1024 * 1024),
+    )
+    yield directory
+    derivative_service.shutdown_executor()
+
+
+def add_photo(db: Session, directory: str, filename: str, content: bytes) -> int:
+    """Write a Photo's file and add the Photo, return it's ID"""
+
+    with open(os.path.join(directory, filename), "wb") as file:
+        file.write(content)
+
+    now = datetime.now()
+    photo = PhotoModel(filename=filename, created_at=now, updated_at=now)
+    db.add(photo)
+    db.commit()
+    return photo.id
+
+
+def test_variant_removed_by_another_worker_is_a_miss(tmp_path):
+    cache = VariantCache(str(tmp_path), max_bytes=1024)
+    path = str(tmp_path / "1" / "64.webp")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as file:
+        file.write(b"x" * 10)
+
+    cache.put(path)
+    assert cache.get(path)
+
+    # Like another worker's eviction, or remove_derivatives in another worker
+    os.remove(path)
+
+    assert not cache.get(path)
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes"] == 0
+
+
+def jpeg(size: tuple[int, int]) -> bytes:
+    """Encode a JPEG of the given size"""
+
+    buffer = BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "url", ["/photo/{}/thumbnail", "/photo/{}/image?w=64&format=png"]
+)
+def test_photo_is_resized(
+    db: Session, client: TestClient, photo_directory: str, url: str
+):
+    photo_id = add_photo(db, photo_directory, "photo.jpg", jpeg((512, 384)))
+
+    response = client.get(url.format(photo_id))
+
+    assert response.status_code == 200
+    with Image.open(BytesIO(response.content)) as image:
+        assert max(image.size) in (64, 256)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b"not an image", jpeg((512, 384))[:300], b"\x89PNG\r\n\x1a\n" + b"\x00" * 40],
+    ids=["unsupported", "truncated", "corrupt"],
+)
+@pytest.mark.parametrize(
+    "url", ["/photo/{}/thumbnail", "/photo/{}/image?w=64&format=webp"]
+)
+def test_unreadable_photo_is_a_415(
+    db: Session, client: TestClient, photo_directory: str, content: bytes, url: str
+):
+    photo_id = add_photo(db, photo_directory, "photo.jpg", content)
+
+    response = client.get(url.format(photo_id))
+
+    assert response.status_code == 415
+    assert "photo.jpg" in response.json()["detail"]
+    # Nothing was cached, so a fixed file is resized on the next request
+    path = os.path.join(photo_directory, "photo.jpg")
+    with open(path, "wb") as file:
+        file.write(jpeg((512, 384)))
+    assert client.get(url.format(photo_id)).status_code == 200
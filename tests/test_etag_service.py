@@ -0,0 +1,58 @@
+"""Tests of the ETag service"""
+
+from datetime import datetime
+from typing import Iterator
+
+from fastapi.testclient import TestClient
+import pytest
+from sqlalchemy.orm import Session
+
+from app.infrastructure.models.main_models import PhotoModel
+from app.main import app
+from app.services import photo_service, user_service
+from app.services.principal_cache import Principal
+
+
+@pytest.fixture
+def admin() -> Iterator[None]:
+    """Answer every request as an admin who can modify everything"""
+
+    app.dependency_overrides[user_service.get_current_principal] = lambda: Principal(
+        1, "admin", True, frozenset({"GENERAL_MODIFY"})
+    )
+    yield
+    del app.dependency_overrides[user_service.get_current_principal]
+
+
+def test_updates_on_the_same_day_change_the_validators(
+    db: Session, client: TestClient, admin: None, monkeypatch: pytest.MonkeyPatch
+):
+    times = [datetime(2026, 3, 1, 9, 15), datetime(2026, 3, 1, 16, 40)]
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return times.pop(0)
+
+    monkeypatch.setattr(photo_service, "datetime", Clock)
+    photo = PhotoModel(
+        filename="photo.jpg", created_at=datetime(2026, 3, 1), updated_at=None
+    )
+    db.add(photo)
+    db.commit()
+
+    headers = []
+    for title in ["Morning", "Afternoon"]:
+        assert (
+            client.put(f"/photo/{photo.id}", json={"title": title}).status_code == 200
+        )
+        response = client.get(f"/photo/{photo.id}")
+        assert response.json()["title"] == title
+        headers.append((response.headers["ETag"], response.headers["Last-Modified"]))
+
+    (first_etag, first_modified), (second_etag, second_modified) = headers
+    assert first_etag != second_etag
+    assert first_modified != second_modified
+    # The client's copy from the morning is stale
+    response = client.get(f"/photo/{photo.id}", headers={"If-None-Match": first_etag})
+    assert response.status_code == 200
@@ -0,0 +1,117 @@
+"""Tests of the image header reader"""
+
+from io import BytesIO
+
+from PIL import Image
+import pytest
+
+from app.services.image_metadata import ImageHeader, read_image_header
+
+
+def encode(image_format: str, mode: str = "RGB", **options) -> bytes:
+    """Encode a 33x21 image with Pillow"""
+
+    buffer = BytesIO()
+    Image.new(mode, (33, 21)).save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def exif(orientation: int) -> bytes:
+    """Encode EXIF with the given orientation"""
+
+    data = Image.Exif()
+    data[0x0112] = orientation
+    return data.tobytes()
+
+
+def read(tmp_path, content: bytes) -> ImageHeader | None:
+    """Read the header of a file with the given content"""
+
+    path = tmp_path / "image"
+    path.write_bytes(content)
+    return read_image_header(str(path))
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        (encode("JPEG"), ImageHeader(33, 21, "jpeg")),
+        (encode("JPEG", progressive=True), ImageHeader(33, 21, "jpeg")),
+        (encode("JPEG", exif=exif(1)), ImageHeader(33, 21, "jpeg")),
+        (encode("JPEG", exif=exif(3)), ImageHeader(33, 21, "jpeg")),
+        (encode("JPEG", exif=exif(6)), ImageHeader(21, 33, "jpeg")),
+        (encode("JPEG", exif=exif(8)), ImageHeader(21, 33, "jpeg")),
+        (encode("PNG"), ImageHeader(33, 21, "png")),
+        (encode("PNG", "RGBA"), ImageHeader(33, 21, "png")),
+        (encode("WEBP"), ImageHeader(33, 21, "webp")),
+        (encode("WEBP", lossless=True), ImageHeader(33, 21, "webp")),
+        (encode("WEBP", "RGBA"), ImageHeader(33, 21, "webp")),
+        (encode("GIF", "P"), ImageHeader(33, 21, "gif")),
+    ],
+    ids=[
+        "jpeg",
+        "progressive-jpeg",
+        "jpeg-upright",
+        "jpeg-upside-down",
+        "jpeg-rotated-right",
+        "jpeg-rotated-left",
+        "png",
+        "png-alpha",
+        "webp-vp8",
+        "webp-vp8l",
+        "webp-vp8x",
+        "gif",
+    ],
+)
+def test_header_is_read(tmp_path, content: bytes, expected: ImageHeader):
+    assert read(tmp_path, content) == expected
+
+
+@pytest.mark.parametrize(
+    "image_format, mode, options",
+    [
+        ("JPEG", "RGB", {}),
+        ("PNG", "RGB", {}),
+        ("WEBP", "RGB", {}),
+        ("WEBP", "RGB", {"lossless": True}),
+        ("WEBP", "RGBA", {}),
+        ("GIF", "P", {}),
+    ],
+)
+def test_truncated_header_is_none(tmp_path, image_format: str, mode: str, options):
+    content = encode(image_format, mode, **options)
+
+    # Cut inside the header, before the dimensions
+    assert read(tmp_path, content[:9]) is None
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"",
+        b"not an image",
+        b"\xff\xd8\xff\xda\x00\x08",
+        b"\x89PNG\r\n\x1a\n" + b"\x00" * 12,
+        b"RIFF\x00\x00\x00\x00WEBPVP8 " + b"\x00" * 18,
+        b"RIFF\x00\x00\x00\x00WEBPVP8L\x00\x00\x00\x00\x00\x00\x00\x00\x00",
+    ],
+    ids=[
+        "empty",
+        "unsupported",
+        "jpeg-scan-before-frame",
+        "png-without-ihdr",
+        "webp-vp8-without-start-code",
+        "webp-vp8l-without-signature",
+    ],
+)
+def test_corrupt_header_is_none(tmp_path, content: bytes):
+    assert read(tmp_path, content) is None
+
+
+def test_broken_exif_leaves_jpeg_upright(tmp_path):
+    content = encode("JPEG", exif=exif(6))
+    start = content.index(b"Exif\x00\x00") + 6
+    # Point the first IFD past the end of the segment
+    content = content[: start + 4] + b"\xff\xff\xff\x00" + content[start + 8 :]
+
+    assert read(tmp_path, content) == ImageHeader(33, 21, "jpeg")
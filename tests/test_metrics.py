@@ -0,0 +1,58 @@
+"""Tests of the request metrics labels"""
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+import pytest
+
+from app.infrastructure.metrics import HTTP_METHODS, get_method_label
+
+
+def get_count(method: str, route: str, status: int) -> float:
+    """Get the number of requests recorded with the labels"""
+
+    labels = {"method": method, "route": route, "status": str(status)}
+    count = REGISTRY.get_sample_value("http_request_duration_seconds_count", labels)
+    return count or 0
+
+
+@pytest.mark.parametrize("method", sorted(HTTP_METHODS))
+def test_standard_methods_are_their_own_label(method: str):
+    assert get_method_label({"method": method}) == method
+
+
+@pytest.mark.parametrize("method", ["BREW", "PROPFIND", "X" * 64])
+def test_other_methods_share_a_label(client: TestClient, method: str):
+    assert get_method_label({"method": method}) == "other"
+
+    count = get_count("other", "/project", 405)
+    assert client.request(method, "/project").status_code == 405
+
+    assert get_count("other", "/project", 405) == count + 1
+    assert get_count(method, "/project", 405) == 0
+
+
+def test_route_template_is_the_label(client: TestClient):
+    count = get_count("GET", "/photo/{photo_id}", 404)
+
+    assert client.get("/photo/123").status_code == 404
+    assert client.get("/photo/456").status_code == 404
+
+    assert get_count("GET", "/photo/{photo_id}", 404) == count + 2
+    assert get_count("GET", "/photo/123", 404) == 0
+
+
+def test_mounted_route_template_includes_the_mount(client: TestClient):
+    count = get_count("GET", "/wedding/faq/{faq_id}", 404)
+
+    assert client.get("/wedding/faq/123").status_code == 404
+
+    assert get_count("GET", "/wedding/faq/{faq_id}", 404) == count + 1
+
+
+def test_unmatched_paths_share_a_label(client: TestClient):
+    count = get_count("GET", "unmatched", 404)
+
+    assert client.get("/no/such/path/123").status_code == 404
+    assert client.get("/no/such/path/456").status_code == 404
+
+    assert get_count("GET", "unmatched", 404) == count + 2
@@ -0,0 +1,201 @@
+"""Tests of the schema migrations"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    inspect,
+    select,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.infrastructure import migrations
+from app.infrastructure.database import DATABASES, Base, databases
+from app.infrastructure.migrations import (
+    m0002_main_lookup_indexes,
+    m0004_photo_album_timestamps,
+)
+from app.infrastructure.models.main_models import AlbumModel, PhotoModel
+
+
+def test_stamp_records_a_database_created_from_the_models():
+    # The test databases are created from the models with create_all
+    for database in DATABASES:
+        engine = databases.get_engine(database)
+        pending = migrations.get_pending_migrations(engine, database)
+
+        assert migrations.stamp(engine, database) == [
+            migrations.get_migration_name(module) for _, module in pending
+        ]
+        assert migrations.get_pending_migrations(engine, database) == []
+        assert migrations.migrate(engine, database) == []
+
+
+def test_photo_and_album_dates_become_datetimes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/main")
+    Base.metadata.create_all(
+        engine, tables=[PhotoModel.__table__, AlbumModel.__table__]
+    )
+    with engine.begin() as connection:
+        # Dates as the DATE columns stored them
+        connection.exec_driver_sql(
+            "INSERT INTO Photo (filename, created_at, updated_at) "
+            "VALUES ('photo.jpg', '2026-01-02', '2026-01-03')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO Album (title, created_at, updated_at) "
+            "VALUES ('Album', '2026-01-04', NULL)"
+        )
+
+    with engine.begin() as connection:
+        m0004_photo_album_timestamps.upgrade(connection)
+
+    with Session(engine) as db:
+        photo = db.query(PhotoModel).one()
+        album = db.query(AlbumModel).one()
+
+    assert (photo.created_at, photo.updated_at) == (
+        datetime(2026, 1, 2),
+        datetime(2026, 1, 3),
+    )
+    assert (album.created_at, album.updated_at) == (datetime(2026, 1, 4), None)
+
+
+def create_baseline_schema(engine: Engine) -> tuple[Table, Table]:
+    """Create the main tables as they were before m0002, with the columns it
+    touches, return the join tables"""
+
+    metadata = MetaData()
+    Table(
+        "Users",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("username", String(255), nullable=False),
+        Column("email", String(255), nullable=False),
+    )
+    Table(
+        "Roles",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("roleKey", String(255), nullable=False),
+    )
+    Table(
+        "Projects",
+        metadata,
+        Column("ProjectID", Integer, primary_key=True),
+        Column("ProjectKey", String(255), nullable=False),
+    )
+    Table(
+        "Photo",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("filename", String(255), nullable=False),
+    )
+    Table(
+        "Album",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("title", String(255), nullable=False),
+    )
+    # The join tables had no primary key, so nothing stopped duplicate rows
+    user_role = Table(
+        "UserRole",
+        metadata,
+        Column("userId", Integer, ForeignKey("Users.id")),
+        Column("roleId", Integer, ForeignKey("Roles.id")),
+    )
+    album_photo = Table(
+        "AlbumPhoto",
+        metadata,
+        Column("photo_id", Integer, ForeignKey("Photo.id")),
+        Column("album_id", Integer, ForeignKey("Album.id")),
+    )
+    metadata.create_all(engine)
+    return user_role, album_photo
+
+
+def test_lookup_indexes_and_join_table_keys_are_added(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/main")
+    user_role, album_photo = create_baseline_schema(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO Users (id, username, email) VALUES "
+            "(1, 'ada', 'ada@example.com'), (2, 'bob', 'bob@example.com')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO Roles (id, roleKey) VALUES (1, 'ADMIN'), (2, 'EDIT')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO Photo (id, filename) VALUES (1, '1.jpg'), (2, '2.jpg')"
+        )
+        connection.exec_driver_sql("INSERT INTO Album (id, title) VALUES (1, 'Album')")
+        connection.execute(
+            user_role.insert(),
+            [
+                {"userId": 1, "roleId": 1},
+                {"userId": 1, "roleId": 1},
+                {"userId": 1, "roleId": 2},
+                {"userId": 2, "roleId": 2},
+                {"userId": 2, "roleId": None},
+            ],
+        )
+        connection.execute(
+            album_photo.insert(),
+            [
+                {"photo_id": 1, "album_id": 1},
+                {"photo_id": 2, "album_id": 1},
+                {"photo_id": 2, "album_id": 1},
+            ],
+        )
+
+    with engine.begin() as connection:
+        m0002_main_lookup_indexes.upgrade(connection)
+
+    inspector = inspect(engine)
+    assert inspector.get_pk_constraint("UserRole")["constrained_columns"] == [
+        "userId",
+        "roleId",
+    ]
+    assert inspector.get_pk_constraint("AlbumPhoto")["constrained_columns"] == [
+        "photo_id",
+        "album_id",
+    ]
+
+    unique_indexes = {
+        (table_name, tuple(index["column_names"]))
+        for table_name in ["Users", "Roles", "Projects", "Photo", "Album"]
+        for index in inspector.get_indexes(table_name)
+        if index["unique"]
+    }
+    assert unique_indexes == {
+        (table_name, (column_name,))
+        for table_name, column_name in m0002_main_lookup_indexes.UNIQUE_COLUMNS
+    }
+    assert {
+        (index["name"], tuple(index["column_names"]))
+        for table_name in ["UserRole", "AlbumPhoto"]
+        for index in inspector.get_indexes(table_name)
+    } == {
+        ("ix_UserRole_roleId", ("roleId",)),
+        ("ix_AlbumPhoto_album_id", ("album_id",)),
+    }
+
+    # The duplicates are merged and the row missing part of it's key dropped
+    with engine.connect() as connection:
+        assert sorted(connection.execute(select(user_role))) == [(1, 1), (1, 2), (2, 2)]
+        assert sorted(connection.execute(select(album_photo))) == [(1, 1), (2, 1)]
+        assert connection.exec_driver_sql("SELECT count(*) FROM Users").scalar() == 2
+
+    # The keys now reject duplicates
+    with engine.connect() as connection:
+        with pytest.raises(IntegrityError):
+            connection.execute(user_role.insert(), {"userId": 1, "roleId": 1})
@@ -0,0 +1,296 @@
+"""Tests of the photo service"""
+
+from datetime import datetime
+import os
+from typing import Iterator
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.entities.album import Album, CreateAlbum
+from app.entities.photo import CreatePhoto, Photo
+from app.infrastructure.database import databases
+from app.infrastructure.image_index import image_index
+from app.infrastructure.models.main_models import AlbumModel, PhotoModel
+from app.services import photo_service
+
+
+@pytest.fixture
+def statements() -> Iterator[list[str]]:
+    """The statements the main database runs during the test"""
+
+    engine = databases.get_engine("main")
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, many):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def add_albums(db: Session, albums: int, photos_per_album: int) -> None:
+    """Add Albums, each with it's own cover and Photos"""
+
+    now = datetime.now()
+    for album_index in range(albums):
+        photos = [
+            PhotoModel(
+                filename=f"{album_index}-{photo_index}.jpg",
+                created_at=now,
+                updated_at=now,
+            )
+            for photo_index in range(photos_per_album)
+        ]
+        db.add(
+            AlbumModel(
+                title=f"Album {album_index}",
+                cover_photo=photos[0],
+                photos=photos,
+                created_at=now,
+                updated_at=now,
+            )
+        )
+    db.commit()
+    db.expunge_all()
+
+
+def load_and_serialize(db: Session, load) -> None:
+    """Load Albums and serialize them like the routes do"""
+
+    albums = load()
+    for album in albums if isinstance(albums, list) else [albums]:
+        Album.from_orm(album)
+    db.expunge_all()
+
+
+@pytest.mark.parametrize("albums", [1, 20])
+def test_get_albums_query_count_is_fixed(
+    db: Session, statements: list[str], albums: int
+):
+    add_albums(db, albums, photos_per_album=3)
+    statements.clear()
+
+    load_and_serialize(db, lambda: photo_service.get_albums(db))
+
+    # The Albums with their covers, then every Album's photos
+    assert len(statements) == 2
+
+
+@pytest.mark.parametrize("photos_per_album", [1, 50])
+def test_get_album_query_count_is_fixed(
+    db: Session, statements: list[str], photos_per_album: int
+):
+    add_albums(db, 2, photos_per_album)
+    album_id = db.query(AlbumModel.id).filter(AlbumModel.title == "Album 1").scalar()
+    statements.clear()
+
+    load_and_serialize(db, lambda: photo_service.get_album_by_id(db, album_id))
+    load_and_serialize(db, lambda: photo_service.get_album_by_title(db, "Album 1"))
+
+    # Each lookup loads the Album with it's cover, then it's photos
+    assert len(statements) == 4
+    # The photos aren't joined in, which would repeat the Album row per photo
+    assert not any(
+        "LIMIT" in statement and '"AlbumPhoto"' in statement for statement in statements
+    )
+
+
+@pytest.fixture
+def photo_directory(tmp_path, monkeypatch: pytest.MonkeyPatch) -> str:
+    """Keep the Photos' files in a temporary directory"""
+
+    directory = str(tmp_path)
+    monkeypatch.setattr(photo_service, "PHOTO_DIRECTORY", directory)
+    monkeypatch.setattr(image_index, "directory", directory)
+    monkeypatch.setattr(image_index, "_filenames", None)
+    return directory
+
+
+def write_image(directory: str, filename: str, size: tuple[int, int]) -> None:
+    """Write a small JPEG"""
+
+    Image.new("RGB", size).save(os.path.join(directory, filename), "JPEG")
+
+
+def test_create_photos_reports_a_status_per_photo(db: Session, photo_directory: str):
+    now = datetime.now()
+    db.add(PhotoModel(filename="existing.jpg", created_at=now, updated_at=now))
+    db.commit()
+    write_image(photo_directory, "existing.jpg", (8, 8))
+    write_image(photo_directory, "first.jpg", (40, 30))
+    write_image(photo_directory, "second.jpg", (16, 24))
+
+    filenames = ["first.jpg", "existing.jpg", "first.jpg", "missing.jpg", "second.jpg"]
+    results = photo_service.create_photos(
+        db, [CreatePhoto(filename=filename) for filename in filenames]
+    )
+
+    assert [result.filename for result in results] == filenames
+    assert [result.status for result in results] == [
+        "created",
+        "duplicate",
+        "duplicate",
+        "missing_file",
+        "created",
+    ]
+    assert results[0].photo.id is not None
+    # The sizes and formats the request left out come from the files' headers
+    assert (results[0].photo.width, results[0].photo.height) == (40, 30)
+    assert (results[4].photo.width, results[4].photo.height) == (16, 24)
+    assert results[4].photo.format == "jpeg"
+    assert all(result.photo is None for result in results[1:4])
+    assert db.query(PhotoModel).count() == 3
+
+
+def test_create_photos_inserts_in_chunks(
+    db: Session, photo_directory: str, statements: list[str]
+):
+    filenames = [f"{index}.jpg" for index in range(5)]
+    for filename in filenames:
+        write_image(photo_directory, filename, (8, 8))
+
+    results = photo_service.create_photos(
+        db,
+        [CreatePhoto(filename=filename, width=8, height=8) for filename in filenames],
+        chunk_size=2,
+    )
+
+    # One executemany per chunk, each followed by a query of it's Photos by filename
+    inserts = [s for s in statements if s.startswith('INSERT INTO "Photo"')]
+    requeries = [s for s in statements if s.startswith('SELECT "Photo".id')]
+    assert len(inserts) == 3
+    assert len(requeries) == 3
+    assert all("filename IN" in statement for statement in requeries)
+
+    ids = [result.photo.id for result in results]
+    assert len(set(ids)) == 5
+    assert [result.photo.filename for result in results] == filenames
+
+
+def add_photos(db: Session, photos: int) -> list[int]:
+    """Add Photos, return their IDs in order"""
+
+    now = datetime.now()
+    models = [
+        PhotoModel(filename=f"{index}.jpg", created_at=now, updated_at=now)
+        for index in range(photos)
+    ]
+    db.add_all(models)
+    db.commit()
+    return [model.id for model in models]
+
+
+@pytest.mark.parametrize(
+    "after, limit, expected",
+    [
+        (None, 2, slice(0, 2)),
+        (None, 5, slice(0, 5)),
+        (None, 10, slice(0, 5)),
+        (0, 2, slice(1, 3)),
+        # The last page is exactly full, the page after it is empty
+        (2, 2, slice(3, 5)),
+        (4, 2, slice(5, 5)),
+    ],
+)
+def test_get_photos_pages_by_id(
+    db: Session, after: int | None, limit: int, expected: slice
+):
+    ids = add_photos(db, 5)
+    after_id = None if after is None else ids[after]
+
+    photos = photo_service.get_photos(db, after_id, limit)
+
+    assert [photo.id for photo in photos] == ids[expected]
+
+
+def test_get_photos_pages_cover_every_photo_once(db: Session):
+    ids = add_photos(db, 6)
+
+    pages = []
+    after_id = None
+    while page := photo_service.get_photos(db, after_id, 3):
+        pages.append([photo.id for photo in page])
+        after_id = page[-1].id
+
+    assert pages == [ids[:3], ids[3:]]
+
+
+def test_exactly_full_last_page_sees_new_photos(db: Session, client: TestClient):
+    ids = add_photos(db, 2)
+
+    assert len(client.get("/photo", params={"limit": 2}).json()) == 2
+    assert client.get("/photo", params={"after_id": ids[-1], "limit": 2}).json() == []
+
+    # Creating a Photo drops the cached empty page after it
+    created = photo_service.create_photo(
+        db, CreatePhoto(filename="new.jpg", width=1, height=1), file_exists=True
+    )
+
+    page = client.get("/photo", params={"after_id": ids[-1], "limit": 2}).json()
+    assert [photo["id"] for photo in page] == [created.id]
+
+
+@pytest.mark.parametrize("photos", [0, 1, 7])
+def test_stream_is_a_json_array_of_every_photo(
+    db: Session, client: TestClient, photos: int
+):
+    ids = add_photos(db, photos)
+
+    response = client.get("/photo", params={"stream": True, "limit": 1})
+
+    assert response.headers["content-type"] == "application/json"
+    streamed = response.json()
+    assert [photo["id"] for photo in streamed] == ids
+    assert all(
+        photo.keys() == set(Photo.schema(by_alias=True)["properties"])
+        for photo in streamed
+    )
+
+
+def test_stream_starts_after_after_id(db: Session, client: TestClient):
+    ids = add_photos(db, 4)
+
+    response = client.get("/photo", params={"stream": True, "after_id": ids[1]})
+
+    assert [photo["id"] for photo in response.json()] == ids[2:]
+
+
+@pytest.mark.parametrize(
+    "photo_ids, status_code, detail",
+    [
+        (
+            [1, 2, 2, 99],
+            404,
+            "Photos with IDs [99] do not exist. Photos with IDs [2] are already in "
+            "Album with ID 1 or were given more than once",
+        ),
+        ([1, 98, 99], 404, "Photos with IDs [98, 99] do not exist"),
+        (
+            [1, 3, 2, 2],
+            409,
+            "Photos with IDs [2, 3] are already in Album with ID 1 or were given "
+            "more than once",
+        ),
+    ],
+)
+def test_adding_photos_to_an_album_reports_every_problem(
+    db: Session, photo_ids: list[int], status_code: int, detail: str
+):
+    assert add_photos(db, 3) == [1, 2, 3]
+    album_id = photo_service.create_album(db, CreateAlbum(title="Album")).id
+    photo_service.add_photos_to_album(db, album_id, [3])
+
+    with pytest.raises(HTTPException) as error:
+        photo_service.add_photos_to_album(db, album_id, photo_ids)
+
+    assert error.value.status_code == status_code
+    assert error.value.detail == detail
+    # Nothing was added
+    album = photo_service.get_album_by_id(db, album_id)
+    assert [photo.id for photo in album.photos] == [3]
@@ -0,0 +1,69 @@
+"""Tests of the per request query stats"""
+
+import logging
+
+from fastapi.testclient import TestClient
+import pytest
+
+from app.infrastructure import query_stats
+from app.infrastructure.query_stats import query_totals
+
+
+def get_records(caplog: pytest.LogCaptureFixture) -> list[logging.LogRecord]:
+    """Get the records logged by the query stats"""
+
+    return [record for record in caplog.records if record.name == query_stats.__name__]
+
+
+def test_query_count_and_time_are_added_to_the_headers(client: TestClient):
+    # A miss reads the Projects, the hit after it is answered from the cache
+    miss = client.get("/project")
+    hit = client.get("/project")
+
+    assert miss.headers["x-db-query-count"] == "1"
+    assert float(miss.headers["x-db-query-time-ms"]) > 0
+    assert hit.headers["x-db-query-count"] == "0"
+    assert hit.headers["x-db-query-time-ms"] == "0.00"
+
+
+def test_repeated_statements_are_logged_as_n_plus_one(
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+):
+    flagged = query_totals.stats()["n_plus_one_requests"]
+
+    with caplog.at_level(logging.WARNING, logger=query_stats.__name__):
+        client.get("/project")
+        assert get_records(caplog) == []
+
+        monkeypatch.setattr(query_stats, "N_PLUS_ONE_THRESHOLD", 1)
+        client.get("/photo")
+
+    [record] = get_records(caplog)
+    message = record.getMessage()
+    assert message.startswith("Possible N+1 query: GET /photo ran 2 statements in ")
+    assert 'FROM "Photo"' in message
+    assert query_totals.stats()["n_plus_one_requests"] == flagged + 1
+
+
+@pytest.mark.parametrize(
+    "sample_rate, roll, sampled",
+    [(1, 0.99, True), (0.5, 0.49, True), (0.5, 0.5, False), (0, 0, False)],
+)
+def test_only_sampled_requests_are_recorded(
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    sample_rate: float,
+    roll: float,
+    sampled: bool,
+):
+    monkeypatch.setattr(query_stats, "QUERY_STATS_SAMPLE_RATE", sample_rate)
+    monkeypatch.setattr(query_stats.random, "random", lambda: roll)
+    requests = query_totals.stats()["requests"]
+
+    response = client.get("/project")
+
+    assert response.status_code == 200
+    assert ("x-db-query-count" in response.headers) == sampled
+    assert query_totals.stats()["requests"] == requests + sampled
@@ -0,0 +1,195 @@
+"""Tests of the response cache"""
+
+import asyncio
+from datetime import datetime
+from typing import Iterable, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from app.infrastructure.cache_backends import InProcessBackend
+from app.infrastructure.image_index import image_index
+from app.infrastructure.models.main_models import AlbumModel, PhotoModel
+from app.main import app
+from app.services import photo_service, user_service
+from app.services.principal_cache import Principal
+from app.services.response_cache import response_cache
+
+
+class BlockingBackend(InProcessBackend):
+    """An in process backend that's treated as blocking, and records the calls
+    made on the event loop"""
+
+    blocking = True
+
+    def __init__(self, max_bytes: int):
+        super().__init__(max_bytes)
+        self.calls = []
+        self.calls_on_loop = []
+
+    def _record(self, call: str) -> None:
+        self.calls.append(call)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.calls_on_loop.append(call)
+
+    def get(self, key: str) -> bytes | None:
+        self._record("get")
+        return super().get(key)
+
+    def set(
+        self,
+        key: str,
+        value: bytes,
+        ttl_seconds: float,
+        tags: Iterable[str],
+        generation: int,
+    ) -> bool:
+        self._record("set")
+        return super().set(key, value, ttl_seconds, tags, generation)
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        self._record("invalidate")
+        return super().invalidate(tags)
+
+    def generation(self) -> int:
+        self._record("generation")
+        return super().generation()
+
+
+@pytest.fixture
+def backend(monkeypatch: pytest.MonkeyPatch) -> BlockingBackend:
+    """Keep the response cache in a BlockingBackend"""
+
+    backend = BlockingBackend(1024 * 1024)
+    monkeypatch.setattr(response_cache, "backend", backend)
+    return backend
+
+
+@pytest.fixture
+def admin() -> Iterator[None]:
+    """Answer every request as an admin who can modify everything"""
+
+    app.dependency_overrides[user_service.get_current_principal] = lambda: Principal(
+        1, "admin", True, frozenset({"GENERAL_MODIFY"})
+    )
+    yield
+    del app.dependency_overrides[user_service.get_current_principal]
+
+
+def test_blocking_backend_is_called_off_the_event_loop(
+    client: TestClient, backend: BlockingBackend, admin: None
+):
+    # A miss, which caches the Projects, then a hit
+    assert client.get("/project").status_code == 200
+    assert client.get("/project").status_code == 200
+
+    response = client.post(
+        "/project",
+        json={
+            "projectKey": "project",
+            "title": "Project",
+            "imageSrc": "project.png",
+            "sourceUri": "https://example.com/source",
+            "description": "A project",
+        },
+    )
+    assert response.status_code == 200
+
+    assert set(backend.calls) == {"get", "set", "invalidate", "generation"}
+    assert backend.calls_on_loop == []
+    # The write dropped the cached Projects
+    assert client.get("/project").json()[0]["projectKey"] == "project"
+
+
+# The cached pages of five Photos, two to a page, and the Albums. The only Album
+# holds Photo 1.
+FIRST_PAGE = "/photo?limit=2"
+SECOND_PAGE = "/photo?after_id=2&limit=2"
+LAST_PAGE = "/photo?after_id=4&limit=2"
+ALBUMS = "/album?"
+PROJECTS = "/project?"
+PAGES = {FIRST_PAGE, SECOND_PAGE, LAST_PAGE, ALBUMS, PROJECTS}
+
+
+@pytest.fixture
+def cached_pages(
+    db: Session,
+    client: TestClient,
+    backend: BlockingBackend,
+    tmp_path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Add the Photos and Album, and cache every page of them"""
+
+    monkeypatch.setattr(photo_service, "PHOTO_DIRECTORY", str(tmp_path))
+    monkeypatch.setattr(image_index, "directory", str(tmp_path))
+    monkeypatch.setattr(image_index, "_filenames", None)
+
+    now = datetime.now()
+    photos = [
+        PhotoModel(
+            id=photo_id, filename=f"{photo_id}.jpg", created_at=now, updated_at=now
+        )
+        for photo_id in range(1, 6)
+    ]
+    db.add_all(photos)
+    db.add(
+        AlbumModel(
+            id=1,
+            title="Album",
+            cover_photo=photos[0],
+            photos=photos[:1],
+            created_at=now,
+            updated_at=now,
+        )
+    )
+    db.commit()
+
+    for page in PAGES:
+        assert client.get(page.rstrip("?")).status_code == 200
+    assert get_cached_pages(backend) == PAGES
+
+
+def get_cached_pages(backend: BlockingBackend) -> set[str]:
+    """Get the pages still cached"""
+
+    return {page for page in PAGES if backend.get(page) is not None}
+
+
+def test_updating_a_photo_drops_the_pages_holding_it(
+    client: TestClient, backend: BlockingBackend, admin: None, cached_pages: None
+):
+    assert client.put("/photo/3", json={"title": "Three"}).status_code == 200
+    assert get_cached_pages(backend) == PAGES - {SECOND_PAGE}
+
+    # Photo 1 is also the Album's cover
+    assert client.put("/photo/1", json={"title": "One"}).status_code == 200
+    assert get_cached_pages(backend) == {LAST_PAGE, PROJECTS}
+
+
+def test_creating_a_photo_drops_only_the_last_page(
+    client: TestClient,
+    backend: BlockingBackend,
+    admin: None,
+    cached_pages: None,
+    tmp_path,
+):
+    Image.new("RGB", (8, 8)).save(tmp_path / "6.jpg", "JPEG")
+
+    assert client.post("/photo", json={"filename": "6.jpg"}).status_code == 200
+
+    assert get_cached_pages(backend) == PAGES - {LAST_PAGE}
+    assert [photo["id"] for photo in client.get(LAST_PAGE).json()] == [5, 6]
+
+
+def test_adding_photos_to_an_album_drops_only_the_albums(
+    client: TestClient, backend: BlockingBackend, admin: None, cached_pages: None
+):
+    assert client.post("/album/addphotos/1", json=[2, 3]).status_code == 200
+
+    assert get_cached_pages(backend) == PAGES - {ALBUMS}
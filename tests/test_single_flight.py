@@ -0,0 +1,100 @@
+"""Tests of the single flight"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.single_flight import SharedError, SingleFlight
+
+
+async def run_together(flight: SingleFlight, call, requests: int = 20) -> list:
+    """Run identical calls at once, return what each got"""
+
+    return await asyncio.gather(
+        *[flight.run("key", call) for _ in range(requests)], return_exceptions=True
+    )
+
+
+def test_identical_calls_run_once():
+    flight = SingleFlight(wait_seconds=5, share_errors=True)
+    calls = []
+
+    async def call() -> bytes:
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return b"body"
+
+    results = asyncio.run(run_together(flight, call))
+
+    assert results == [b"body"] * 20
+    assert len(calls) == 1
+    assert flight.stats()["leaders"] == 1
+    assert flight.stats()["coalesced"] == 19
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_http_errors_are_shared():
+    flight = SingleFlight(wait_seconds=5, share_errors=False)
+    calls = []
+
+    async def call() -> bytes:
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        raise HTTPException(status_code=404, detail="Album does not exist")
+
+    results = asyncio.run(run_together(flight, call))
+
+    assert all(
+        isinstance(result, HTTPException)
+        and result.status_code == 404
+        and result.detail == "Album does not exist"
+        for result in results
+    )
+    assert len(calls) == 1
+    # Each waiter raised it's own copy of the leader's exception
+    assert len({id(result) for result in results}) == 20
+    assert all(result.__cause__ is results[0] for result in results[1:])
+
+
+@pytest.mark.parametrize("share_errors, calls_made", [(True, 1), (False, 20)])
+def test_unexpected_errors_are_shared_or_retried(share_errors: bool, calls_made: int):
+    flight = SingleFlight(wait_seconds=5, share_errors=share_errors)
+    calls = []
+
+    async def call() -> bytes:
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        if len(calls) == 1:
+            raise RuntimeError("The database went away")
+        return b"body"
+
+    results = asyncio.run(run_together(flight, call))
+
+    assert isinstance(results[0], RuntimeError)
+    assert len(calls) == calls_made
+    if share_errors:
+        assert all(
+            isinstance(result, SharedError) and result.__cause__ is results[0]
+            for result in results[1:]
+        )
+        assert len({id(result) for result in results}) == 20
+    else:
+        assert results[1:] == [b"body"] * 19
+
+
+def test_waiters_time_out_with_a_503():
+    flight = SingleFlight(wait_seconds=0.01, share_errors=True)
+
+    async def call() -> bytes:
+        await asyncio.sleep(0.1)
+        return b"body"
+
+    results = asyncio.run(run_together(flight, call))
+
+    assert results[0] == b"body"
+    assert all(
+        isinstance(result, HTTPException) and result.status_code == 503
+        for result in results[1:]
+    )
+    assert flight.stats()["timeouts"] == 19
@@ -0,0 +1,129 @@
+"""Tests of the access tokens and the principals resolved from them"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.infrastructure.models.main_models import RoleModel, UserModel
+from app.services import user_service
+from app.services.principal_cache import principal_cache
+
+
+@pytest.fixture
+def editor(db: Session) -> UserModel:
+    """Add a user who can modify everything, return them"""
+
+    user = UserModel(
+        username="editor",
+        email="editor@example.com",
+        first_name="Eddie",
+        last_name="Editor",
+        password_hash=user_service.hash_password("password"),
+        is_admin=False,
+    )
+    user.roles.append(RoleModel(role_key="GENERAL_MODIFY", role_name="Modify"))
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture(params=[False, True], ids=["database", "role-claims"])
+def role_claims(request, monkeypatch: pytest.MonkeyPatch) -> bool:
+    """Issue tokens with and without role claims"""
+
+    monkeypatch.setattr(user_service, "TOKEN_ROLE_CLAIMS", request.param)
+    return request.param
+
+
+def log_in(client: TestClient) -> str:
+    """Log the editor in, return their access token"""
+
+    response = client.post(
+        "/token", data={"username": "editor", "password": "password"}
+    )
+    client.cookies.clear()
+    return response.json()["access_token"]
+
+
+def create_project(client: TestClient, token: str, project_key: str) -> int:
+    """Create a Project with the token, return the status code"""
+
+    response = client.post(
+        "/project",
+        headers={"Authorization": f"Bearer {token}"},
+        json={
+            "projectKey": project_key,
+            "title": "Project",
+            "imageSrc": "project.png",
+            "sourceUri": "https://example.com/source",
+            "description": "A project",
+        },
+    )
+    return response.status_code
+
+
+def remove_role_in_another_worker(db: Session, user: UserModel) -> None:
+    """Remove the user's role like another worker would, leaving this worker's
+    principal cache as it was"""
+
+    user.roles.clear()
+    user.token_version += 1
+    db.commit()
+
+
+def test_removing_a_role_revokes_access_on_the_next_request(
+    db: Session, client: TestClient, editor: UserModel, role_claims: bool
+):
+    token = log_in(client)
+    assert create_project(client, token, "first") == 200
+    assert principal_cache.get(token) is not None
+
+    remove_role_in_another_worker(db, editor)
+
+    # A token with role claims is rejected, others are resolved again without it
+    assert create_project(client, token, "second") == (401 if role_claims else 403)
+
+
+def test_bumping_the_token_version_rejects_earlier_tokens(
+    db: Session, client: TestClient, editor: UserModel, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(user_service, "TOKEN_ROLE_CLAIMS", True)
+    earlier = log_in(client)
+    assert create_project(client, earlier, "first") == 200
+
+    editor.token_version += 1
+    db.commit()
+
+    assert create_project(client, earlier, "second") == 401
+    # A token issued since carries the new version
+    assert create_project(client, log_in(client), "third") == 200
+
+
+@pytest.mark.parametrize(
+    "version_offset, status_code",
+    [(0, 200), (-1, 401), (1, 401), (None, 401)],
+    ids=["current", "earlier", "later", "missing"],
+)
+def test_role_claims_are_trusted_only_at_the_current_version(
+    db: Session,
+    client: TestClient,
+    editor: UserModel,
+    version_offset: int | None,
+    status_code: int,
+):
+    # The claims grant a role the database no longer has
+    editor.roles.clear()
+    editor.token_version = 3
+    db.commit()
+
+    claims = {
+        "sub": "editor",
+        "uid": editor.user_id,
+        "is_admin": False,
+        "roles": ["GENERAL_MODIFY"],
+    }
+    if version_offset is not None:
+        claims["ver"] = 3 + version_offset
+    token = user_service.create_access_token(claims)
+
+    assert create_project(client, token, "project") == status_code